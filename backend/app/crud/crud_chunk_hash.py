@@ -0,0 +1,40 @@
+from sqlite3 import Connection
+from typing import Dict, Iterable, List, Tuple
+
+
+def get_source_hashes(db: Connection, collection_id: str, source: str) -> Dict[str, Tuple[str, int]]:
+    """Returns {chunk_id: (content hash, position)} of the chunks stored for one source of a collection."""
+    cursor = db.cursor()
+    cursor.execute(
+        "SELECT chunk_id, hash, position FROM chunk_hashes WHERE collection_id = ? AND source = ?",
+        (collection_id, source),
+    )
+    return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+def get_chunk_sources(db: Connection, collection_id: str) -> List[str]:
+    """Returns the sources that have chunks stored in a collection."""
+    cursor = db.cursor()
+    cursor.execute("SELECT DISTINCT source FROM chunk_hashes WHERE collection_id = ?", (collection_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+def save_chunk_hashes(db: Connection, collection_id: str, source: str, entries: Iterable[Tuple[str, str, int]]):
+    """Inserts or updates (chunk_id, hash, position) entries of a source."""
+    cursor = db.cursor()
+    cursor.executemany(
+        "INSERT OR REPLACE INTO chunk_hashes (collection_id, chunk_id, source, hash, position) VALUES (?, ?, ?, ?, ?)",
+        [(collection_id, chunk_id, source, content_hash, position) for chunk_id, content_hash, position in entries],
+    )
+    db.commit()
+
+def delete_chunk_hashes(db: Connection, collection_id: str, chunk_ids: List[str]):
+    cursor = db.cursor()
+    cursor.executemany(
+        "DELETE FROM chunk_hashes WHERE collection_id = ? AND chunk_id = ?",
+        [(collection_id, chunk_id) for chunk_id in chunk_ids],
+    )
+    db.commit()
+
+def delete_chunk_hashes_by_collection_id(db: Connection, collection_id: str):
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM chunk_hashes WHERE collection_id = ?", (collection_id,))
+    db.commit()
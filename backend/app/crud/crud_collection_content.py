@@ -1,32 +1,26 @@
-import chromadb
-from app.internal.embedding_manager import get_embedder
+import base64
+from typing import List, Optional
+
+from app.internal.chroma_manager import SEQUENCE_KEY, chroma_manager
+from app.internal.embedding_manager import embed_query
+from app.internal.exceptions import CollectionNotReadyError, InvalidCursorError
+from app.internal.record_numbering import is_numbered
 
 
 def get_collection_chunks(collection_id: str, page: int, page_size: int):
     """
-    Retrieves all items from a ChromaDB collection and returns a paginated dictionary.
+    Retrieves one page of items from a ChromaDB collection.
+    Only the requested page is loaded, the total is served from the cached collection count.
     """
     try:
-        client = chromadb.PersistentClient(path="./chroma_data")
-        collection = client.get_collection(name=collection_id)
-        
-        all_items = collection.get()
-        
-        total_chunks = len(all_items["ids"])
-        
-        start_index = (page - 1) * page_size
-        end_index = start_index + page_size
-        
-        paginated_ids = all_items["ids"][start_index:end_index]
-        paginated_documents = all_items["documents"][start_index:end_index]
-        
-        result_chunks = []
-        for i in range(len(paginated_ids)):
-            result_chunks.append({"id": paginated_ids[i], "document": paginated_documents[i]})
-        
+        collection = chroma_manager.get_collection(collection_id)
+
+        page = max(page, 1)
+        page_items = collection.get(limit=page_size, offset=(page - 1) * page_size, include=["documents"])
+
         return {
-            "chunks": result_chunks,
-            "total_chunks": total_chunks,
+            "chunks": _to_chunks(page_items),
+            "total_chunks": chroma_manager.count(collection_id),
             "page": page,
             "page_size": page_size,
         }
@@ -35,16 +29,66 @@ def get_collection_chunks(collection_id: str, page: int, page_size: int):
     except Exception as e:
         raise Exception(f"An unexpected error occurred: {str(e)}")
 
-def query_collection(collection_id: str, query_text: str, n_results: int = 10):
+def scroll_collection_chunks(collection_id: str, cursor: Optional[str], page_size: int):
+    """
+    Retrieves the items following the cursor returned by the previous call.
+    Items are paged by their sequence number: every page is a keyset lookup (seq > last seq seen),
+    so a deep page costs the same as the first one and records added or removed meanwhile do not shift pages.
+    next_cursor is None when there are no more items.
+    """
+    last_sequence = _decode_cursor(cursor)
+    try:
+        collection = chroma_manager.get_collection(collection_id)
+        if not is_numbered(collection):
+            # Numbered in the background since startup; until then the collection is read by page
+            raise CollectionNotReadyError()
+        # One more item than requested tells whether another page follows
+        page_items = collection.get(where={SEQUENCE_KEY: {"$gt": last_sequence}}, limit=page_size + 1,
+                                    include=["documents", "metadatas"])
+        chunks = _to_chunks(page_items)[:page_size]
+
+        next_cursor = None
+        if len(page_items["ids"]) > page_size:
+            next_cursor = _encode_cursor(page_items["metadatas"][page_size - 1][SEQUENCE_KEY])
+
+        return {
+            "chunks": chunks,
+            "total_chunks": chroma_manager.count(collection_id),
+            "next_cursor": next_cursor,
+        }
+    except CollectionNotReadyError:
+        raise
+    except ValueError as e:
+        raise ValueError(f"Collection '{collection_id}' not found. {str(e)}")
+    except Exception as e:
+        raise Exception(f"An unexpected error occurred: {str(e)}")
+
+def _to_chunks(items) -> List[dict]:
+    return [{"id": id, "document": document} for id, document in zip(items["ids"], items["documents"])]
+
+def _encode_cursor(last_sequence: int) -> str:
+    return base64.urlsafe_b64encode(str(last_sequence).encode("ascii")).decode("ascii")
+
+def _decode_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return -1
+    try:
+        last_sequence = int(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii"))
+    except (ValueError, UnicodeError):
+        raise InvalidCursorError()
+    if last_sequence < 0:
+        raise InvalidCursorError()
+    return last_sequence
+
+def query_collection(collection_id: str, query_text: str, n_results: int = 10, model_name: Optional[str] = None):
     """
     Queries a collection with a given text.
+    model_name must be the embedding model the collection was imported with.
     """
     try:
-        client = chromadb.PersistentClient(path="./chroma_data")
-        collection = client.get_collection(name=collection_id)
+        collection = chroma_manager.get_collection(collection_id)
         
-        embedder = get_embedder()
-        query_embedding = list(embedder.embed([query_text]))[0].tolist()
+        query_embedding = embed_query(query_text, model_name)
 
         results = collection.query(
             query_embeddings=[query_embedding],
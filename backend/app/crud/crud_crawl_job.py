@@ -0,0 +1,106 @@
+from sqlite3 import Connection
+from typing import List, Optional, Set, Tuple
+
+from app.schemas.crawl_job import CrawlJob, CrawlJobStatus
+
+# (url, depth, lastmod) of a page waiting to be crawled
+FrontierEntry = Tuple[str, int, Optional[str]]
+
+_JOB_COLUMNS = ["id", "collection_id", "url", "import_params", "status", "pages_indexed", "pages_queued", "pages_visited", "updated_at"]
+
+_SELECT_JOBS = """
+    SELECT j.id, j.collection_id, j.url, j.import_params, j.status, j.pages_indexed,
+        (SELECT COUNT(*) FROM crawl_frontier f WHERE f.job_id = j.id AND f.done = 0),
+        (SELECT COUNT(*) FROM crawl_frontier f WHERE f.job_id = j.id),
+        j.updated_at
+    FROM crawl_jobs j"""
+
+
+def create_job(db: Connection, job_id: str, collection_id: str, url: str, import_params: str):
+    cursor = db.cursor()
+    cursor.execute(
+        "INSERT INTO crawl_jobs (id, collection_id, url, import_params, status, pages_indexed, updated_at) VALUES (?, ?, ?, ?, ?, 0, CURRENT_TIMESTAMP)",
+        (job_id, collection_id, url, import_params, CrawlJobStatus.RUNNING.value),
+    )
+    db.commit()
+
+def get_job(db: Connection, job_id: str) -> Optional[CrawlJob]:
+    cursor = db.cursor()
+    cursor.execute(f"{_SELECT_JOBS} WHERE j.id = ?", (job_id,))
+    row = cursor.fetchone()
+    return CrawlJob(**dict(zip(_JOB_COLUMNS, row))) if row else None
+
+def get_jobs_for_collection(db: Connection, collection_id: str) -> List[CrawlJob]:
+    cursor = db.cursor()
+    cursor.execute(f"{_SELECT_JOBS} WHERE j.collection_id = ? ORDER BY j.updated_at DESC", (collection_id,))
+    return [CrawlJob(**dict(zip(_JOB_COLUMNS, row))) for row in cursor.fetchall()]
+
+def update_job_status(db: Connection, job_id: str, status: CrawlJobStatus):
+    cursor = db.cursor()
+    cursor.execute("UPDATE crawl_jobs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (status.value, job_id))
+    db.commit()
+
+def start_job(db: Connection, job_id: str) -> bool:
+    """Sets a job that is not running to RUNNING. Returns False if it was running already, so only one caller resumes it."""
+    cursor = db.cursor()
+    cursor.execute(
+        "UPDATE crawl_jobs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status != ?",
+        (CrawlJobStatus.RUNNING.value, job_id, CrawlJobStatus.RUNNING.value),
+    )
+    db.commit()
+    return cursor.rowcount == 1
+
+def interrupt_running_jobs(db: Connection):
+    """Jobs still RUNNING at startup were stopped by a server restart."""
+    cursor = db.cursor()
+    cursor.execute("UPDATE crawl_jobs SET status = ? WHERE status = ?", (CrawlJobStatus.INTERRUPTED.value, CrawlJobStatus.RUNNING.value))
+    db.commit()
+
+def delete_job(db: Connection, job_id: str):
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM crawl_frontier WHERE job_id = ?", (job_id,))
+    cursor.execute("DELETE FROM crawl_jobs WHERE id = ?", (job_id,))
+    db.commit()
+
+def delete_interrupted_jobs(db: Connection, collection_id: str, url: str):
+    cursor = db.cursor()
+    cursor.execute(
+        "DELETE FROM crawl_frontier WHERE job_id IN (SELECT id FROM crawl_jobs WHERE collection_id = ? AND url = ? AND status = ?)",
+        (collection_id, url, CrawlJobStatus.INTERRUPTED.value),
+    )
+    cursor.execute("DELETE FROM crawl_jobs WHERE collection_id = ? AND url = ? AND status = ?", (collection_id, url, CrawlJobStatus.INTERRUPTED.value))
+    db.commit()
+
+def delete_jobs_by_collection_id(db: Connection, collection_id: str):
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM crawl_frontier WHERE job_id IN (SELECT id FROM crawl_jobs WHERE collection_id = ?)", (collection_id,))
+    cursor.execute("DELETE FROM crawl_jobs WHERE collection_id = ?", (collection_id,))
+    db.commit()
+
+def add_frontier_urls(db: Connection, job_id: str, entries: List[FrontierEntry]):
+    if not entries:
+        return
+    cursor = db.cursor()
+    cursor.executemany(
+        "INSERT OR IGNORE INTO crawl_frontier (job_id, url, depth, lastmod, done) VALUES (?, ?, ?, ?, 0)",
+        [(job_id, url, depth, lastmod) for url, depth, lastmod in entries],
+    )
+    db.commit()
+
+def mark_url_done(db: Connection, job_id: str, url: str, indexed: bool = False):
+    cursor = db.cursor()
+    cursor.execute("UPDATE crawl_frontier SET done = 1 WHERE job_id = ? AND url = ?", (job_id, url))
+    if indexed:
+        cursor.execute("UPDATE crawl_jobs SET pages_indexed = pages_indexed + 1, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (job_id,))
+    db.commit()
+
+def get_frontier(db: Connection, job_id: str) -> Tuple[Set[str], List[FrontierEntry]]:
+    """Returns (every URL of the job, entries of the URLs not crawled yet in discovery order)."""
+    cursor = db.cursor()
+    cursor.execute("SELECT url, depth, lastmod, done FROM crawl_frontier WHERE job_id = ? ORDER BY rowid", (job_id,))
+    visited, queued = set(), []
+    for url, depth, lastmod, done in cursor.fetchall():
+        visited.add(url)
+        if not done:
+            queued.append((url, depth, lastmod))
+    return visited, queued
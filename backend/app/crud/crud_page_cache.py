@@ -0,0 +1,33 @@
+import json
+from sqlite3 import Connection
+from typing import Optional
+
+from app.schemas.page_cache import PageCacheEntry
+
+
+def get_page(db: Connection, collection_id: str, url: str) -> Optional[PageCacheEntry]:
+    cursor = db.cursor()
+    cursor.execute(
+        "SELECT collection_id, url, etag, last_modified, content_hash, text_hash, links, fingerprint, fetched_at FROM page_cache WHERE collection_id = ? AND url = ?",
+        (collection_id, url),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    entry = dict(zip(["collection_id", "url", "etag", "last_modified", "content_hash", "text_hash", "links", "fingerprint", "fetched_at"], row))
+    entry["links"] = json.loads(entry["links"] or "[]")
+    return PageCacheEntry(**entry)
+
+def save_page(db: Connection, entry: PageCacheEntry):
+    cursor = db.cursor()
+    cursor.execute(
+        """INSERT OR REPLACE INTO page_cache (collection_id, url, etag, last_modified, content_hash, text_hash, links, fingerprint, fetched_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)""",
+        (entry.collection_id, entry.url, entry.etag, entry.last_modified, entry.content_hash, entry.text_hash, json.dumps(entry.links), entry.fingerprint),
+    )
+    db.commit()
+
+def delete_pages_by_collection_id(db: Connection, collection_id: str):
+    cursor = db.cursor()
+    cursor.execute("DELETE FROM page_cache WHERE collection_id = ?", (collection_id,))
+    db.commit()
@@ -73,6 +73,66 @@ def create_tables(conn: Optional[Connection] = None):
     VALUES ('CrawlDepth', '1', 'URL Import Depth of crawl')
     """)
 
+    cursor.execute("""
+    INSERT OR IGNORE INTO settings (name, value, description) 
+    VALUES ('CrawlExtractionWorkers', '2', 'Number of processes extracting text from crawled pages. 0 extracts in a thread of the server')
+    """)
+
+    cursor.execute("""
+    INSERT OR IGNORE INTO settings (name, value, description) 
+    VALUES ('CrawlUseSitemap', 'False', 'URL Import finds pages in robots.txt and sitemap.xml instead of following links')
+    """)
+
+    cursor.execute("""
+    INSERT OR IGNORE INTO settings (name, value, description) 
+    VALUES ('EmbeddingMemoryLimitMb', '64', 'Memory ceiling in MB for chunks and embeddings held by one import')
+    """)
+
+    cursor.execute("""
+    INSERT OR IGNORE INTO settings (name, value, description) 
+    VALUES ('EmbeddingWorkers', '0', 'Number of embedding worker processes used by imports. 0 embeds inside the import thread')
+    """)
+
+    cursor.execute("""
+    INSERT OR IGNORE INTO settings (name, value, description) 
+    VALUES ('EmbeddingWorkerThreads', '1', 'Intra-op threads of each embedding worker process')
+    """)
+
+    cursor.execute("""
+    INSERT OR IGNORE INTO settings (name, value, description) 
+    VALUES ('EmbeddingCacheSizeMb', '512', 'Size limit in MB of the embedding cache shared by all collections. 0 disables the cache')
+    """)
+
+    cursor.execute("""
+    INSERT OR IGNORE INTO settings (name, value, description) 
+    VALUES ('NearDuplicatePageDistance', '-1', 'URL Import skips crawled pages whose SimHash differs from an imported page in at most this many of 64 bits, e.g. 6. -1 disables')
+    """)
+
+    cursor.execute("""
+    INSERT OR IGNORE INTO settings (name, value, description) 
+    VALUES ('NearDuplicateChunkDistance', '-1', 'Imports skip new chunks whose SimHash differs from an imported chunk in at most this many of 64 bits, e.g. 6. -1 disables')
+    """)
+
+    cursor.execute("""
+    INSERT OR IGNORE INTO settings (name, value, description) 
+    VALUES ('PdfExtractionWorkers', '2', 'Number of processes extracting the pages of large PDF imports. 0 extracts in the import thread')
+    """)
+
+    cursor.execute("""
+    INSERT OR IGNORE INTO settings (name, value, description) 
+    VALUES ('BulkImportParseWorkers', '4', 'Number of files a bulk import parses at the same time')
+    """)
+
+    cursor.execute("""
+    INSERT OR IGNORE INTO settings (name, value, description) 
+    VALUES ('ParsedTextCache', 'true', 'Keep the compressed text of imported files, so a collection can be rechunked without its files')
+    """)
+
+    cursor.execute("""
+    INSERT OR IGNORE INTO settings (name, value, description) 
+    VALUES ('ParsedTextCacheSizeMb', '1024', 'Size limit in MB of the parsed text cache; the least recently used texts are removed beyond it')
+    """)
+
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS files (
         id TEXT PRIMARY KEY,
@@ -83,6 +143,57 @@ def create_tables(conn: Optional[Connection] = None):
     )
     """)
     
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS chunk_hashes (
+        collection_id TEXT,
+        chunk_id TEXT,
+        source TEXT,
+        hash TEXT,
+        position INTEGER,
+        PRIMARY KEY (collection_id, chunk_id)
+    )
+    """)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunk_hashes_source ON chunk_hashes (collection_id, source)")
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS page_cache (
+        collection_id TEXT,
+        url TEXT,
+        etag TEXT,
+        last_modified TEXT,
+        content_hash TEXT,
+        text_hash TEXT,
+        links TEXT,
+        fingerprint TEXT,
+        fetched_at DATETIME,
+        PRIMARY KEY (collection_id, url)
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS crawl_jobs (
+        id TEXT PRIMARY KEY,
+        collection_id TEXT,
+        url TEXT,
+        import_params TEXT,
+        status TEXT,
+        pages_indexed INTEGER DEFAULT 0,
+        updated_at DATETIME
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS crawl_frontier (
+        job_id TEXT,
+        url TEXT,
+        depth INTEGER,
+        lastmod TEXT,
+        done INTEGER DEFAULT 0,
+        PRIMARY KEY (job_id, url)
+    )
+    """)
+
     cursor.execute(""" 
     CREATE TABLE IF NOT EXISTS summary (
         id TEXT PRIMARY KEY,
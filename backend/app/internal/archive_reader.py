@@ -0,0 +1,66 @@
+import logging
+from pathlib import PurePosixPath
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from typing import IO, Iterable, Iterator, List, Tuple
+
+from app.internal.temp_file_helper import TempFileHelper
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def is_archive(file_name: str) -> bool:
+    return file_name.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _members(path: str) -> Iterator[Tuple[str, IO[bytes]]]:
+    """Yields the name and an open stream of every regular file in a zip or tar archive."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, member
+        return
+    with tarfile.open(path, "r:*") as archive:
+        for info in archive:
+            if info.isfile():
+                member = archive.extractfile(info)
+                if member is not None:
+                    with member:
+                        yield info.name, member
+
+
+def expand_archive(path: str, suffixes: Iterable[str]) -> List[Tuple[str, str]]:
+    """
+    Copies the files of an archive that have one of the suffixes to temporary files, block by block.
+    Member paths are only used as names, never as paths on disk, so an archive cannot write outside
+    the temporary directory. Returns (member name, temporary file path) pairs; the caller removes the files.
+    """
+    suffixes = tuple(suffix.lower() for suffix in suffixes)
+    expanded: List[Tuple[str, str]] = []
+    try:
+        for name, member in _members(path):
+            name = str(PurePosixPath(name.replace("\\", "/")))
+            suffix = PurePosixPath(name).suffix.lower()
+            # Hidden files and macOS resource forks are not documents
+            if suffix not in suffixes or any(part.startswith(".") or part == "__MACOSX" for part in PurePosixPath(name).parts):
+                continue
+            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+                expanded.append((name, temp_file.name))
+                shutil.copyfileobj(member, temp_file, COPY_BLOCK_SIZE)
+    except Exception:
+        remove_files(temp_path for _, temp_path in expanded)
+        raise
+    logger.info(f"Expanded {len(expanded)} files from archive {path}")
+    return expanded
+
+
+def remove_files(paths: Iterable[str]) -> None:
+    for path in paths:
+        TempFileHelper.remove_temp(path)
@@ -4,14 +4,19 @@ import queue
 import uuid
 import time
 import asyncio
+import logging
+from typing import Callable, Optional
 from app.crud import crud_task
 from app.internal.message_hub import MessageHub
 
+logger = logging.getLogger(__name__)
+
 class BackgroundTaskDispatcher:
     def __init__(self, message_hub: MessageHub, db:Connection, num_workers=4):
         self.task_id_queue = queue.Queue()
         self.waiting_tasks = {}
         self.running_tasks = {}
+        self.discard_callbacks = {}
         self.lock = threading.Lock()
         self.num_workers = num_workers
         self.workers = []
@@ -36,6 +41,7 @@ class BackgroundTaskDispatcher:
             with self.lock:
                 if task_id in self.waiting_tasks:
                     task_func, args, kwargs = self.waiting_tasks.pop(task_id)
+                    self.discard_callbacks.pop(task_id, None)
                     cancellation_event = kwargs.get('cancel_event')
                     if cancellation_event is None:
                         cancellation_event = threading.Event()
@@ -62,7 +68,11 @@ class BackgroundTaskDispatcher:
                     crud_task.delete_task(self.db, task_id)
                     self.message_hub.send_task_message('Task deleted')
 
-    def add_task(self, collection_id: str, task_name: str, task_func, *args, **kwargs):
+    def add_task(self, collection_id: str, task_name: str, task_func, *args, on_discard: Optional[Callable[[], None]] = None, **kwargs):
+        """
+        Queues task_func(collection_id, *args, **kwargs). on_discard is called instead of the task
+        when it is cancelled before it starts, to release what was prepared for it (e.g. a spooled upload).
+        """
         task_id = str(uuid.uuid4())
         start_time = int(time.time())
         crud_task.create_task(self.db, task_id, collection_id, task_name, start_time, "NEW")
@@ -71,22 +81,33 @@ class BackgroundTaskDispatcher:
         with self.lock:
             new_args = (collection_id,) + args
             self.waiting_tasks[task_id] = (task_func, new_args, kwargs)
+            if on_discard is not None:
+                self.discard_callbacks[task_id] = on_discard
         self.task_id_queue.put(task_id)
         return task_id
 
     def cancel_task(self, task_id: str):
+        on_discard = None
         with self.lock:
             if task_id in self.waiting_tasks:
                 del self.waiting_tasks[task_id]
+                on_discard = self.discard_callbacks.pop(task_id, None)
                 crud_task.update_task_status(self.db, task_id, "CANCELLING")
                 self.message_hub.send_task_message('Task cancelled')
-                return True
             elif task_id in self.running_tasks:
                 self.running_tasks[task_id].set()
                 crud_task.update_task_status(self.db, task_id, "CANCELLING")
                 self.message_hub.send_task_message('Task cancelled')
                 return True
-        return False
+            else:
+                return False
+        # Outside the lock: the callback does file and database work, and its failure must not undo the cancel
+        if on_discard is not None:
+            try:
+                on_discard()
+            except Exception:
+                logger.exception(f"Discard callback of task {task_id} failed")
+        return True
 
     def stop(self):
         for _ in range(self.num_workers):
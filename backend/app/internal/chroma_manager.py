@@ -0,0 +1,128 @@
+import threading
+import time
+from typing import Any, Dict, Optional
+import chromadb
+
+CHROMA_PATH = "./chroma_data"
+# Metadata field numbering the records of a collection in the order they were stored
+SEQUENCE_KEY = "seq"
+
+
+class ChromaManager:
+    """
+    Process-wide owner of the Chroma client.
+    The client is opened once and collection handles are cached by name, so request
+    handlers, dispatcher workers and MCP server threads share the same connection.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._client = None
+        self._collections: Dict[str, Any] = {}
+        self._counts: Dict[str, int] = {}
+        self._count_versions: Dict[str, int] = {}
+        self._client_lock = threading.RLock()
+        self._write_locks: Dict[str, threading.RLock] = {}
+        self._last_sequence = 0
+
+    def get_client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = chromadb.PersistentClient(path=CHROMA_PATH)
+        return self._client
+
+    def get_collection(self, name: str):
+        """Returns the cached handle of an existing collection. Raises if the collection does not exist."""
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        with self._client_lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = self.get_client().get_collection(name=name)
+                self._collections[name] = collection
+            return collection
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None):
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        with self._client_lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = self.get_client().get_or_create_collection(name=name, metadata=metadata)
+                self._collections[name] = collection
+            return collection
+
+    def delete_collection(self, name: str) -> None:
+        with self._client_lock:
+            self._collections.pop(name, None)
+            self.invalidate_count(name)
+            self.get_client().delete_collection(name=name)
+
+    def count(self, name: str) -> int:
+        """Returns the number of records in a collection, cached until the collection is written to."""
+        count = self._counts.get(name)
+        if count is not None:
+            return count
+        version = self._count_versions.get(name, 0)
+        count = self.get_collection(name).count()
+        with self._client_lock:
+            # Skip caching if a writer invalidated the count while it was being computed
+            if self._count_versions.get(name, 0) == version:
+                self._counts[name] = count
+        return count
+
+    def invalidate_count(self, name: str) -> None:
+        """Must be called after records are added to or removed from the collection."""
+        with self._client_lock:
+            self._count_versions[name] = self._count_versions.get(name, 0) + 1
+            self._counts.pop(name, None)
+
+    def write_lock(self, name: str) -> threading.RLock:
+        """
+        Lock held while records are added to or removed from a collection, so records are stored
+        in the order of their sequence numbers.
+        """
+        with self._client_lock:
+            return self._write_locks.setdefault(name, threading.RLock())
+
+    def next_sequence(self, count: int) -> int:
+        """
+        Reserves `count` consecutive sequence numbers and returns the first one.
+        Numbers start from the current time in microseconds, so they keep growing across restarts.
+        """
+        with self._client_lock:
+            first = max(self._last_sequence + 1, time.time_ns() // 1000)
+            self._last_sequence = first + max(count, 1) - 1
+            return first
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """Drops one cached collection handle, or all of them when name is None."""
+        with self._client_lock:
+            if name is None:
+                self._collections.clear()
+                self._counts.clear()
+            else:
+                self._collections.pop(name, None)
+                self.invalidate_count(name)
+
+    def reset(self) -> None:
+        """Drops the client and every cached handle. The next call opens a new client."""
+        with self._client_lock:
+            self._collections.clear()
+            self._counts.clear()
+            self._client = None
+
+
+chroma_manager = ChromaManager()
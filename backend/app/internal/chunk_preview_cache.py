@@ -0,0 +1,117 @@
+from array import array
+from collections import OrderedDict
+import os
+from threading import Lock
+from typing import List, Optional, Tuple
+
+from app.internal.chunker import Chunker, ChunkType, create_chunker
+from app.internal.staging_store import staging_store
+
+MAX_CACHED_FILES = 16  # chunkings of staged texts kept between preview requests
+
+
+class ChunkBoundaries:
+    """
+    Chunk boundaries of one staged text for one chunking, computed only as far as previews have asked.
+    Chunking resumes where the previous request stopped, and a page of chunks is read back from the
+    staged text by decompressing only the blocks it spans.
+    """
+
+    def __init__(self, path: str, chunker: Chunker, chunk_type: ChunkType, chunk_size: int, chunk_overlap: int):
+        self.path = path
+        self.starts = array("q")
+        self.ends = array("q")
+        self.complete = False
+        self._text = staging_store.open(path)
+        # Taken once the file is open, as opening converts a file staged by an earlier version
+        self.stamp = file_stamp(path)
+        self._chunks = chunker.iter_chunks(self._text.iter_blocks(), chunk_type, chunk_size, chunk_overlap)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def extend(self, count: int) -> None:
+        """Chunks the text until `count` chunk boundaries are known or the text ends."""
+        while not self.complete and len(self.starts) < count:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self.complete = True
+                return
+            self.starts.append(chunk.start)
+            self.ends.append(chunk.end)
+
+    def read(self, first: int, last: int) -> List[str]:
+        """Reads chunks first..last (exclusive) back from the staged text."""
+        if first >= last:
+            return []
+        start = self.starts[first]
+        text = self._text.read(start, max(self.ends[first:last]))
+        return [text[self.starts[i] - start:self.ends[i] - start] for i in range(first, last)]
+
+    def close(self) -> None:
+        self._chunks.close()
+        self._text.close()
+
+
+def file_stamp(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ChunkPreviewCache:
+    """
+    Keeps the chunk boundaries of recently previewed staged texts per (file_id, chunk_type, size, overlap),
+    so paging through a preview chunks each part of the file once and reads only the requested page.
+    TOKEN chunkings are also keyed by the embedding model, whose tokenizer counts their tokens.
+    """
+
+    def __init__(self, max_files: int = MAX_CACHED_FILES):
+        self.max_files = max_files
+        self._entries: "OrderedDict[tuple, ChunkBoundaries]" = OrderedDict()
+        self._lock = Lock()
+
+    def get_page(self, file_id: str, path: str, chunk_type: ChunkType, chunk_size: int, chunk_overlap: int,
+                 skip: int, take: int, model_name: Optional[str] = None) -> Tuple[List[str], bool]:
+        """
+        Returns chunks skip..skip+take of the file and whether there are more after them.
+
+        Raises:
+            FileNotFoundError: If the staged file does not exist.
+        """
+        key = (file_id, chunk_type, chunk_size, chunk_overlap, model_name if chunk_type == ChunkType.TOKEN else None)
+        with self._lock:
+            boundaries = self._entry(key, path, chunk_type, chunk_size, chunk_overlap)
+            try:
+                # One chunk past the page tells if there are more
+                boundaries.extend(skip + take + 1)
+            except Exception:
+                self._remove(key)
+                raise
+            more_chunks = len(boundaries) > skip + take
+            return boundaries.read(skip, min(skip + take, len(boundaries))), more_chunks
+
+    def _entry(self, key: tuple, path: str, chunk_type: ChunkType, chunk_size: int, chunk_overlap: int) -> ChunkBoundaries:
+        boundaries: Optional[ChunkBoundaries] = self._entries.get(key)
+        if boundaries is not None and (boundaries.path != path or not os.path.exists(path) or boundaries.stamp != file_stamp(path)):
+            # The staged file was replaced or removed since it was chunked
+            self._remove(key)
+            boundaries = None
+        if boundaries is None:
+            boundaries = ChunkBoundaries(path, create_chunker(chunk_type, key[4]), chunk_type, chunk_size, chunk_overlap)
+            self._entries[key] = boundaries
+            while len(self._entries) > self.max_files:
+                self._remove(next(iter(self._entries)))
+        self._entries.move_to_end(key)
+        return boundaries
+
+    def discard(self, file_id: str) -> None:
+        """Drops the cached chunkings of a file, e.g. before its staged file is removed."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == file_id]:
+                self._remove(key)
+
+    def _remove(self, key: tuple) -> None:
+        self._entries.pop(key).close()
+
+
+chunk_preview_cache = ChunkPreviewCache()
@@ -0,0 +1,208 @@
+import hashlib
+from sqlite3 import Connection
+from threading import Event
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.crud.crud_chunk_hash import delete_chunk_hashes, get_source_hashes, save_chunk_hashes
+from app.internal.chroma_manager import chroma_manager
+from app.internal.chunker import Chunk
+from app.internal.embedding_pipeline import MAX_CHROMA_BATCH_SIZE, EmbeddingPipeline
+from app.internal.near_duplicates import NearDuplicateIndex
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def make_chunk_id(source: str, chunk_hash: str) -> str:
+    return f"{source}_{chunk_hash}"
+
+
+class ChunkSyncResult:
+    def __init__(self):
+        self.added = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.duplicates = 0
+        self.near_duplicates = 0
+        self.chunks = 0
+        self.completed = True
+        self.error: Optional[Exception] = None
+
+    def summary(self) -> str:
+        return (f"{self.added} new, {self.unchanged} unchanged, {self.removed} removed, {self.duplicates} duplicates, "
+                f"{self.near_duplicates} near-duplicates skipped")
+
+
+class ChunkSync:
+    """
+    Makes the chunks stored for one source (a file or a crawled page) mirror its current content.
+    Chunk ids are derived from content hashes and indexed in the chunk_hashes table:
+    chunks that are already stored are kept without re-embedding, new ones are embedded,
+    and chunks that are no longer in the source are deleted.
+    With a near-duplicate index, new chunks too similar to a chunk seen before in the same import are
+    skipped like exact duplicates: they are not embedded. Chunks already stored are always kept.
+    Chunks from the Chunker also get their start/end offsets in the source text in the metadata.
+    """
+
+    def __init__(self, db: Connection, collection, collection_id: str, source: str):
+        self.db = db
+        self.collection = collection
+        self.collection_id = collection_id
+        self.source = source
+
+    def run(self, chunks: Iterable[str], embedder, batch_size: int, cancel_event: Event,
+            on_batch: Optional[Callable[[int, int], None]] = None,
+            near_duplicates: Optional[NearDuplicateIndex] = None) -> ChunkSyncResult:
+        """
+        Chunks are read in one pass and new ones are embedded as they come, so a streamed
+        source (Chunker.iter_chunks) is never held in memory; only the chunk hashes are.
+        """
+        pipeline = EmbeddingPipeline(self.collection, embedder, batch_size, cancel_event, on_batch=on_batch)
+        completed = pipeline.run(self.records(chunks, near_duplicates))
+        return self.finish(pipeline.stored, completed)
+
+    @staticmethod
+    def run_many(collection, sources: Iterable[Tuple["ChunkSync", Iterable[str]]], embedder, batch_size: int, cancel_event: Event,
+                 on_batch: Optional[Callable[[int, int], None]] = None,
+                 near_duplicates: Optional[NearDuplicateIndex] = None,
+                 on_error: Optional[Callable[["ChunkSync", Exception], None]] = None) -> List[ChunkSyncResult]:
+        """
+        Syncs several sources of one collection through a single embedding pipeline, so the new
+        chunks of small sources share batches. Returns the results of the sources that were started,
+        in order; after a cancel, the sources not stored completely are not completed.
+        A source whose chunks fail to be read is reported to on_error and skipped: its result is not
+        completed and carries the error, and the chunks of it that were stored are still indexed.
+        """
+        started: List[ChunkSync] = []
+        errors: Dict[int, Exception] = {}
+
+        def records() -> Iterator[Tuple[str, str, dict]]:
+            for sync, chunks in sources:
+                started.append(sync)
+                try:
+                    yield from sync.records(chunks, near_duplicates)
+                except Exception as e:
+                    errors[len(started) - 1] = e
+                    if on_error is not None:
+                        on_error(sync, e)
+
+        pipeline = EmbeddingPipeline(collection, embedder, batch_size, cancel_event, on_batch=on_batch)
+        completed = pipeline.run(records())
+
+        # Records are stored in order: the stored ones are the first new chunks of the sources in turn
+        remaining = pipeline.stored
+        results = []
+        for index, sync in enumerate(started):
+            stored = min(remaining, len(sync.new_ids))
+            remaining -= stored
+            failed = index in errors
+            result = sync.finish(stored, not failed and (completed or (sync.consumed and stored == len(sync.new_ids))))
+            result.error = errors.get(index)
+            results.append(result)
+        return results
+
+    def records(self, chunks: Iterable[str], near_duplicates: Optional[NearDuplicateIndex] = None) -> Iterator[Tuple[str, str, dict]]:
+        """Yields the (id, document, metadata) records of the new chunks, to embed and store in this order."""
+        self.result = ChunkSyncResult()
+        self.indexed = get_source_hashes(self.db, self.collection_id, self.source)
+        # chunk_id -> (hash, position of first occurrence); repeated chunks are stored once
+        self.current: Dict[str, Tuple[str, int]] = {}
+        # chunk_id -> (start, end) of kept chunks that carry their offsets
+        self.offsets: Dict[str, Tuple[int, int]] = {}
+        self.new_ids: List[str] = []
+        self.consumed = False
+        ts = int(time.time())
+
+        for position, chunk in enumerate(chunks):
+            self.result.chunks += 1
+            chunk_hash = content_hash(chunk)
+            chunk_id = make_chunk_id(self.source, chunk_hash)
+            if chunk_id in self.current:
+                self.result.duplicates += 1
+                continue
+            span = (chunk.start, chunk.end) if isinstance(chunk, Chunk) else None
+            if chunk_id in self.indexed:
+                # A stored chunk is never dropped as a near-duplicate, only chunks that would be new
+                if near_duplicates is not None:
+                    near_duplicates.add(chunk)
+                self.current[chunk_id] = (chunk_hash, position)
+                if span is not None:
+                    self.offsets[chunk_id] = span
+                continue
+            if near_duplicates is not None and near_duplicates.is_duplicate(chunk):
+                self.result.near_duplicates += 1
+                continue
+            self.current[chunk_id] = (chunk_hash, position)
+            self.new_ids.append(chunk_id)
+            yield chunk_id, str(chunk), self._metadata(self.current[chunk_id], ts, span)
+        self.consumed = True
+
+    def finish(self, stored: int, completed: bool) -> ChunkSyncResult:
+        """
+        Indexes the first `stored` new chunks and updates the kept ones. Once the source is stored
+        completely, chunks that are no longer in it are deleted.
+        """
+        result, current, indexed = self.result, self.current, self.indexed
+        kept_ids = [chunk_id for chunk_id in current if chunk_id in indexed]
+        result.unchanged = len(kept_ids)
+        self._update_positions(kept_ids, current, indexed, self.offsets)
+
+        result.added = stored
+        save_chunk_hashes(self.db, self.collection_id, self.source,
+                          [(chunk_id, *current[chunk_id]) for chunk_id in self.new_ids[:stored]])
+        if not completed:
+            result.completed = False
+            return result
+
+        removed_ids = [chunk_id for chunk_id in indexed if chunk_id not in current]
+        self._delete(removed_ids)
+        result.removed = len(removed_ids)
+        if not indexed:
+            result.removed += self._remove_unindexed(current)
+        return result
+
+    def _metadata(self, entry: Tuple[str, int], ts: int, span: Optional[Tuple[int, int]] = None) -> dict:
+        chunk_hash, position = entry
+        return {"source": self.source, "ts": ts, "hash": chunk_hash, **self._location(position, span)}
+
+    def _update_positions(self, kept_ids: List[str], current: Dict[str, Tuple[str, int]], indexed: Dict[str, Tuple[str, int]],
+                          offsets: Dict[str, Tuple[int, int]]) -> None:
+        moved_ids = [chunk_id for chunk_id in kept_ids if current[chunk_id][1] != indexed[chunk_id][1]]
+        # Offsets are not indexed: an edit earlier in the source shifts them without moving the chunk
+        updated_ids = [chunk_id for chunk_id in kept_ids if chunk_id in offsets or current[chunk_id][1] != indexed[chunk_id][1]]
+        for start in range(0, len(updated_ids), MAX_CHROMA_BATCH_SIZE):
+            ids = updated_ids[start:start + MAX_CHROMA_BATCH_SIZE]
+            self.collection.update(ids=ids, metadatas=[self._location(current[chunk_id][1], offsets.get(chunk_id)) for chunk_id in ids])
+        if moved_ids:
+            save_chunk_hashes(self.db, self.collection_id, self.source,
+                              [(chunk_id, *current[chunk_id]) for chunk_id in moved_ids])
+
+    @staticmethod
+    def _location(position: int, span: Optional[Tuple[int, int]]) -> dict:
+        if span is None:
+            return {"chunk": position}
+        return {"chunk": position, "start": span[0], "end": span[1]}
+
+    def _delete(self, chunk_ids: List[str]) -> None:
+        if not chunk_ids:
+            return
+        with chroma_manager.write_lock(self.collection.name):
+            for start in range(0, len(chunk_ids), MAX_CHROMA_BATCH_SIZE):
+                self.collection.delete(ids=chunk_ids[start:start + MAX_CHROMA_BATCH_SIZE])
+        delete_chunk_hashes(self.db, self.collection_id, chunk_ids)
+        chroma_manager.invalidate_count(self.collection.name)
+
+    def _remove_unindexed(self, current: Dict[str, Tuple[str, int]]) -> int:
+        """
+        Deletes chunks of this source stored before the hash index existed
+        (ids based on timestamps or positions), so the first re-sync does not leave duplicates.
+        """
+        stored = self.collection.get(where={"source": self.source}, include=[])
+        stale_ids = [chunk_id for chunk_id in stored["ids"] if chunk_id not in current]
+        if stale_ids:
+            with chroma_manager.write_lock(self.collection.name):
+                for start in range(0, len(stale_ids), MAX_CHROMA_BATCH_SIZE):
+                    self.collection.delete(ids=stale_ids[start:start + MAX_CHROMA_BATCH_SIZE])
+            chroma_manager.invalidate_count(self.collection.name)
+        return len(stale_ids)
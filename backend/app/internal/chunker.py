@@ -1,26 +1,316 @@
+from array import array
+from collections.abc import Sequence
 from enum import Enum
-from typing import List
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from itertools import accumulate
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app.internal.embedding_manager import get_chunk_tokenizer
 
 class ChunkType(str, Enum):
     DEFAULT = "DEFAULT"
     RECURSIVE_CHARACTER = "RECURSIVE_CHARACTER"
+    TOKEN = "TOKEN"
+
+STREAM_WINDOW_CHUNKS = 64  # chunk sizes of text the streaming recursive splitter splits at once
+TOKEN_BATCH_CHARS = 256 * 1024  # characters of text tokenized in one encode_batch call
+TOKEN_PIECE_CHARS = 4096  # the batch is split at whitespace into pieces of about this size, tokenized in parallel
+CHARS_PER_TOKEN = 4  # rough average, used to size embedding batches of TOKEN chunks
+
+class Chunk(str):
+    """A chunk string that knows its (start, end) offsets in the source text."""
+
+    def __new__(cls, text: str, start: int, end: int):
+        chunk = super().__new__(cls, text)
+        chunk.start = start
+        chunk.end = end
+        return chunk
+
+class ChunkSpans(Sequence):
+    """
+    Chunks of a text kept as (start, end) offsets into it, in two compact integer arrays.
+    A chunk string is only created when the chunk is read, so overlapping chunks never
+    hold their own copies of the overlap and the chunk list costs 16 bytes per chunk.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.starts = array("q")
+        self.ends = array("q")
+
+    def append(self, start: int, end: int) -> None:
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def span(self, index: int) -> Tuple[int, int]:
+        return self.starts[index], self.ends[index]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Chunk(self.text[start:end], start, end) for start, end in zip(self.starts[index], self.ends[index])]
+        start, end = self.starts[index], self.ends[index]
+        return Chunk(self.text[start:end], start, end)
+
+class RecursiveSplitter:
+    """
+    Splits text like langchain's RecursiveCharacterTextSplitter with its defaults (separators
+    "\n\n", "\n", " ", "", kept at the start of the next piece, chunks stripped of whitespace)
+    and returns the chunks as (start, end) offsets. Pieces are kept as offsets into the text and merged
+    by their lengths, so no piece or chunk string is joined, and a span is split with one str.split()
+    instead of a regex search and a regex split at every level.
+    """
+
+    SEPARATORS = ("\n\n", "\n", " ", "")
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size must be > 0, got {chunk_size}")
+        if chunk_overlap < 0:
+            raise ValueError(f"chunk_overlap must be >= 0, got {chunk_overlap}")
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size}), should be smaller.")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split_spans(self, text: str) -> List[Tuple[int, int]]:
+        spans: List[Tuple[int, int]] = []
+        self._split(text, 0, len(text), 0, spans)
+        return spans
+
+    def _split(self, text: str, start: int, end: int, level: int, spans: List[Tuple[int, int]]) -> None:
+        # The first separator found in the span splits it; its pieces are split further with the next ones
+        separator = ""
+        while level < len(self.SEPARATORS):
+            separator = self.SEPARATORS[level]
+            level += 1
+            if not separator or text.find(separator, start, end) >= 0:
+                break
+        bounds = self._piece_bounds(text, start, end, separator)
+        last_level = level >= len(self.SEPARATORS)
+
+        good = 0  # first piece of the current run of pieces shorter than chunk_size
+        for index in range(len(bounds) - 1):
+            if bounds[index + 1] - bounds[index] < self.chunk_size:
+                continue
+            if good < index:
+                self._merge(text, bounds, good, index, spans)
+            good = index + 1
+            if last_level:
+                spans.append((bounds[index], bounds[index + 1]))
+            else:
+                self._split(text, bounds[index], bounds[index + 1], level, spans)
+        if good < len(bounds) - 1:
+            self._merge(text, bounds, good, len(bounds) - 1, spans)
+
+    @staticmethod
+    def _piece_bounds(text: str, start: int, end: int, separator: str) -> List[int]:
+        """
+        Offsets where the pieces of the span start, followed by the span end. Every piece but the first
+        starts with the separator; an empty first piece is dropped.
+        """
+        if not separator:
+            return list(range(start, end + 1))
+        parts = text[start:end].split(separator)
+        bounds = list(accumulate((len(part) + len(separator) for part in parts[1:]), initial=start + len(parts[0])))
+        if parts[0]:
+            bounds.insert(0, start)
+        return bounds
+
+    def _merge(self, text: str, bounds: List[int], first: int, last: int, spans: List[Tuple[int, int]]) -> None:
+        """Merges pieces first..last (exclusive) into chunks of up to chunk_size, overlapping by up to chunk_overlap."""
+        current = first  # first piece of the current chunk
+        total = 0
+        for index in range(first, last):
+            length = bounds[index + 1] - bounds[index]
+            if total + length > self.chunk_size and index > current:
+                self._add_stripped(text, bounds[current], bounds[index], spans)
+                while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                    total -= bounds[current + 1] - bounds[current]
+                    current += 1
+            total += length
+        if last > current:
+            self._add_stripped(text, bounds[current], bounds[last], spans)
+
+    @staticmethod
+    def _add_stripped(text: str, start: int, end: int, spans: List[Tuple[int, int]]) -> None:
+        chunk = text[start:end]
+        stripped = chunk.lstrip()
+        start += len(chunk) - len(stripped)
+        stripped = stripped.rstrip()
+        if stripped:
+            spans.append((start, start + len(stripped)))
 
 class Chunker:
-    def _chunk_default(self, text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
-        return [text[i:i+chunk_size] for i in range(0, len(text), chunk_size - chunk_overlap)]
-
-    def _chunk_recursive(self, text: str, chunk_size: int, chunk_overlap: int) -> List[str]:
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-        )
-        return text_splitter.split_text(text)
-
-    def create_chunks(self, text: str, chunk_type: ChunkType | None, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """
+    Splits text into chunks of chunk_size characters, or of chunk_size tokens for ChunkType.TOKEN.
+    TOKEN chunking counts tokens with the embedding model's own tokenizer, so it needs the tokenizer
+    and the number of tokens the model embeds (see create_chunker).
+    """
+
+    def __init__(self, tokenizer=None, max_tokens: Optional[int] = None):
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+
+    def _chunk_default(self, text: str, chunk_size: int, chunk_overlap: int) -> ChunkSpans:
+        spans = ChunkSpans(text)
+        starts = range(0, len(text), chunk_size - chunk_overlap)
+        spans.starts = array("q", starts)
+        spans.ends = array("q", (min(start + chunk_size, len(text)) for start in starts))
+        return spans
+
+    def _chunk_recursive(self, text: str, chunk_size: int, chunk_overlap: int) -> ChunkSpans:
+        spans = ChunkSpans(text)
+        for start, end in self._split_recursive(text, chunk_size, chunk_overlap):
+            spans.append(start, end)
+        return spans
+
+    def _split_recursive(self, text: str, chunk_size: int, chunk_overlap: int) -> List[Tuple[int, int]]:
+        return RecursiveSplitter(chunk_size, chunk_overlap).split_spans(text)
+
+    def _iter_default(self, segments: Iterable[str], chunk_size: int, chunk_overlap: int) -> Iterator[Chunk]:
+        step = chunk_size - chunk_overlap
+        if step == 0:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        if step < 0:
+            return
+        # buffer holds the text from the previous chunk start on; base is its offset in the stream
+        buffer, base, position = "", 0, 0
+        for segment in segments:
+            buffer = buffer[position:] + segment
+            base += position
+            position = 0
+            while len(buffer) - position >= chunk_size:
+                yield Chunk(buffer[position:position + chunk_size], base + position, base + position + chunk_size)
+                position += step
+        while position < len(buffer):
+            end = min(position + chunk_size, len(buffer))
+            yield Chunk(buffer[position:end], base + position, base + end)
+            position += step
+
+    def _iter_recursive(self, segments: Iterable[str], chunk_size: int, chunk_overlap: int) -> Iterator[Chunk]:
+        # The splitter needs its whole input: split windows of the stream cut at paragraph or line breaks
+        window = max(chunk_size * STREAM_WINDOW_CHUNKS, 1)
+        buffer, base, position = "", 0, 0
+        for segment in segments:
+            buffer = buffer[position:] + segment
+            base += position
+            position = 0
+            while len(buffer) - position >= window:
+                cut = self._window_end(buffer, position, window)
+                yield from self._window_chunks(buffer[position:cut], base + position, chunk_size, chunk_overlap)
+                position = cut
+        if position < len(buffer):
+            yield from self._window_chunks(buffer[position:], base + position, chunk_size, chunk_overlap)
+
+    def _window_chunks(self, text: str, base: int, chunk_size: int, chunk_overlap: int) -> Iterator[Chunk]:
+        for start, end in self._split_recursive(text, chunk_size, chunk_overlap):
+            yield Chunk(text[start:end], base + start, base + end)
+
+    @staticmethod
+    def _window_end(buffer: str, position: int, window: int) -> int:
+        for separator in ("\n\n", "\n", " "):
+            index = buffer.rfind(separator, position + window // 2, position + window)
+            if index >= 0:
+                return index + len(separator)
+        return position + window
+
+    def _iter_token(self, segments: Iterable[str], chunk_size: int, chunk_overlap: int) -> Iterator[Chunk]:
+        if self.tokenizer is None:
+            raise ValueError("TOKEN chunks need the tokenizer of the embedding model")
+        if self.max_tokens:
+            # Longer chunks would be truncated by the model: their end would never be embedded
+            chunk_size = min(chunk_size, self.max_tokens)
+        step = chunk_size - chunk_overlap
+        if step <= 0:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        # text holds the stream from offset base on; tokens are the spans from the current chunk start on
+        text, base = "", 0
+        tokens: List[Tuple[int, int]] = []
+        covered = 0  # leading tokens that are already part of a yielded chunk
+        for batch, batch_base, spans in self._tokenize(segments):
+            text += batch
+            tokens.extend(spans)
+            while len(tokens) >= chunk_size:
+                start, end = tokens[0][0], tokens[chunk_size - 1][1]
+                yield Chunk(text[start - base:end - base], start, end)
+                del tokens[:step]
+                covered = chunk_overlap
+            # Drop the text before the next chunk
+            cut = (tokens[0][0] if tokens else batch_base + len(batch)) - base
+            text, base = text[cut:], base + cut
+        if len(tokens) > covered:
+            start, end = tokens[0][0], tokens[-1][1]
+            yield Chunk(text[start - base:end - base], start, end)
+
+    def _tokenize(self, segments: Iterable[str]) -> Iterator[Tuple[str, int, List[Tuple[int, int]]]]:
+        """Yields the stream in batches cut at whitespace, with the spans of their tokens in the stream."""
+        pending, base = "", 0
+        for segment in segments:
+            pending += segment
+            if len(pending) < TOKEN_BATCH_CHARS:
+                continue
+            cut = self._piece_end(pending, len(pending), 0, final=False)
+            yield pending[:cut], base, self._token_spans(pending[:cut], base)
+            pending, base = pending[cut:], base + cut
+        if pending:
+            yield pending, base, self._token_spans(pending, base)
+
+    def _token_spans(self, text: str, base: int) -> List[Tuple[int, int]]:
+        pieces, starts = [], []
+        position = 0
+        while position < len(text):
+            end = self._piece_end(text, min(position + TOKEN_PIECE_CHARS, len(text)), position)
+            pieces.append(text[position:end])
+            starts.append(base + position)
+            position = end
+        spans = []
+        for start, encoding in zip(starts, self.tokenizer.encode_batch(pieces, add_special_tokens=False)):
+            spans.extend((start + token_start, start + token_end) for token_start, token_end in encoding.offsets)
+        return spans
+
+    @staticmethod
+    def _piece_end(text: str, end: int, start: int = 0, final: bool = True) -> int:
+        """Moves end back to a whitespace, so no word is split between two pieces."""
+        if final and end >= len(text):
+            return len(text)
+        index = max(text.rfind(" ", start + 1, end), text.rfind("\n", start + 1, end))
+        return index if index > start else end
+
+    def create_chunks(self, text: str, chunk_type: ChunkType | None, chunk_size: int, chunk_overlap: int) -> ChunkSpans:
         match chunk_type:
             case ChunkType.RECURSIVE_CHARACTER:
                 return self._chunk_recursive(text, chunk_size, chunk_overlap)
+            case ChunkType.TOKEN:
+                spans = ChunkSpans(text)
+                for chunk in self._iter_token([text], chunk_size, chunk_overlap):
+                    spans.append(chunk.start, chunk.end)
+                return spans
             case _:
                 return self._chunk_default(text, chunk_size, chunk_overlap)
+
+    def iter_chunks(self, segments: Iterable[str], chunk_type: ChunkType | None, chunk_size: int, chunk_overlap: int) -> Iterator[Chunk]:
+        """
+        Chunks a stream of text segments (lines, pages, file blocks) as they come, with offsets in the
+        concatenated text. Only about one chunk (DEFAULT) or one window of chunks (RECURSIVE_CHARACTER)
+        of text is held at a time. DEFAULT chunks equal create_chunks() of the whole text; recursive chunks
+        can differ where a window ends, since windows end at a paragraph or line break.
+        """
+        match chunk_type:
+            case ChunkType.RECURSIVE_CHARACTER:
+                return self._iter_recursive(segments, chunk_size, chunk_overlap)
+            case ChunkType.TOKEN:
+                return self._iter_token(segments, chunk_size, chunk_overlap)
+            case _:
+                return self._iter_default(segments, chunk_size, chunk_overlap)
+
+def create_chunker(chunk_type: ChunkType | None, model_name: Optional[str] = None) -> Chunker:
+    """Returns a Chunker for the chunk type; TOKEN chunks are counted with the tokenizer of the embedding model."""
+    if chunk_type == ChunkType.TOKEN:
+        return Chunker(*get_chunk_tokenizer(model_name))
+    return Chunker()
+
+def chunk_length_chars(chunk_type: ChunkType | None, chunk_size: int) -> int:
+    """Estimated length in characters of a chunk of chunk_size, for sizing embedding batches."""
+    return chunk_size * CHARS_PER_TOKEN if chunk_type == ChunkType.TOKEN else chunk_size
@@ -0,0 +1,35 @@
+from datetime import datetime
+from sqlite3 import Connection
+from typing import List, Optional, Set, Tuple
+
+from app.crud.crud_crawl_job import add_frontier_urls, get_frontier, mark_url_done
+from app.internal.sitemap import parse_lastmod
+
+# (url, depth, lastmod) as the crawler queues it
+CrawlEntry = Tuple[str, int, Optional[datetime]]
+
+
+class CrawlCheckpoint:
+    """
+    On-disk state of one crawl job: every URL the crawl discovered and whether it is done.
+    URLs are written when they are queued and marked done once their page needs nothing
+    more, so a crawl that is cancelled or stopped by a restart continues with the URLs
+    still pending instead of starting over. A page with text is done only once it is stored.
+    """
+
+    def __init__(self, db: Connection, job_id: str):
+        self.db = db
+        self.job_id = job_id
+
+    def restore(self) -> Tuple[Set[str], List[CrawlEntry]]:
+        """Returns (visited URLs, entries still to crawl); both are empty for a job that has not started."""
+        visited, queued = get_frontier(self.db, self.job_id)
+        return visited, [(url, depth, parse_lastmod(lastmod)) for url, depth, lastmod in queued]
+
+    def add(self, entries: List[CrawlEntry]) -> None:
+        add_frontier_urls(self.db, self.job_id, [
+            (url, depth, lastmod.isoformat() if lastmod else None) for url, depth, lastmod in entries
+        ])
+
+    def done(self, url: str, indexed: bool = False) -> None:
+        mark_url_done(self.db, self.job_id, url, indexed)
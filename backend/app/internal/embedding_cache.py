@@ -0,0 +1,170 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional
+import numpy as np
+
+EMBEDDING_CACHE_PATH = "embedding_cache.db"
+DEFAULT_CACHE_SIZE_MB = 512
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of chunk embeddings shared by all collections.
+    Entries are keyed by (model name, sha256 of the chunk text) and stored as float32 blobs.
+    When the stored vectors exceed the size limit, the least recently used entries are evicted.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.path = EMBEDDING_CACHE_PATH
+        self.max_size_bytes = DEFAULT_CACHE_SIZE_MB * 1024 * 1024
+        self._conn: Optional[sqlite3.Connection] = None
+        self._size_bytes = 0
+        self._db_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT,
+                hash TEXT,
+                vector BLOB,
+                last_used REAL,
+                PRIMARY KEY (model, hash)
+            )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+            conn.commit()
+            self._size_bytes = conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def configure(self, max_size_mb: int) -> None:
+        with self._db_lock:
+            self.max_size_bytes = max(max_size_mb, 0) * 1024 * 1024
+            if self._conn is not None:
+                self._evict()
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, model_name: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Returns the cached embeddings of the given hashes and marks them as recently used."""
+        found: Dict[str, np.ndarray] = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        with self._db_lock:
+            conn = self._connection()
+            # Stay below SQLite's limit of bound parameters per statement
+            for start in range(0, len(unique_hashes), 500):
+                part = unique_hashes[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                    (model_name, *part),
+                ).fetchall()
+                for chunk_hash, vector in rows:
+                    found[chunk_hash] = np.frombuffer(vector, dtype=np.float32)
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(now, model_name, chunk_hash) for chunk_hash in found],
+                )
+                conn.commit()
+        return found
+
+    def put_many(self, model_name: str, entries: Dict[str, np.ndarray]) -> None:
+        if not entries:
+            return
+        now = time.time()
+        rows = [(model_name, chunk_hash, np.asarray(vector, dtype=np.float32).tobytes(), now) for chunk_hash, vector in entries.items()]
+        with self._db_lock:
+            conn = self._connection()
+            changes_before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)", rows)
+            # Rows another import cached meanwhile are ignored; vectors of one model all have the same size
+            self._size_bytes += (conn.total_changes - changes_before) * len(rows[0][2])
+            self._evict()
+            conn.commit()
+
+    def _evict(self) -> None:
+        if self._size_bytes <= self.max_size_bytes:
+            return
+        conn = self._conn
+        # Free a little more than needed so that every batch does not trigger another eviction
+        to_free = self._size_bytes - int(self.max_size_bytes * 0.9)
+        freed = 0
+        evicted = []
+        for rowid, size in conn.execute("SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used"):
+            if freed >= to_free:
+                break
+            evicted.append((rowid,))
+            freed += size
+        conn.executemany("DELETE FROM embeddings WHERE rowid = ?", evicted)
+        conn.commit()
+        self._size_bytes -= freed
+
+    def stats(self) -> Dict[str, int]:
+        with self._db_lock:
+            entries = self._connection().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            return {"entries": entries, "size_bytes": self._size_bytes, "max_size_bytes": self.max_size_bytes}
+
+    def clear(self) -> None:
+        with self._db_lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM embeddings")
+            conn.commit()
+            self._size_bytes = 0
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CachedEmbedder:
+    """
+    Wraps an embedder so that chunks embedded before, by any collection with the same model,
+    are read from the embedding cache instead of being embedded again.
+    """
+
+    def __init__(self, embedder, model_name: str, cache: EmbeddingCache):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def embed(self, documents: Iterable[str]) -> Iterator[np.ndarray]:
+        documents = list(documents)
+        hashes = [EmbeddingCache.text_hash(document) for document in documents]
+        cached = self.cache.get_many(self.model_name, hashes)
+
+        missing: Dict[str, str] = {}
+        for chunk_hash, document in zip(hashes, documents):
+            if chunk_hash not in cached:
+                missing.setdefault(chunk_hash, document)
+        self.hits += len(documents) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            embedded = self.embedder.embed(list(missing.values()))
+            computed = {chunk_hash: np.asarray(vector, dtype=np.float32) for chunk_hash, vector in zip(missing, embedded)}
+            self.cache.put_many(self.model_name, computed)
+            cached.update(computed)
+
+        return iter([cached[chunk_hash] for chunk_hash in hashes])
@@ -1,20 +1,230 @@
-from typing import Optional
+from collections import OrderedDict
+import os
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Tuple
 from fastembed import TextEmbedding
+from tokenizers import Tokenizer
 
-_embedder: Optional[TextEmbedding] = None
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+QUERY_CACHE_MAX_SIZE = 1024
+QUERY_CACHE_TTL_SECONDS = 3600
+DEFAULT_MODELS_MEMORY_BUDGET_MB = 2048
 
-def get_embedder() -> TextEmbedding:
+
+class EmbedderRegistry:
+    """
+    Lazily loads one TextEmbedding per model name and keeps the most recently used ones.
+    When the estimated size of loaded models exceeds the memory budget, the least
+    recently used models are dropped; they are freed once no import or query uses them.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.memory_budget_mb = int(os.getenv("EMBEDDING_MODELS_MEMORY_MB", DEFAULT_MODELS_MEMORY_BUDGET_MB))
+        self._models: "OrderedDict[str, TextEmbedding]" = OrderedDict()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+        self._supported: Optional[Dict[str, dict]] = None
+        self._tokenizers: Dict[str, Tuple[Tokenizer, int]] = {}
+
+    def supported_models(self) -> Dict[str, dict]:
+        if self._supported is None:
+            self._supported = {m["model"]: m for m in TextEmbedding.list_supported_models()}
+        return self._supported
+
+    def resolve_model_name(self, model_name: Optional[str]) -> str:
+        """
+        Maps a collection's model setting to a fastembed model name.
+        Accepts full names ("sentence-transformers/all-MiniLM-L6-v2") and short ones ("all-MiniLM-L6-v2").
+        """
+        if not model_name:
+            return DEFAULT_MODEL_NAME
+        supported = self.supported_models()
+        if model_name in supported:
+            return model_name
+        for full_name in supported:
+            if full_name.split("/")[-1].lower() == model_name.lower():
+                return full_name
+        raise ValueError(f"Unsupported embedding model '{model_name}'")
+
+    def get_dimension(self, model_name: Optional[str]) -> int:
+        return self.supported_models()[self.resolve_model_name(model_name)]["dim"]
+
+    def get_size_mb(self, model_name: str) -> float:
+        return self.supported_models().get(model_name, {}).get("size_in_GB", 0) * 1024
+
+    def get(self, model_name: Optional[str] = None) -> TextEmbedding:
+        name = self.resolve_model_name(model_name)
+        with self._registry_lock:
+            embedder = self._models.get(name)
+            if embedder is not None:
+                self._models.move_to_end(name)
+                return embedder
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Load outside the registry lock so other models stay available while this one loads
+        with load_lock:
+            with self._registry_lock:
+                embedder = self._models.get(name)
+            if embedder is None:
+                embedder = TextEmbedding(name, cache_dir='.fastembed')
+                with self._registry_lock:
+                    self._models[name] = embedder
+                    self._evict(keep=name)
+        return embedder
+
+    def get_tokenizer(self, model_name: Optional[str] = None) -> Tuple[Tokenizer, int]:
+        """
+        Returns a copy of the model's fast tokenizer without truncation and padding, to count the tokens
+        of any text, and the number of text tokens the model embeds (its limit minus special tokens).
+        """
+        name = self.resolve_model_name(model_name)
+        with self._registry_lock:
+            cached = self._tokenizers.get(name)
+        if cached is not None:
+            return cached
+        model_tokenizer = self.get(name).model.tokenizer
+        tokenizer = Tokenizer.from_str(model_tokenizer.to_str())
+        tokenizer.no_truncation()
+        tokenizer.no_padding()
+        special_tokens = len(tokenizer.encode("", add_special_tokens=True).ids)
+        max_tokens = (model_tokenizer.truncation or {}).get("max_length", 512) - special_tokens
+        with self._registry_lock:
+            self._tokenizers[name] = (tokenizer, max_tokens)
+        return tokenizer, max_tokens
+
+    def loaded_models(self) -> List[str]:
+        with self._registry_lock:
+            return list(self._models.keys())
+
+    def unload(self, model_name: str) -> None:
+        with self._registry_lock:
+            self._models.pop(self.resolve_model_name(model_name), None)
+
+    def _evict(self, keep: str) -> None:
+        total_mb = sum(self.get_size_mb(name) for name in self._models)
+        for name in list(self._models.keys()):
+            if total_mb <= self.memory_budget_mb:
+                break
+            if name == keep:
+                continue
+            del self._models[name]
+            total_mb -= self.get_size_mb(name)
+            print(f"Embedding model '{name}' unloaded to stay within {self.memory_budget_mb} MB")
+
+
+def get_embedder(model_name: Optional[str] = None) -> TextEmbedding:
+    """
+    Returns the TextEmbedding for the given model, loading it on first use.
+    Without a model name the default model is returned.
+    """
+    # The model is loaded on the first call.
+    # This might introduce a small delay for the first user request
+    # that needs embeddings, but avoids loading it at server startup
+    # if it's not immediately needed.
+    # Fastembed models are generally thread-safe for inference.
+    return EmbedderRegistry().get(model_name)
+
+
+def get_chunk_tokenizer(model_name: Optional[str] = None) -> Tuple[Tokenizer, int]:
+    """Returns the tokenizer TOKEN chunks of the given model are counted with, and the model's token budget per chunk."""
+    return EmbedderRegistry().get_tokenizer(model_name)
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded, thread-safe LRU cache of query embeddings with a time to live.
+    Keys are (model name, normalized query text). Embeddings are stored as tuples and handed out
+    as new lists, so a caller changing its vector does not change the cached one.
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_MAX_SIZE, ttl_seconds: float = QUERY_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Tuple[float, ...]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Unicode-normalizes the text and collapses whitespace, so trivially different queries share an entry."""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    def get(self, model_name: str, text: str) -> Optional[List[float]]:
+        key = (model_name, self.normalize(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            created, embedding = entry
+            if time.monotonic() - created > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(embedding)
+
+    def put(self, model_name: str, text: str, embedding: List[float]) -> None:
+        key = (model_name, self.normalize(text))
+        with self._lock:
+            self._entries[key] = (time.monotonic(), tuple(embedding))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_query_cache = QueryEmbeddingCache()
+
+def get_query_cache() -> QueryEmbeddingCache:
+    return _query_cache
+
+def embed_query(query_text: str, model_name: Optional[str] = None) -> List[float]:
     """
-    Returns a singleton instance of the TextEmbedding model.
-    Initializes the model on the first call.
+    Returns the embedding of a search query, reusing a cached one for repeated queries.
+    The query must be embedded with the model the collection was imported with.
     """
-    global _embedder
-    if _embedder is None:
-        # The model is loaded on the first call.
-        # This might introduce a small delay for the first user request
-        # that needs embeddings, but avoids loading it at server startup
-        # if it's not immediately needed.
-        # Fastembed models are generally thread-safe for inference.
-        model_name = "sentence-transformers/all-MiniLM-L6-v2"
-        _embedder = TextEmbedding(model_name, cache_dir='.fastembed')
-    return _embedder
+    model_name = EmbedderRegistry().resolve_model_name(model_name)
+    cached = _query_cache.get(model_name, query_text)
+    if cached is not None:
+        return cached
+    # Embed the normalized text so every query sharing the cache entry gets the same vector
+    embedding = list(get_embedder(model_name).embed([QueryEmbeddingCache.normalize(query_text)]))[0].tolist()
+    _query_cache.put(model_name, query_text, embedding)
+    return embedding
@@ -0,0 +1,121 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from threading import Event
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+
+from app.internal.chroma_manager import SEQUENCE_KEY, chroma_manager
+
+MAX_CHROMA_BATCH_SIZE = 5000  # safe limit below Chroma's 5461 cap
+DEFAULT_MEMORY_LIMIT_MB = 64
+DEFAULT_EMBEDDING_DIMENSION = 384  # all-MiniLM-L6-v2
+
+# (id, document, metadata) of one chunk ready to be embedded and stored
+ChunkRecord = Tuple[str, str, Dict[str, Any]]
+
+
+def get_batch_size(memory_limit_mb: int, chunk_size: int, embedding_dimension: int = DEFAULT_EMBEDDING_DIMENSION) -> int:
+    """
+    Returns how many chunks fit in one batch so that the pipeline stays under memory_limit_mb.
+
+    Two batches are alive at the same time (one being embedded, one being upserted).
+    Each chunk costs its text (up to 4 bytes per character) plus a float32 vector
+    and the list of Python floats Chroma gets for it (~36 bytes per dimension).
+    """
+    bytes_per_chunk = max(chunk_size, 1) * 4 + embedding_dimension * 36
+    batch_size = (max(memory_limit_mb, 1) * 1024 * 1024) // (2 * bytes_per_chunk)
+    return int(min(max(batch_size, 1), MAX_CHROMA_BATCH_SIZE))
+
+
+class EmbeddingPipeline:
+    """
+    Embeds chunk records in bounded batches and upserts every batch into a Chroma
+    collection while the next batch is being embedded.
+    At most two batches are held in memory, and cancellation is checked between batches.
+    """
+
+    def __init__(self, collection, embedder, batch_size: int, cancel_event: Event,
+                 on_batch: Optional[Callable[[int, int], None]] = None):
+        self.collection = collection
+        self.embedder = embedder
+        self.batch_size = min(max(batch_size, 1), MAX_CHROMA_BATCH_SIZE)
+        self.cancel_event = cancel_event
+        self.on_batch = on_batch
+        self.stored = 0
+        self._batch_num = 0
+
+    def run(self, records: Iterable[ChunkRecord]) -> bool:
+        """
+        Embeds and stores all records.
+        Returns True only if every record was read and stored, False if the cancel event stopped it first.
+        """
+        consumed = False
+        pending: Optional[Future] = None
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="chroma-upsert") as executor:
+            for ids, documents, metadatas in self._batches(records):
+                if self.cancel_event.is_set():
+                    break
+
+                embeddings = np.asarray(list(self.embedder.embed(documents)), dtype=np.float32)
+
+                # Wait for the previous upsert before queueing the next one, so memory stays bounded
+                if pending is not None:
+                    self._complete(pending)
+                    pending = None
+
+                if self.cancel_event.is_set():
+                    break
+
+                pending = executor.submit(self._upsert, ids, documents, metadatas, embeddings)
+            else:
+                consumed = True
+
+            if pending is not None:
+                self._complete(pending)
+
+        return consumed
+
+    def _batches(self, records: Iterable[ChunkRecord]) -> Iterator[Tuple[List[str], List[str], List[Dict[str, Any]]]]:
+        iterator = iter(records)
+        while True:
+            batch = list(islice(iterator, self.batch_size))
+            if not batch:
+                return
+            ids, documents, metadatas = zip(*batch)
+            yield list(ids), list(documents), list(metadatas)
+
+    def _upsert(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]], embeddings: np.ndarray) -> int:
+        with chroma_manager.write_lock(self.collection.name):
+            sequences = self._sequences(ids)
+            self.collection.upsert(
+                documents=documents,
+                embeddings=embeddings.tolist(),
+                metadatas=[{**metadata, SEQUENCE_KEY: sequence} for metadata, sequence in zip(metadatas, sequences)],
+                ids=ids
+            )
+        chroma_manager.invalidate_count(self.collection.name)
+        return len(ids)
+
+    def _sequences(self, ids: List[str]) -> List[int]:
+        """
+        Returns the sequence number of every id. Records already stored keep their number, since
+        Chroma keeps them at their stored position and a larger number would let a scroll skip past
+        the records stored after them. Only new ids get fresh numbers. Must be called under the write lock.
+        """
+        stored = self.collection.get(ids=ids, include=["metadatas"])
+        sequences = {
+            id: metadata[SEQUENCE_KEY]
+            for id, metadata in zip(stored["ids"], stored["metadatas"] or [])
+            if metadata and SEQUENCE_KEY in metadata
+        }
+        new_ids = [id for id in ids if id not in sequences]
+        if new_ids:
+            first = chroma_manager.next_sequence(len(new_ids))
+            sequences.update((id, first + i) for i, id in enumerate(new_ids))
+        return [sequences[id] for id in ids]
+
+    def _complete(self, pending: Future) -> None:
+        self.stored += pending.result()
+        self._batch_num += 1
+        if self.on_batch:
+            self.on_batch(self._batch_num, self.stored)
@@ -0,0 +1,162 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import threading
+import weakref
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from fastembed import TextEmbedding
+
+from app.internal.embedding_manager import EmbedderRegistry, get_embedder
+
+# State of a worker process: one fastembed session per model, pinned to a fixed number of threads
+_worker_threads: int = 1
+_worker_models: Dict[str, TextEmbedding] = {}
+
+
+def _init_worker(threads: int) -> None:
+    global _worker_threads
+    _worker_threads = threads
+
+
+def _embed_in_worker(model_name: str, documents: List[str]) -> np.ndarray:
+    embedder = _worker_models.get(model_name)
+    if embedder is None:
+        embedder = TextEmbedding(model_name, cache_dir='.fastembed', threads=_worker_threads)
+        _worker_models[model_name] = embedder
+    return np.asarray(list(embedder.embed(documents)), dtype=np.float32)
+
+
+def _embed_on(executor: ProcessPoolExecutor, num_workers: int, model_name: str, documents: List[str]) -> np.ndarray:
+    """Splits documents across the workers of executor and returns their embeddings in input order."""
+    if not documents:
+        return np.empty((0, 0), dtype=np.float32)
+    slice_size = -(-len(documents) // num_workers)
+    futures = [
+        executor.submit(_embed_in_worker, model_name, documents[start:start + slice_size])
+        for start in range(0, len(documents), slice_size)
+    ]
+    return np.concatenate([future.result() for future in futures])
+
+
+class EmbeddingWorkerPool:
+    """
+    Optional pool of embedding processes, each with its own ONNX session.
+    Concurrent imports and large batches are spread over the processes instead of
+    competing for one session inside the server interpreter.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.num_workers = 0
+        self.threads_per_worker = 1
+        self._config_lock = threading.Lock()
+        # Number of users of every executor; a replaced executor is shut down once it has none left
+        self._leases: Dict[ProcessPoolExecutor, int] = {}
+
+    def configure(self, num_workers: int, threads_per_worker: int) -> None:
+        """Starts the pool, or restarts it when the configuration changed. num_workers <= 0 stops it."""
+        num_workers = max(num_workers, 0)
+        threads_per_worker = max(threads_per_worker, 1)
+        with self._config_lock:
+            if self._executor is not None and (num_workers, threads_per_worker) == (self.num_workers, self.threads_per_worker):
+                return
+            old_executor = self._executor
+            self._executor = None
+            if num_workers > 0:
+                # spawn: forking a process that already runs ONNX and server threads is not safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=num_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(threads_per_worker,)
+                )
+            self.num_workers = num_workers
+            self.threads_per_worker = threads_per_worker
+            if old_executor is not None and self._leases.get(old_executor, 0) > 0:
+                # imports still embedding on the old pool keep it; the last one shuts it down
+                old_executor = None
+        if old_executor is not None:
+            old_executor.shutdown(wait=False)
+
+    def is_enabled(self) -> bool:
+        return self._executor is not None
+
+    def acquire(self) -> Optional[Tuple[ProcessPoolExecutor, int]]:
+        """
+        Returns the running executor and its number of workers, or None when the pool is stopped.
+        The executor is not shut down by a reconfiguration until release() is called for it.
+        """
+        with self._config_lock:
+            if self._executor is None:
+                return None
+            self._leases[self._executor] = self._leases.get(self._executor, 0) + 1
+            return self._executor, self.num_workers
+
+    def release(self, executor: ProcessPoolExecutor) -> None:
+        with self._config_lock:
+            remaining = self._leases.get(executor, 0) - 1
+            if remaining > 0:
+                self._leases[executor] = remaining
+                return
+            self._leases.pop(executor, None)
+            if executor is self._executor:
+                return
+        executor.shutdown(wait=False)
+
+    def embed(self, model_name: str, documents: List[str]) -> np.ndarray:
+        """Splits documents across the workers and returns their embeddings in input order."""
+        lease = self.acquire()
+        if lease is None:
+            raise RuntimeError("Embedding worker pool is not running")
+        executor, num_workers = lease
+        try:
+            return _embed_on(executor, num_workers, model_name, documents)
+        finally:
+            self.release(executor)
+
+    def shutdown(self) -> None:
+        self.configure(0, self.threads_per_worker)
+
+
+class PooledEmbedder:
+    """
+    Exposes the embed() interface of TextEmbedding on top of the worker pool.
+    It keeps the executor the pool ran when it was created, so an import is not
+    interrupted when another import reconfigures the pool.
+    """
+
+    def __init__(self, pool: EmbeddingWorkerPool, model_name: str):
+        lease = pool.acquire()
+        if lease is None:
+            raise RuntimeError("Embedding worker pool is not running")
+        self.pool = pool
+        self.model_name = model_name
+        self._executor, self._num_workers = lease
+        weakref.finalize(self, pool.release, self._executor)
+
+    def embed(self, documents: Iterable[str]) -> Iterator[np.ndarray]:
+        return iter(_embed_on(self._executor, self._num_workers, self.model_name, list(documents)))
+
+
+def get_import_embedder(model_name: Optional[str], num_workers: int, threads_per_worker: int):
+    """
+    Returns the embedder an import should use.
+    With num_workers > 0 batches are embedded by the worker pool, otherwise in the calling thread.
+    """
+    pool = EmbeddingWorkerPool()
+    pool.configure(num_workers, threads_per_worker)
+    try:
+        return PooledEmbedder(pool, EmbedderRegistry().resolve_model_name(model_name))
+    except RuntimeError:
+        # stopped, or stopped by another import since it was configured
+        return get_embedder(model_name)
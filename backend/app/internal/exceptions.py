@@ -9,3 +9,19 @@ class DuplicateCollectionError(Exception):
     def __init__(self, message="A collection with this name already exists."):
         self.message = message
         super().__init__(self.message)
+
+class InvalidCursorError(Exception):
+    """
+    Raised when a pagination cursor cannot be decoded.
+    """
+    def __init__(self, message="The pagination cursor is invalid."):
+        self.message = message
+        super().__init__(self.message)
+
+class CollectionNotReadyError(Exception):
+    """
+    Raised when a collection cannot be scrolled yet because its records are still being numbered.
+    """
+    def __init__(self, message="The collection is being prepared for scrolling, try again shortly."):
+        self.message = message
+        super().__init__(self.message)
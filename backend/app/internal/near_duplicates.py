@@ -0,0 +1,73 @@
+import hashlib
+import re
+from typing import Dict, List
+
+import numpy as np
+
+SHINGLE_SIZE = 3           # words per shingle
+FINGERPRINT_BITS = 64
+DEFAULT_MAX_DISTANCE = 6   # differing fingerprint bits of two near-duplicates
+NEAR_DUPLICATES_DISABLED = -1  # default of the import settings: dropping near-duplicates loses text, so users opt in to it
+MAX_DISTANCE = 15          # one LSH band per allowed bit plus one; bands narrower than 4 bits match everything
+
+_WORD = re.compile(r"\w+")
+
+
+def simhash(text: str, shingle_size: int = SHINGLE_SIZE) -> int:
+    """
+    64-bit SimHash of the word shingles of the text. Texts that share most of their
+    shingles get fingerprints that differ in few bits.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) <= shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little") for shingle in shingles),
+        dtype=np.uint64, count=len(shingles),
+    )
+    # One row of 64 bits per shingle; every bit of the fingerprint is the majority vote of its column
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    majority = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(majority, bitorder="little").tobytes(), "little")
+
+
+class NearDuplicateIndex:
+    """
+    Remembers the SimHash fingerprints of the texts seen by one import and tells whether a new text
+    is a near-duplicate of one of them, i.e. their fingerprints differ in at most max_distance bits.
+    Fingerprints are split into max_distance + 1 bands and bucketed by band value: two near-duplicates
+    agree on at least one whole band, so a lookup only compares the fingerprints of matching buckets.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_distance = min(max(max_distance, 0), MAX_DISTANCE)
+        bands = self.max_distance + 1
+        bounds = [round(i * FINGERPRINT_BITS / bands) for i in range(bands + 1)]
+        # (shift, mask) of every band
+        self._bands = [(low, (1 << (high - low)) - 1) for low, high in zip(bounds, bounds[1:])]
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in self._bands]
+        self.checked = 0
+        self.dropped = 0
+
+    def add(self, text: str) -> None:
+        """Adds a text that is kept anyway, so later near-duplicates of it are found."""
+        fingerprint = simhash(text)
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            buckets.setdefault((fingerprint >> shift) & mask, []).append(fingerprint)
+
+    def is_duplicate(self, text: str) -> bool:
+        """Returns True for a near-duplicate of an earlier text; other texts are added to the index."""
+        fingerprint = simhash(text)
+        self.checked += 1
+        keys = [(fingerprint >> shift) & mask for shift, mask in self._bands]
+        for buckets, key in zip(self._buckets, keys):
+            for other in buckets.get(key, ()):
+                if (fingerprint ^ other).bit_count() <= self.max_distance:
+                    self.dropped += 1
+                    return True
+        for buckets, key in zip(self._buckets, keys):
+            buckets.setdefault(key, []).append(fingerprint)
+        return False
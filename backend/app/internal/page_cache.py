@@ -0,0 +1,47 @@
+import hashlib
+from sqlite3 import Connection
+from typing import List, Optional
+import httpx
+
+from app.crud.crud_page_cache import get_page, save_page
+from app.schemas.page_cache import PageCacheEntry
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """
+    Fetch state of the pages crawled into one collection: validators for conditional
+    requests, hashes of the page body and its extracted text, and the page's links.
+    An entry must only be saved once its page is stored in the collection, otherwise a
+    recrawl would consider a page that was never indexed unchanged.
+    """
+
+    def __init__(self, db: Connection, collection_id: str, fingerprint: str = ""):
+        self.db = db
+        self.collection_id = collection_id
+        # Identifies the import settings the pages were indexed with; entries of other settings are ignored
+        self.fingerprint = fingerprint
+
+    def get(self, url: str) -> Optional[PageCacheEntry]:
+        entry = get_page(self.db, self.collection_id, url)
+        if entry is None or entry.fingerprint != self.fingerprint:
+            return None
+        return entry
+
+    def save(self, entry: PageCacheEntry) -> None:
+        save_page(self.db, entry)
+
+    def new_entry(self, url: str, response: httpx.Response, text: Optional[str], links: List[str]) -> PageCacheEntry:
+        return PageCacheEntry(
+            collection_id=self.collection_id,
+            url=url,
+            etag=response.headers.get("etag"),
+            last_modified=response.headers.get("last-modified"),
+            content_hash=hashlib.sha256(response.content).hexdigest(),
+            text_hash=text_digest(text) if text else None,
+            links=links,
+            fingerprint=self.fingerprint,
+        )
@@ -0,0 +1,200 @@
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app.internal.temp_file_helper import TempFileHelper
+
+PARSED_TEXT_CACHE_PATH = "parsed_text_cache"
+COMPRESS_LEVEL = 6   # gzip level: extracted text compresses about 3x, and level 6 keeps up with parsing
+HASH_BLOCK_SIZE = 1024 * 1024
+DEFAULT_PARSED_TEXT_CACHE_SIZE_MB = 1024
+
+
+class ParsedTextCache:
+    """
+    On-disk cache of the text extracted from imported files, so a collection can be chunked again
+    with other settings without the original files and without parsing them again.
+    One gzip file is kept per (collection, source), with the content hash of the file it was parsed from;
+    a re-upload of the same file is not parsed again. The index is a SQLite database in the cache directory.
+    When the cached files exceed the size limit, the least recently used texts are evicted.
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.path = PARSED_TEXT_CACHE_PATH
+        self.max_size_bytes = DEFAULT_PARSED_TEXT_CACHE_SIZE_MB * 1024 * 1024
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.path, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.path, "index.db"), check_same_thread=False)
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS parsed_texts (
+                collection_id TEXT,
+                source TEXT,
+                content_hash TEXT,
+                file TEXT,
+                size INTEGER,
+                updated REAL,
+                PRIMARY KEY (collection_id, source)
+            )
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def configure(self, max_size_mb: int) -> None:
+        evicted = []
+        with self._db_lock:
+            self.max_size_bytes = max(max_size_mb, 0) * 1024 * 1024
+            if self._conn is not None:
+                evicted = self._evict()
+        self._remove_files(evicted)
+
+    @staticmethod
+    def file_hash(file_path: str) -> str:
+        """sha256 of a file, read in blocks."""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _directory(self, collection_id: str) -> str:
+        # Collection ids and sources are hashed, so neither can name a path outside the cache
+        return os.path.join(self.path, hashlib.sha256(collection_id.encode("utf-8")).hexdigest()[:32])
+
+    def get(self, collection_id: str, source: str, content_hash: str) -> Optional[str]:
+        """Returns the cached text file of a source if it was parsed from a file with this content hash."""
+        with self._db_lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT file FROM parsed_texts WHERE collection_id = ? AND source = ? AND content_hash = ?",
+                (collection_id, source, content_hash),
+            ).fetchone()
+            if row is not None:
+                # updated is the last use, the order of eviction
+                conn.execute("UPDATE parsed_texts SET updated = ? WHERE collection_id = ? AND source = ?",
+                             (time.time(), collection_id, source))
+                conn.commit()
+        if row is None or not os.path.exists(os.path.join(self.path, row[0])):
+            return None
+        return os.path.join(self.path, row[0])
+
+    def sources(self, collection_id: str) -> List[Tuple[str, str]]:
+        """Returns (source, cached text file) of every source of a collection with cached text."""
+        with self._db_lock:
+            rows = self._connection().execute(
+                "SELECT source, file FROM parsed_texts WHERE collection_id = ? ORDER BY source",
+                (collection_id,),
+            ).fetchall()
+        return [(source, os.path.join(self.path, file)) for source, file in rows
+                if os.path.exists(os.path.join(self.path, file))]
+
+    @staticmethod
+    def read(text_path: str) -> Iterator[str]:
+        """Streams a cached text in blocks, decompressing it as it is read."""
+        # newline="" returns the text exactly as it was parsed
+        with gzip.open(text_path, "rt", encoding="utf-8", newline="") as f:
+            yield from TempFileHelper.read_blocks(f)
+
+    def store(self, collection_id: str, source: str, content_hash: str, segments: Iterable[str]) -> Iterator[str]:
+        """
+        Yields the segments of a parsed text while compressing them into the cache.
+        The text replaces the cached text of the source only once all segments were read;
+        a stream closed early leaves the cache as it was.
+        """
+        directory = self._directory(collection_id)
+        os.makedirs(directory, exist_ok=True)
+        handle, partial_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        os.close(handle)
+        stored = False
+        try:
+            with gzip.open(partial_path, "wt", encoding="utf-8", newline="", compresslevel=COMPRESS_LEVEL) as f:
+                for segment in segments:
+                    f.write(segment)
+                    yield segment
+            source_key = hashlib.sha256(source.encode("utf-8")).hexdigest()[:32]
+            text_path = os.path.join(directory, f"{source_key}_{content_hash[:16]}.txt.gz")
+            os.replace(partial_path, text_path)
+            stored = True
+            self._index(collection_id, source, content_hash, text_path)
+        finally:
+            if hasattr(segments, "close"):
+                segments.close()
+            if not stored:
+                TempFileHelper.remove_temp(partial_path)
+
+    def _index(self, collection_id: str, source: str, content_hash: str, text_path: str) -> None:
+        file = os.path.relpath(text_path, self.path)
+        with self._db_lock:
+            conn = self._connection()
+            previous = conn.execute(
+                "SELECT file FROM parsed_texts WHERE collection_id = ? AND source = ?", (collection_id, source)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO parsed_texts (collection_id, source, content_hash, file, size, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (collection_id, source, content_hash, file, os.path.getsize(text_path), time.time()),
+            )
+            conn.commit()
+            evicted = self._evict()
+        if previous is not None and previous[0] != file:
+            evicted.append(previous[0])
+        self._remove_files(evicted)
+
+    def _evict(self) -> List[str]:
+        """Drops the least recently used texts from the index until they fit the size limit. Returns their files."""
+        conn = self._connection()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM parsed_texts").fetchone()[0]
+        if total <= self.max_size_bytes:
+            return []
+        # Free a little more than needed so that every import does not trigger another eviction
+        to_free = total - int(self.max_size_bytes * 0.9)
+        freed = 0
+        evicted = []
+        for collection_id, source, file, size in conn.execute(
+                "SELECT collection_id, source, file, size FROM parsed_texts ORDER BY updated").fetchall():
+            if freed >= to_free:
+                break
+            evicted.append((collection_id, source, file))
+            freed += size
+        conn.executemany("DELETE FROM parsed_texts WHERE collection_id = ? AND source = ?",
+                         [(collection_id, source) for collection_id, source, _ in evicted])
+        conn.commit()
+        return [file for _, _, file in evicted]
+
+    def _remove_files(self, files: List[str]) -> None:
+        for file in files:
+            TempFileHelper.remove_temp(os.path.join(self.path, file))
+
+    def delete_collection(self, collection_id: str) -> None:
+        if not os.path.exists(self.path):
+            return
+        with self._db_lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM parsed_texts WHERE collection_id = ?", (collection_id,))
+            conn.commit()
+        shutil.rmtree(self._directory(collection_id), ignore_errors=True)
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
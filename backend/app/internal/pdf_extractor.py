@@ -0,0 +1,78 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import io
+from itertools import islice
+import mmap
+import multiprocessing
+from typing import Deque, Iterator, List, Optional, Union
+from pypdf import PdfReader
+
+DEFAULT_PDF_WORKERS = 2
+PAGES_PER_TASK = 16      # pages a worker extracts per task
+PARALLEL_MIN_PAGES = 48  # smaller PDFs are extracted in the import thread: starting processes costs more
+TASKS_PER_WORKER = 2     # tasks queued per worker, so finished pages wait for the chunker at most this far ahead
+
+# A PDF is either its bytes or the path of a file holding them, which is memory-mapped instead of read
+PdfSource = Union[bytes, str]
+
+# State of a worker process: the reader of the PDF the pool was started for
+_worker_reader: Optional[PdfReader] = None
+
+
+def open_pdf(source: PdfSource) -> PdfReader:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            # The map stays valid after the file is closed and is released with the reader
+            return PdfReader(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    return PdfReader(io.BytesIO(source))
+
+
+def page_text(page) -> str:
+    """Text of a page as PyPDFLoader extracted it, with its line breaks removed."""
+    return page.extract_text(extraction_mode="plain").strip().replace("\n", "")
+
+
+def _init_worker(source: PdfSource) -> None:
+    global _worker_reader
+    _worker_reader = open_pdf(source)
+
+
+def _extract_pages(start: int, end: int) -> List[str]:
+    return [page_text(_worker_reader.pages[index]) for index in range(start, end)]
+
+
+def extract_pdf_pages(source: PdfSource, workers: int = 0) -> Iterator[str]:
+    """
+    Yields the text of every page of a PDF, in page order, as soon as it is extracted.
+    With workers > 0, PDFs of PARALLEL_MIN_PAGES pages or more are extracted by a process pool
+    started for this PDF: every worker opens the PDF once and extracts ranges of PAGES_PER_TASK pages.
+    Closing the iterator stops the pool.
+    """
+    reader = open_pdf(source)
+    page_count = len(reader.pages)
+    if workers <= 0 or page_count < PARALLEL_MIN_PAGES:
+        for page in reader.pages:
+            yield page_text(page)
+        return
+
+    workers = min(workers, -(-page_count // PAGES_PER_TASK))
+    # spawn: forking a process that runs server and import threads is not safe
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(source,))
+    try:
+        starts = iter(range(0, page_count, PAGES_PER_TASK))
+        pending: Deque[Future] = deque()
+
+        def submit(start: int) -> None:
+            pending.append(executor.submit(_extract_pages, start, min(start + PAGES_PER_TASK, page_count)))
+
+        for start in islice(starts, workers * TASKS_PER_WORKER):
+            submit(start)
+        while pending:
+            pages = pending.popleft().result()
+            start = next(starts, None)
+            if start is not None:
+                submit(start)
+            yield from pages
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,50 @@
+import logging
+
+from app.internal.chroma_manager import SEQUENCE_KEY, chroma_manager
+from app.internal.embedding_pipeline import MAX_CHROMA_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+def is_numbered(collection) -> bool:
+    """
+    Records stored before records had sequence numbers always come first,
+    so a collection is numbered when its first record is.
+    """
+    first = collection.get(limit=1, include=["metadatas"])
+    return not first["ids"] or SEQUENCE_KEY in (first["metadatas"][0] or {})
+
+
+def number_records(collection) -> None:
+    """
+    Gives sequence numbers, in stored order, to the records of a collection imported before records had them.
+    The first record is numbered last, so an interrupted run is done again the next time.
+    Writes to the collection wait until it is done.
+    """
+    if is_numbered(collection):
+        return
+    with chroma_manager.write_lock(collection.name):
+        if is_numbered(collection):
+            return
+        count = collection.count()
+        first_sequence = chroma_manager.next_sequence(count)
+        first_id = None
+        for offset in range(0, count, MAX_CHROMA_BATCH_SIZE):
+            ids = collection.get(limit=MAX_CHROMA_BATCH_SIZE, offset=offset, include=[])["ids"]
+            numbered = [(chunk_id, first_sequence + offset + index) for index, chunk_id in enumerate(ids)]
+            if offset == 0:
+                first_id, numbered = ids[0], numbered[1:]
+            if numbered:
+                collection.update(ids=[chunk_id for chunk_id, _ in numbered],
+                                  metadatas=[{SEQUENCE_KEY: sequence} for _, sequence in numbered])
+        collection.update(ids=[first_id], metadatas=[{SEQUENCE_KEY: first_sequence}])
+    logger.info(f"Numbered {count} records of collection {collection.name}")
+
+
+def number_all_collections() -> None:
+    """Numbers the records of every collection that needs it. Run once in the background at startup."""
+    for listed in chroma_manager.get_client().list_collections():
+        try:
+            number_records(chroma_manager.get_collection(listed.name))
+        except Exception:
+            logger.exception(f"Numbering the records of collection {listed.name} failed")
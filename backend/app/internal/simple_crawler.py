@@ -1,72 +1,325 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 from re import Pattern
+import threading
 from threading import Event
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+import httpx
 import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
-from collections import deque
 import trafilatura
 
-def simple_crawl(start_url, cancel_event: Event, regex: Pattern[str] | None, max_depth=1):
-    visited = set()
-    queue = deque([(start_url, 0)])
-    domain = urlparse(start_url).netloc
+from app.internal.crawl_checkpoint import CrawlCheckpoint
+from app.internal.near_duplicates import NearDuplicateIndex
+from app.internal.page_cache import PageCache
+from app.internal.sitemap import discover_sitemap_entries, parse_lastmod
+from app.schemas.page_cache import PageCacheEntry
 
-    results = []   # ← list of {url, text}
+MAX_CONCURRENCY = 8        # pages fetched at the same time
+MAX_REQUESTS_PER_HOST = 4  # politeness limit for a single host
+REQUEST_TIMEOUT = 5.0
+CANCEL_POLL_INTERVAL = 0.2
 
-    while queue:
-        if cancel_event.is_set():
-            return
+_DONE = object()
 
-        url, depth = queue.popleft()
-        if url in visited or depth > max_depth:
-            continue
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+_extraction_pool_size = 0
+_extraction_pool_lock = threading.Lock()
 
-        visited.add(url)
-        print(f"[Depth {depth}] {url}")
 
-        # Fetch page
-        try:
-            response = requests.get(url, timeout=5)
-            response.raise_for_status()
-        except Exception:
-            continue
+def get_extraction_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """
+    Returns the process pool shared by crawls for text extraction, resized to `workers`.
+    With workers <= 0 there is no pool and pages are parsed in a thread of the crawling process.
+    """
+    global _extraction_pool, _extraction_pool_size
+    workers = max(workers, 0)
+    with _extraction_pool_lock:
+        if workers != _extraction_pool_size or (workers and _extraction_pool is None):
+            if _extraction_pool is not None:
+                _extraction_pool.shutdown(wait=False)
+            _extraction_pool = _new_extraction_pool(workers) if workers else None
+            _extraction_pool_size = workers
+        return _extraction_pool
 
-        soup = BeautifulSoup(response.text, "html.parser")
 
-        # Extract text from the page
-        text = trafilatura.extract(response.text)
-        if text:
-            results.append({"url": url, "text": text})
+def replace_broken_extraction_pool(broken: ProcessPoolExecutor) -> Optional[ProcessPoolExecutor]:
+    """Replaces the shared pool after one of its workers died, unless another crawl already did."""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is broken:
+            broken.shutdown(wait=False)
+            _extraction_pool = _new_extraction_pool(_extraction_pool_size)
+        return _extraction_pool
 
-        # If already at max depth, don't collect more links
-        if depth == max_depth:
-            continue
 
-        # Extract and process internal links
-        for a in soup.find_all("a", href=True):
-            if cancel_event.is_set():
-                return 
+def _new_extraction_pool(workers: int) -> ProcessPoolExecutor:
+    # spawn: forking a process that runs server and import threads is not safe
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def shutdown_extraction_pool() -> None:
+    global _extraction_pool, _extraction_pool_size
+    with _extraction_pool_lock:
+        if _extraction_pool is not None:
+            _extraction_pool.shutdown(wait=False)
+        _extraction_pool = None
+        _extraction_pool_size = 0
+
+
+def parse_page(url: str, html: str) -> Tuple[Optional[str], List[str]]:
+    """
+    Parses the page once and returns its main text and its links, absolute and without fragments.
+    Runs in an extraction worker process, so it only takes and returns picklable values.
+    """
+    tree = trafilatura.load_html(html)
+    if tree is None:
+        return None, []
+
+    links = list(dict.fromkeys(urljoin(url, href).split("#")[0] for href in tree.xpath("//a/@href")))
+
+    # Links are collected first: extraction prunes the tree in place
+    return trafilatura.extract(tree), links
+
+
+class AsyncCrawler:
+    """
+    Breadth-first crawler of one site that fetches pages concurrently.
+    Pages are fetched over one keep-alive connection pool, bounded globally by
+    max_concurrency and per host by max_per_host, and yielded as soon as they are parsed.
+    Only links on the start URL's domain that match the regex (if any) are followed.
+    With extraction_workers > 0, pages are parsed in a shared process pool instead of a thread.
+    With a page cache, pages are fetched with conditional requests; pages that did not change
+    are not yielded (their links are still followed) and yielded pages carry the cache entry
+    to save once they are stored.
+    With use_sitemap, pages listed in the site's sitemaps are crawled directly instead of
+    following links; pages whose lastmod is older than their cached copy are not fetched.
+    Sites without a sitemap are crawled by following links.
+    With a checkpoint, the frontier is persisted as the crawl goes and a crawl of a job that
+    already started continues with its pending URLs. Yielded pages are marked done by the
+    consumer once stored; every other page is marked done by the crawler.
+    With a near-duplicate index, pages too similar to a page yielded before (versioned copies,
+    print views, query-string variants) are not yielded; their links are still followed.
+    """
+
+    def __init__(self, start_url: str, cancel_event: Event, regex: Pattern[str] | None, max_depth: int = 1,
+                 max_concurrency: int = MAX_CONCURRENCY, max_per_host: int = MAX_REQUESTS_PER_HOST,
+                 timeout: float = REQUEST_TIMEOUT, extraction_workers: int = 0, page_cache: Optional[PageCache] = None,
+                 use_sitemap: bool = False, checkpoint: Optional[CrawlCheckpoint] = None,
+                 near_duplicates: Optional[NearDuplicateIndex] = None):
+        self.start_url = start_url
+        self.cancel_event = cancel_event
+        self.regex = regex
+        self.max_depth = max_depth
+        self.max_concurrency = max(max_concurrency, 1)
+        self.max_per_host = max(max_per_host, 1)
+        self.timeout = timeout
+        self.domain = urlparse(start_url).netloc
+        self.extraction_workers = extraction_workers
+        self.page_cache = page_cache
+        self.use_sitemap = use_sitemap
+        self.checkpoint = checkpoint
+        self.near_duplicates = near_duplicates
+        self.unchanged_pages = 0
+        self.sitemap_pages = 0
+        self.resumed_pages = 0
+        self.near_duplicate_pages = 0
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    async def pages(self) -> AsyncIterator[Dict[str, str]]:
+        """Yields {url, text} of every crawled page with extractable text. Stops when cancel_event is set."""
+        frontier: asyncio.Queue = asyncio.Queue()
+        # Bounded, so fetching pauses while the consumer is busy with earlier pages
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.max_concurrency * 2)
 
-            link = urljoin(url, a["href"])
-            parsed = urlparse(link)
+        limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        async with httpx.AsyncClient(timeout=self.timeout, limits=limits, follow_redirects=True) as client:
+            visited, queued = self.checkpoint.restore() if self.checkpoint else (set(), [])
+            if visited:
+                self.resumed_pages = len(visited) - len(queued)
+            else:
+                queued = await self._start_entries(client)
+                visited = {url for url, _, _ in queued}
+                if self.checkpoint:
+                    self.checkpoint.add(queued)
+            for entry in queued:
+                frontier.put_nowait(entry)
 
-            # Only follow links inside same domain
-            if parsed.netloc == domain:
-                link = link.split("#")[0]  # remove fragments
+            workers = [
+                asyncio.create_task(self._worker(client, frontier, results, visited))
+                for _ in range(self.max_concurrency)
+            ]
+            monitor = asyncio.create_task(self._signal_done(frontier, results))
+            try:
+                while not self.cancel_event.is_set():
+                    try:
+                        page = await asyncio.wait_for(results.get(), CANCEL_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        continue
+                    if page is _DONE:
+                        break
+                    yield page
+            finally:
+                for task in [*workers, monitor]:
+                    task.cancel()
+                await asyncio.gather(*workers, monitor, return_exceptions=True)
 
-                if regex and not regex.match(link):
+    async def _start_entries(self, client: httpx.AsyncClient) -> List[Tuple[str, int, Optional[datetime]]]:
+        seeds = await self._sitemap_seeds(client) if self.use_sitemap else []
+        if not seeds:
+            return [(self.start_url, 0, None)]
+        # Sitemap pages are leaves: their links are not followed
+        entries = [(self.start_url, self.max_depth, None)]
+        for url, lastmod in dict(seeds).items():
+            if url != self.start_url:
+                entries.append((url, self.max_depth, lastmod))
+        self.sitemap_pages = len(entries) - 1
+        return entries
+
+    async def _signal_done(self, frontier: asyncio.Queue, results: asyncio.Queue) -> None:
+        await frontier.join()
+        await results.put(_DONE)
+
+    async def _worker(self, client: httpx.AsyncClient, frontier: asyncio.Queue, results: asyncio.Queue, visited: Set[str]) -> None:
+        while True:
+            url, depth, lastmod = await frontier.get()
+            try:
+                if self.cancel_event.is_set():
+                    continue
+                print(f"[Depth {depth}] {url}")
+                try:
+                    page, links = await self._crawl_page(client, url, lastmod)
+                    if page is not None and self.near_duplicates is not None and self.near_duplicates.is_duplicate(page["text"]):
+                        self.near_duplicate_pages += 1
+                        page = None
+                except Exception as e:
+                    print(f"Failed to parse {url}: {e}")
+                    if self.checkpoint:
+                        self.checkpoint.done(url)
                     continue
 
-                if link not in visited:
-                    queue.append((link, depth + 1))
+                new_entries = []
+                if depth < self.max_depth:
+                    for link in links:
+                        if link not in visited and self._should_follow(link):
+                            visited.add(link)
+                            new_entries.append((link, depth + 1, None))
+                            frontier.put_nowait(new_entries[-1])
+                if self.checkpoint:
+                    self.checkpoint.add(new_entries)
+                    if page is None:
+                        self.checkpoint.done(url)
+                if page is not None:
+                    await results.put(page)
+            finally:
+                frontier.task_done()
+
+    async def _crawl_page(self, client: httpx.AsyncClient, url: str, lastmod: Optional[datetime] = None) -> Tuple[Optional[Dict], List[str]]:
+        """
+        Fetches and parses one page. Returns the page to yield, or None when it has no text
+        or did not change since it was cached, together with the page's links.
+        """
+        cached = self.page_cache.get(url) if self.page_cache else None
+        if cached is not None and lastmod is not None:
+            fetched_at = parse_lastmod(cached.fetched_at)
+            if fetched_at is not None and lastmod <= fetched_at:
+                self.unchanged_pages += 1
+                return None, cached.links
+        response = await self._fetch(client, url, cached)
+        if response is None:
+            return None, []
+
+        if cached is not None:
+            if response.status_code == 304 or hashlib.sha256(response.content).hexdigest() == cached.content_hash:
+                self.unchanged_pages += 1
+                return None, cached.links
+
+        text, links = await self._parse(url, response.text)
+        if self.page_cache is None:
+            return ({"url": url, "text": text} if text else None), links
+
+        entry = self.page_cache.new_entry(url, response, text, links)
+        if cached is not None and entry.text_hash == cached.text_hash:
+            # Only markup around the text changed; the stored chunks are still current
+            self.unchanged_pages += 1
+            self.page_cache.save(entry)
+            return None, links
+        if not text:
+            self.page_cache.save(entry)
+            return None, links
+        return {"url": url, "text": text, "cache_entry": entry}, links
+
+    async def _sitemap_seeds(self, client: httpx.AsyncClient) -> List[Tuple[str, Optional[datetime]]]:
+        # Same filter as for links, applied before anything is fetched
+        entries = await discover_sitemap_entries(client, self.start_url)
+        return [(url.split("#")[0], lastmod) for url, lastmod in entries if self._should_follow(url.split("#")[0])]
+
+    def _should_follow(self, link: str) -> bool:
+        # Only follow links inside same domain
+        if urlparse(link).netloc != self.domain:
+            return False
+        return not (self.regex and not self.regex.match(link))
+
+    async def _fetch(self, client: httpx.AsyncClient, url: str, cached: Optional[PageCacheEntry] = None) -> Optional[httpx.Response]:
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
 
+        host = urlparse(url).netloc
+        host_limit = self._host_limits.setdefault(host, asyncio.Semaphore(self.max_per_host))
+        async with host_limit:
+            try:
+                response = await client.get(url, headers=headers)
+                if response.status_code == 304 and cached is not None:
+                    return response
+                response.raise_for_status()
+            except Exception:
+                return None
+        return response
+
+    async def _parse(self, url: str, html: str) -> Tuple[Optional[str], List[str]]:
+        # Parsing is CPU-bound; keep it off the event loop so other fetches continue
+        args = (url, html)
+        pool = get_extraction_pool(self.extraction_workers)
+        if pool is None:
+            return await asyncio.to_thread(parse_page, *args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, parse_page, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory on a huge page); the next pages go to a fresh pool
+            replace_broken_extraction_pool(pool)
+            raise
+
+
+async def crawl(start_url, cancel_event: Event, regex: Pattern[str] | None, max_depth=1, extraction_workers=0, use_sitemap=False,
+                near_duplicates: Optional[NearDuplicateIndex] = None) -> Optional[List[Dict[str, str]]]:
+    """Crawls the site and returns the list of {url, text}, or None if the crawl was cancelled."""
+    results = []
+    crawler = AsyncCrawler(start_url, cancel_event, regex, max_depth=max_depth, extraction_workers=extraction_workers, use_sitemap=use_sitemap,
+                           near_duplicates=near_duplicates)
+    async for page in crawler.pages():
+        results.append(page)
+    if cancel_event.is_set():
+        return None
     return results
 
 
+def simple_crawl(start_url, cancel_event: Event, regex: Pattern[str] | None, max_depth=1):
+    """Blocking version of crawl() for callers outside an event loop."""
+    return asyncio.run(crawl(start_url, cancel_event, regex, max_depth=max_depth))
+
+
 def crawl_from_list(urls):
     results = []
     for url in urls:
-      
+
         try:
             response = requests.get(url, timeout=5)
             response.raise_for_status()
@@ -77,4 +330,4 @@ def crawl_from_list(urls):
         if text:
             results.append({"url": url, "text": text})
 
-    return results
\ No newline at end of file
+    return results
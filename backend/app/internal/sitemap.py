@@ -0,0 +1,110 @@
+from datetime import datetime, time, timezone
+import gzip
+from typing import List, Optional, Set, Tuple
+from urllib.parse import urljoin, urlparse
+import httpx
+from lxml import etree
+
+MAX_SITEMAPS = 50          # sitemap files read for one site, including nested indexes
+MAX_SITEMAP_URLS = 50000   # page URLs taken from the sitemaps of one site
+
+# (page url, lastmod) of one sitemap entry
+SitemapEntry = Tuple[str, Optional[datetime]]
+
+
+def parse_lastmod(value: Optional[str]) -> Optional[datetime]:
+    """
+    Parses a W3C datetime ("2024-05-01", "2024-05-01T10:00:00+02:00", ...) into an aware UTC datetime.
+    A date without a time is read as the end of that day, so a page changed later that day is not taken as unchanged.
+    """
+    if not value:
+        return None
+    value = value.strip().replace("Z", "+00:00")
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if len(value) == 10:
+        parsed = datetime.combine(parsed.date(), time.max, tzinfo=timezone.utc)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def parse_robots_sitemaps(robots_txt: str, base_url: str) -> List[str]:
+    """Returns the sitemap URLs declared in robots.txt."""
+    sitemaps = []
+    for line in robots_txt.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip().lower() == "sitemap" and value.strip():
+            sitemaps.append(urljoin(base_url, value.strip()))
+    return sitemaps
+
+
+def parse_sitemap(content: bytes) -> Tuple[List[str], List[SitemapEntry]]:
+    """
+    Parses a sitemap or a sitemap index, plain or gzipped.
+    Returns (nested sitemap URLs, page entries); one of the two lists is empty.
+    """
+    if content[:2] == b"\x1f\x8b":
+        content = gzip.decompress(content)
+    try:
+        root = etree.fromstring(content, parser=etree.XMLParser(resolve_entities=False, no_network=True, recover=True))
+    except etree.XMLSyntaxError:
+        return [], []
+    if root is None:
+        return [], []
+
+    # Match on local names: sitemaps in the wild use several namespace variants
+    def entries(tag: str) -> List[SitemapEntry]:
+        found = []
+        for node in root.xpath(f"//*[local-name()='{tag}']"):
+            loc = node.xpath("string(*[local-name()='loc'])").strip()
+            if loc:
+                found.append((loc, parse_lastmod(node.xpath("string(*[local-name()='lastmod'])"))))
+        return found
+
+    if etree.QName(root).localname == "sitemapindex":
+        return [loc for loc, _ in entries("sitemap")], []
+    return [], entries("url")
+
+
+async def discover_sitemap_entries(client: httpx.AsyncClient, start_url: str) -> List[SitemapEntry]:
+    """
+    Reads the site's sitemaps, found through robots.txt or at /sitemap.xml, and returns their page entries.
+    Returns an empty list if the site has no readable sitemap.
+    """
+    parsed = urlparse(start_url)
+    origin = f"{parsed.scheme}://{parsed.netloc}"
+
+    sitemap_urls = []
+    robots = await _get(client, f"{origin}/robots.txt")
+    if robots is not None:
+        sitemap_urls = parse_robots_sitemaps(robots.text, origin)
+    if not sitemap_urls:
+        sitemap_urls = [f"{origin}/sitemap.xml"]
+
+    pages: List[SitemapEntry] = []
+    seen: Set[str] = set()
+    pending = list(sitemap_urls)
+    while pending and len(seen) < MAX_SITEMAPS and len(pages) < MAX_SITEMAP_URLS:
+        sitemap_url = pending.pop(0)
+        if sitemap_url in seen:
+            continue
+        seen.add(sitemap_url)
+        response = await _get(client, sitemap_url)
+        if response is None:
+            continue
+        nested, entries = parse_sitemap(response.content)
+        pending.extend(nested)
+        pages.extend(entries[:MAX_SITEMAP_URLS - len(pages)])
+    return pages
+
+
+async def _get(client: httpx.AsyncClient, url: str) -> Optional[httpx.Response]:
+    try:
+        response = await client.get(url)
+        response.raise_for_status()
+        return response
+    except Exception:
+        return None
@@ -0,0 +1,206 @@
+from array import array
+from bisect import bisect_right
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from typing import Iterable, Iterator, List, Tuple
+
+import zstandard
+
+from app.internal.temp_file_helper import TempFileHelper
+
+STAGING_PATH = os.path.join(tempfile.gettempdir(), "ragatouille_staging")
+STAGING_BLOCK_CHARS = 64 * 1024  # characters per compressed block, the unit previews decompress
+COMPRESSION_LEVEL = 3
+MAGIC = b"RGSTAGE1"
+# Footer of a staged file: index offset, block count, text length in characters, magic
+TRAILER = struct.Struct("<QQQ8s")
+
+
+class StagedText:
+    """
+    Read access to a staged text: a file of independently zstd-compressed blocks with a block index.
+    The file is memory-mapped, and reading a range of characters decompresses only the blocks it spans.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            # The map stays valid after the file is closed
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < len(MAGIC) + TRAILER.size or self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ValueError(f"Not a staged text file: {path}")
+        index_offset, count, self.length, _ = TRAILER.unpack_from(self._map, len(self._map) - TRAILER.size)
+        index = array("q")
+        index.frombytes(self._map[index_offset:index_offset + count * 3 * index.itemsize])
+        # Character offset, byte offset and compressed size of every block
+        self.char_offsets = index[0::3]
+        self.byte_offsets = index[1::3]
+        self.byte_sizes = index[2::3]
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __enter__(self) -> "StagedText":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def block(self, index: int) -> str:
+        start = self.byte_offsets[index]
+        return self._decompressor.decompress(self._map[start:start + self.byte_sizes[index]]).decode("utf-8")
+
+    def iter_blocks(self) -> Iterator[str]:
+        """Yields the text block by block, decompressing each block as it is reached."""
+        for index in range(len(self.char_offsets)):
+            yield self.block(index)
+
+    def read(self, start: int, end: int) -> str:
+        """Returns characters start..end (exclusive) of the text, decompressing only the blocks they span."""
+        end = min(end, self.length)
+        if start >= end:
+            return ""
+        first = bisect_right(self.char_offsets, start) - 1
+        parts = []
+        index = first
+        while index < len(self.char_offsets) and self.char_offsets[index] < end:
+            parts.append(self.block(index))
+            index += 1
+        offset = self.char_offsets[first]
+        return "".join(parts)[start - offset:end - offset]
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def write_staged(path: str, segments: Iterable[str]) -> int:
+    """
+    Writes the segments of a text to `path` as compressed blocks of STAGING_BLOCK_CHARS characters,
+    whatever the segment sizes. Returns the length of the text in characters.
+    """
+    compressor = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL)
+    index = array("q")
+    length = 0
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+
+        def write_block(text: str) -> None:
+            data = compressor.compress(text.encode("utf-8"))
+            index.extend((length, f.tell(), len(data)))
+            f.write(data)
+
+        pending: List[str] = []
+        pending_chars = 0
+        for segment in segments:
+            position = 0
+            while position < len(segment):
+                take = min(STAGING_BLOCK_CHARS - pending_chars, len(segment) - position)
+                pending.append(segment[position:position + take])
+                pending_chars += take
+                position += take
+                if pending_chars == STAGING_BLOCK_CHARS:
+                    write_block("".join(pending))
+                    length += pending_chars
+                    pending, pending_chars = [], 0
+        if pending:
+            write_block("".join(pending))
+            length += pending_chars
+
+        index_offset = f.tell()
+        f.write(index.tobytes())
+        f.write(TRAILER.pack(index_offset, len(index) // 3, length, MAGIC))
+    return length
+
+
+def is_staged(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def restage_plain(path: str) -> None:
+    """
+    Rewrites a plain UTF-8 text file as a staged file. The file is replaced only once it is
+    written completely, so readers see either the plain text or the staged one.
+
+    Raises:
+        ValueError: If the file is not UTF-8 text.
+    """
+    handle, staged_path = tempfile.mkstemp(dir=os.path.dirname(path) or None, suffix=".part")
+    os.close(handle)
+    try:
+        # newline="" keeps the text exactly as it was staged
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            write_staged(staged_path, TempFileHelper.read_blocks(f))
+        os.replace(staged_path, path)
+    except Exception:
+        TempFileHelper.remove_temp(staged_path)
+        raise
+
+
+class StagingStore:
+    """
+    Texts staged by step 1 of two-step imports, until step 2 imports them.
+    Texts are stored compressed in one directory per collection, so the space a collection's
+    staged texts take is known without reading them.
+    """
+
+    def __init__(self, path: str = STAGING_PATH):
+        self.path = path
+
+    def _directory(self, collection_id: str) -> str:
+        return os.path.join(self.path, hashlib.sha256(collection_id.encode("utf-8")).hexdigest()[:32])
+
+    def save(self, collection_id: str, segments: Iterable[str]) -> str:
+        """Stages a text, given as a stream of segments, and returns the path of its staged file."""
+        directory = self._directory(collection_id)
+        os.makedirs(directory, exist_ok=True)
+        handle, path = tempfile.mkstemp(dir=directory, suffix=".stg")
+        os.close(handle)
+        try:
+            write_staged(path, segments)
+        except Exception:
+            TempFileHelper.remove_temp(path)
+            raise
+        return path
+
+    @staticmethod
+    def open(path: str) -> StagedText:
+        """
+        A plain text file staged by an earlier version is converted to a staged file in place first.
+
+        Raises:
+            FileNotFoundError: If the staged file does not exist.
+            ValueError: If the file is neither a staged file nor UTF-8 text.
+        """
+        if not is_staged(path):
+            restage_plain(path)
+        return StagedText(path)
+
+    def usage(self, collection_id: str) -> Tuple[int, int, int]:
+        """Returns the number of staged texts of a collection, their size on disk and their length in characters."""
+        directory = self._directory(collection_id)
+        if not os.path.isdir(directory):
+            return 0, 0, 0
+        files = stored_bytes = text_chars = 0
+        for entry in os.scandir(directory):
+            if not entry.name.endswith(".stg"):
+                continue
+            size = entry.stat().st_size
+            if size < len(MAGIC) + TRAILER.size:
+                continue
+            with open(entry.path, "rb") as f:
+                f.seek(size - TRAILER.size)
+                _, _, length, magic = TRAILER.unpack(f.read(TRAILER.size))
+            if magic == MAGIC:
+                files += 1
+                stored_bytes += size
+                text_chars += length
+        return files, stored_bytes, text_chars
+
+
+staging_store = StagingStore()
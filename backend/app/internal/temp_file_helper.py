@@ -1,10 +1,15 @@
+import asyncio
 import os
 import tempfile
 from pathlib import Path
 import logging
+from typing import Iterator, TextIO
 
 logger = logging.getLogger(__name__)
 
+READ_BLOCK_SIZE = 1024 * 1024  # characters read at once when a file is streamed
+UPLOAD_BLOCK_SIZE = 1024 * 1024  # bytes of an upload read at once when it is spooled to disk
+
 class TempFileHelper:
     """
     Utility class for managing temporary files.
@@ -43,6 +48,37 @@ class TempFileHelper:
             logger.error(f"An unexpected error occurred while saving temporary file {original_file_name}: {e}")
             raise
 
+    @staticmethod
+    async def spool_upload(upload, original_file_name: str, block_size: int = UPLOAD_BLOCK_SIZE) -> str:
+        """
+        Streams an upload to a temporary file block by block, so its body is never held in memory.
+
+        Args:
+            upload: The upload to read, anything with an async read(size) such as fastapi's UploadFile.
+            original_file_name: The original name of the file, used for extension.
+
+        Returns:
+            The absolute path to the spooled temporary file.
+        """
+        suffix = Path(original_file_name).suffix
+        # File operations run in a worker thread, so a slow disk never blocks the event loop
+        temp_file = await asyncio.to_thread(tempfile.NamedTemporaryFile, delete=False, suffix=suffix)
+        try:
+            try:
+                while True:
+                    block = await upload.read(block_size)
+                    if not block:
+                        break
+                    await asyncio.to_thread(temp_file.write, block)
+            finally:
+                await asyncio.to_thread(temp_file.close)
+        except Exception as e:
+            logger.error(f"Failed to spool upload {original_file_name}: {e}")
+            await asyncio.to_thread(TempFileHelper.remove_temp, temp_file.name)
+            raise
+        logger.info(f"Upload {original_file_name} spooled to: {temp_file.name}")
+        return temp_file.name
+
     @staticmethod
     def save_temp_str(file_content: str, original_file_name: str) -> str:
         try:
@@ -121,3 +157,12 @@ class TempFileHelper:
         except Exception as e:
             logger.error(f"An unexpected error occurred while reading temporary file {file_path}: {e}")
             raise
+
+    @staticmethod
+    def read_blocks(file: TextIO, block_size: int = READ_BLOCK_SIZE) -> Iterator[str]:
+        """Yields the rest of an open text file in blocks, so long lines are never read whole."""
+        while True:
+            block = file.read(block_size)
+            if not block:
+                return
+            yield block
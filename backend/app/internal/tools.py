@@ -1,14 +1,14 @@
-import chromadb
 from typing import List
 import asyncio
 import time
 import json
 from app.crud.crud_collection_content import query_collection as crud_query_collection
 from app.database import get_db_connection
-from app.crud.crud_collection import get_enabled_collections_for_mcp, get_collection_by_name, create_collection
+from app.crud.crud_collection import get_enabled_collections_for_mcp, get_collection, get_collection_by_name, create_collection
 from app.internal.extension_manager import ExtensionManager
 from app.schemas.mcp import ExtensionTool
 from app.schemas.collection import CollectionCreate
+from app.internal.chroma_manager import SEQUENCE_KEY, chroma_manager
 from app.internal.embedding_manager import get_embedder
 from app.crud.crud_summary import get_summary_by_type, create_summary, edit_summary, delete_summary_by_id
 from app.schemas.summary import SummaryType, Summary
@@ -70,21 +70,22 @@ def register_tools(mcp_server, mcp_manager):
                         enabled=True
                     ))
             
-            client = chromadb.PersistentClient(path="./chroma_data")
-            collection = client.get_collection(name=collection_name)
+            collection = chroma_manager.get_collection(collection_name)
             
-            embedder = get_embedder()
+            embedder = get_embedder(collection_meta.model if collection_meta else None)
             embedding = list(embedder.embed([summary]))[0].tolist()
             
             ts = int(time.time())
             fact_id = f"fact_{ts}"
             
-            collection.add(
-                documents=[fact],
-                embeddings=[embedding],
-                metadatas=[{"summary": summary, "ts": ts}],
-                ids=[fact_id]
-            )
+            with chroma_manager.write_lock(collection_name):
+                collection.add(
+                    documents=[fact],
+                    embeddings=[embedding],
+                    metadatas=[{"summary": summary, "ts": ts, SEQUENCE_KEY: chroma_manager.next_sequence(1)}],
+                    ids=[fact_id]
+                )
+            chroma_manager.invalidate_count(collection_name)
             
             return {"status": "success", "message": f"Fact saved to {collection_name}."}
         except Exception as e:
@@ -139,7 +140,10 @@ def register_tools(mcp_server, mcp_manager):
         if not mcp_manager.is_enabled():
             return {"status": "error", "message": "MCP server is disabled."}
         try:
-            return crud_query_collection(collection_name, query_text, n_results)
+            with get_db_connection() as db:
+                collection_meta = get_collection(db, collection_name)
+            model_name = collection_meta.model if collection_meta else None
+            return crud_query_collection(collection_name, query_text, n_results, model_name)
         except ValueError as e:
             return {
                 "status": "error",
@@ -185,8 +189,7 @@ def register_tools(mcp_server, mcp_manager):
                     "message": "Parameter 'ids' must be a string or list of strings.",
                 }
 
-            client = chromadb.PersistentClient(path="./chroma_data")
-            collection = client.get_collection(name=collection_name)
+            collection = chroma_manager.get_collection(collection_name)
 
             results = collection.get(
                 ids=ids,
@@ -2,12 +2,15 @@ import os
 import threading
 from fastapi import FastAPI
 from app.dependencies import get_message_hub, get_message_hub_instance, get_extension_manager # Added get_extension_manager
-from app.routers import items, collections, tasks, imports, mcp, logs, settings, files, extensions # Added extensions router
+from app.routers import items, collections, tasks, imports, mcp, logs, settings, files, extensions, embeddings # Added extensions router
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import create_tables, get_db_connection
 from contextlib import asynccontextmanager
 from app.internal.mcp_manager import MCPManager
-from app.crud import crud_task
+from app.internal.embedding_workers import EmbeddingWorkerPool
+from app.internal.simple_crawler import shutdown_extraction_pool
+from app.crud import crud_crawl_job, crud_task
+from app.internal.record_numbering import number_all_collections
 
 # Get the singleton instance of MCPManager
 mcp_manager = MCPManager()
@@ -20,8 +23,13 @@ async def lifespan(app: FastAPI):
     #Clear tasks if application crashed and them left in db
     db = get_db_connection()
     crud_task.delete_all_tasks(db)
+    # Their crawl jobs keep the progress and can be resumed
+    crud_crawl_job.interrupt_running_jobs(db)
     db.close()
 
+    # Collections stored before records had sequence numbers are numbered without holding up startup
+    threading.Thread(target=number_all_collections, daemon=True).start()
+
     # Get singleton MessageHub and initialize it
     message_hub = get_message_hub_instance()
     # Start broadcaster thread for MessageHub
@@ -44,6 +52,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown: cleanup if needed
     mcp_manager.disable()
+    EmbeddingWorkerPool().shutdown()
+    shutdown_extraction_pool()
     # Shutdown ExtensionManager if it has a shutdown method
     if hasattr(extension_manager, 'shutdown'):
         extension_manager.shutdown()
@@ -72,6 +82,7 @@ app.include_router(logs.router, prefix="/logs", tags=["logs"])
 app.include_router(settings.router, prefix="/settings", tags=["settings"])
 app.include_router(files.router, prefix="/files", tags=["files"])
 app.include_router(extensions.router, prefix="/extensions", tags=["extensions"]) # Include the new extensions router
+app.include_router(embeddings.router, prefix="/embeddings", tags=["embeddings"])
 
 @app.get("/")
 def read_root():
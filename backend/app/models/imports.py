@@ -1,14 +1,25 @@
 from abc import ABC, abstractmethod
 import os
 from threading import Event
-from typing import List
-from app.internal.embedding_manager import get_embedder
-import chromadb
-import time
-import numpy as np
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, Tuple
+from app.internal.embedding_manager import EmbedderRegistry
 from pathlib import Path
 
-from app.internal.chunker import Chunker, ChunkType
+from app.internal.chroma_manager import chroma_manager
+from app.internal.chunker import ChunkType, chunk_length_chars, create_chunker
+from app.internal.archive_reader import expand_archive, is_archive, remove_files
+from app.internal.chunk_sync import ChunkSync, ChunkSyncResult
+from app.internal.chunk_preview_cache import chunk_preview_cache
+from app.internal.embedding_cache import DEFAULT_CACHE_SIZE_MB, CachedEmbedder, EmbeddingCache
+from app.internal.embedding_pipeline import DEFAULT_MEMORY_LIMIT_MB, get_batch_size
+from app.internal.embedding_workers import get_import_embedder
+from app.internal.near_duplicates import NEAR_DUPLICATES_DISABLED, NearDuplicateIndex
+from app.internal.parsed_text_cache import DEFAULT_PARSED_TEXT_CACHE_SIZE_MB, ParsedTextCache
+from app.internal.pdf_extractor import DEFAULT_PDF_WORKERS, extract_pdf_pages
+from app.internal.staging_store import staging_store
+from app.crud.crud_chunk_hash import get_chunk_sources
 from app.crud.crud_files import create_file, delete_file, get_files_for_collection
 from app.internal.message_hub import MessageHub
 from app.models.import_context import ImportContext
@@ -18,22 +29,25 @@ from app.internal.temp_file_helper import TempFileHelper
 
 # Import LangChain loaders
 from langchain_community.document_loaders import Docx2txtLoader
-from langchain_community.document_loaders import PyPDFLoader
 
 from app.schemas.setting import SettingsName
 #from langchain_community.document_loaders import PyMuPDFLoader
 
+SUPPORTED_EXTENSIONS = [".txt", ".md", ".pdf", ".docx"]
+DEFAULT_BULK_PARSE_WORKERS = 4
+BULK_PARSE_LOOKAHEAD = 2  # files parsed per worker ahead of the file being embedded
+
 class ImportBase(ABC):
     name: str
     settings: Import
 
     
     @abstractmethod
-    async def import_data(self, collection_id: str, file_name: str, file_content_bytes: bytes, context: ImportContext, cancel_event:Event) -> None: # Modified signature
+    async def import_data(self, collection_id: str, file_name: str, file_path: str, context: ImportContext, cancel_event:Event) -> None: # Modified signature
         pass
 
     @abstractmethod
-    async def prepare_data(self, collection_id: str, file_name: str, file_content_bytes: bytes, message_hub: MessageHub) -> str:
+    async def prepare_data(self, collection_id: str, file_name: str, file_path: str, message_hub: MessageHub) -> str:
         pass    
     
     def check_cancelled(self, collection_id: str, file_name: str, message_hub: MessageHub, cancel_event: Event) -> bool:
@@ -42,6 +56,29 @@ class ImportBase(ABC):
             message_hub.send_message(collection_id, MessageType.LOG, f"CANCELLED Import from {file_name} ")
             return True
         return False    
+
+    def create_embedder(self, context: ImportContext):
+        """
+        Returns the embedder for the chunks of this import: embedding runs in the worker pool when it is
+        enabled, and chunks embedded before by any collection are read from the embedding cache.
+        """
+        model_name = EmbedderRegistry().resolve_model_name(context.parameters.model)
+        embedder = get_import_embedder(
+            model_name,
+            context.settings.get_setting_int(SettingsName.EMBEDDING_WORKERS, 0),
+            context.settings.get_setting_int(SettingsName.EMBEDDING_WORKER_THREADS, 1)
+        )
+        cache_size_mb = context.settings.get_setting_int(SettingsName.EMBEDDING_CACHE_SIZE, DEFAULT_CACHE_SIZE_MB)
+        if cache_size_mb <= 0:
+            return embedder
+        cache = EmbeddingCache()
+        cache.configure(cache_size_mb)
+        return CachedEmbedder(embedder, model_name, cache)
+
+    def create_near_duplicate_index(self, context: ImportContext, setting: SettingsName) -> Optional[NearDuplicateIndex]:
+        """Returns the near-duplicate filter with the distance configured by `setting`, or None when it is -1."""
+        max_distance = context.settings.get_setting_int(setting, NEAR_DUPLICATES_DISABLED)
+        return NearDuplicateIndex(max_distance) if max_distance >= 0 else None
         
 from app.schemas.imports import Import, FileImportSettings
 
@@ -61,132 +98,361 @@ class FileImport(ImportBase):
             )
         )
     
-    def _process_chunks_and_store(self, collection_id: str, file_name: str, file_extension: str, chunks: List[str], import_params: Import, message_hub: MessageHub, cancel_event: Event) -> None:
-        """Embed chunks and store them in ChromaDB with batching and cancellation support."""
-        message_hub.send_message(collection_id, MessageType.INFO, f"Created {len(chunks)} chunks. Embedding....")
+    def _process_chunks_and_store(self, collection_id: str, file_name: str, file_extension: str, chunks: Iterable[str], context: ImportContext, cancel_event: Event) -> None:
+        """
+        Embed chunks and store them in ChromaDB batch by batch, with cancellation between batches.
+        Chunks may be a stream: they are created while earlier batches are embedded.
+        """
+        message_hub = context.messageHub
+        import_params = context.parameters
+        message_hub.send_message(collection_id, MessageType.INFO, "Chunking, embedding and saving to Database....")
+
+        collection = chroma_manager.get_or_create_collection(collection_id, metadata={"hnsw:space": "cosine"})
 
-        embedder = get_embedder()
-        embeddings = np.array(list(embedder.embed(chunks)))
+        memory_limit_mb = context.settings.get_setting_int(SettingsName.EMBEDDING_MEMORY_LIMIT, DEFAULT_MEMORY_LIMIT_MB)
+        chunk_chars = chunk_length_chars(import_params.settings.chunk_type, import_params.settings.chunk_size)
+        batch_size = get_batch_size(memory_limit_mb, chunk_chars, EmbedderRegistry().get_dimension(import_params.model))
 
-        if self.check_cancelled(collection_id, file_name, message_hub, cancel_event):
+        result = ChunkSync(context.db, collection, collection_id, file_name).run(
+            chunks,
+            self.create_embedder(context),
+            batch_size,
+            cancel_event,
+            on_batch=lambda batch_num, stored: message_hub.send_message(collection_id, MessageType.INFO, f"Import of batch {batch_num} completed successfully ({stored} chunks stored)"),
+            near_duplicates=self.create_near_duplicate_index(context, SettingsName.NEAR_DUPLICATE_CHUNK_DISTANCE)
+        )
+
+        if not result.completed:
+            self.check_cancelled(collection_id, file_name, message_hub, cancel_event)
             return
 
-        message_hub.send_message(collection_id, MessageType.INFO, "Embeddings created. Saving to Database....")
+        message_hub.send_message(collection_id, MessageType.UNLOCK, f"Import of {file_name} completed successfully")
+        message_hub.send_message(collection_id, MessageType.LOG, f"SUCCESSFUL imported {file_extension.upper()} from {file_name} {result.chunks} chunks of length {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap} ({result.summary()}).")
+    
+    async def prepare_data(self, collection_id: str, file_name: str, file_path: str, message_hub: MessageHub, pdf_workers: int = 0) -> str:
+        """
+        Prepares file content for chunking.
+        Handles different file types (TXT, MD, DOCX, PDF) spooled to file_path.
+        """
+        return self.extract_text(collection_id, file_name, file_path, message_hub, pdf_workers)
 
-        client = chromadb.PersistentClient(path="./chroma_data")
-        collection = client.get_or_create_collection(name=collection_id, metadata={"hnsw:space": "cosine"} )
+    def extract_text(self, collection_id: str, file_name: str, file_path: str, message_hub: MessageHub, pdf_workers: int = 0) -> str:
+        """Blocking part of prepare_data, so several files can be parsed in threads."""
+        file_extension = Path(file_name).suffix.lower()
+        if file_extension == ".pdf":
+            try:
+                return "\n".join(self._pdf_pages(collection_id, file_name, file_path, message_hub, pdf_workers))
+            except Exception as e:
+                message_hub.send_message(collection_id, MessageType.INFO, f"Error parsing PDF file '{file_name}': {e}")
+                raise RuntimeError(f"Failed to parse PDF file '{file_name}': {e}") from e
 
-        ts = int(time.time())
-        # ---- batching logic ----
-        max_batch_size = 5000  # safe limit below Chroma's 5461 cap
+        if file_extension == ".docx":
+            try:
+                loader = Docx2txtLoader(file_path)
+                message_hub.send_message(collection_id, MessageType.INFO, f"Parsing DOCX file '{file_name}' with Docx2txtLoader.")
+                docs = loader.load() 
+                return "\n".join([doc.page_content.replace('\n','') for doc in docs])
+            except Exception as e:
+                message_hub.send_message(collection_id, MessageType.INFO, f"Error parsing {file_extension.upper()} file '{file_name}': {e}")
+                raise RuntimeError(f"Failed to parse {file_extension.upper()} file '{file_name}': {e}") from e
+        elif file_extension in [".txt", ".md"]:
+            # newline="" keeps line endings as they are, like bytes.decode()
+            with open(file_path, "r", encoding="utf-8", newline="") as f:
+                return f.read()
+        else:
+            raise ValueError(f"Unsupported file type: {file_extension}")
 
-        batch_num = 1
-        for start in range(0, len(chunks), max_batch_size):
+    def _pdf_pages(self, collection_id: str, file_name: str, file_path: str, message_hub: MessageHub, pdf_workers: int) -> Iterator[str]:
+        """Page texts of a PDF, parsed from a memory map of the spooled upload."""
+        message_hub.send_message(collection_id, MessageType.INFO, f"Parsing PDF file '{file_name}' with pypdf.")
+        return extract_pdf_pages(file_path, pdf_workers)
 
-            if self.check_cancelled(collection_id, file_name, message_hub, cancel_event):
-                return
+    @staticmethod
+    def _text_blocks(file_path: str) -> Iterator[str]:
+        # newline="" keeps line endings as they are, like bytes.decode()
+        with open(file_path, "r", encoding="utf-8", newline="") as f:
+            yield from TempFileHelper.read_blocks(f)
 
-            end = start + max_batch_size
+    async def prepare_segments(self, collection_id: str, file_name: str, file_path: str, message_hub: MessageHub, pdf_workers: int = 0) -> Iterable[str]:
+        """
+        Like prepare_data, but returns the text as segments to chunk as a stream.
+        Plain text files are decoded block by block instead of into one string,
+        and PDF pages are chunked as soon as they are extracted.
+        """
+        return self._segments(collection_id, file_name, file_path, message_hub, pdf_workers)
 
-            batch_chunks = chunks[start:end]
-            batch_embeddings = embeddings[start:end].tolist()
+    def _segments(self, collection_id: str, file_name: str, file_path: str, message_hub: MessageHub, pdf_workers: int = 0) -> Iterable[str]:
+        file_extension = Path(file_name).suffix.lower()
+        if file_extension in [".txt", ".md"]:
+            return self._text_blocks(file_path)
+        if file_extension == ".pdf":
+            pages = self._pdf_pages(collection_id, file_name, file_path, message_hub, pdf_workers)
+            # Pages are joined with line breaks, like prepare_data joins them
+            return (page if index == 0 else "\n" + page for index, page in enumerate(pages))
+        return [self.extract_text(collection_id, file_name, file_path, message_hub)]
 
-            batch_ids = [
-                f"{file_name}_{ts}_{i}"
-                for i in range(start, min(end, len(chunks)))
-            ]
+    @staticmethod
+    def _use_parsed_text_cache(context: ImportContext) -> bool:
+        """Whether imported text is cached for rechunk; applies the cache's size limit when it is."""
+        if not context.settings.check(SettingsName.PARSED_TEXT_CACHE, 'True'):
+            return False
+        ParsedTextCache().configure(context.settings.get_setting_int(SettingsName.PARSED_TEXT_CACHE_SIZE, DEFAULT_PARSED_TEXT_CACHE_SIZE_MB))
+        return True
 
-            collection.upsert(
-                documents=batch_chunks,
-                embeddings=batch_embeddings,
-                metadatas=[{"source": file_name, "chunk": i, "ts":ts} for i in range(start, min(end, len(chunks)))],
-                ids=batch_ids
-            )
+    def _cached_segments(self, collection_id: str, file_name: str, file_path: str, message_hub: MessageHub,
+                         parse: Callable[[], Iterable[str]]) -> Iterable[str]:
+        """
+        Returns the text parsed before from a file with the same content, read from the parsed text cache.
+        Otherwise the file is parsed and its text is cached as it is chunked, for rechunk.
+        """
+        cache = ParsedTextCache()
+        content_hash = cache.file_hash(file_path)
+        text_path = cache.get(collection_id, file_name, content_hash)
+        if text_path is not None:
+            message_hub.send_message(collection_id, MessageType.INFO, f"File '{file_name}' was parsed before, using its cached text.")
+            return cache.read(text_path)
+        return cache.store(collection_id, file_name, content_hash, parse())
 
-            message_hub.send_message(collection_id, MessageType.INFO, f"Import of batch {batch_num} completed successfully")
-            batch_num += 1
-            
-        message_hub.send_message(collection_id, MessageType.UNLOCK, f"Import of {file_name} completed successfully")
-        message_hub.send_message(collection_id, MessageType.LOG, f"SUCCESSFUL imported {file_extension.upper()} from {file_name} {len(chunks)} chunks of length {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap}.")
-    
-    async def prepare_data(self, collection_id: str, file_name: str, file_content_bytes: bytes, message_hub: MessageHub) -> str:
+    def _bulk_sources(self, collection_id: str, files: List[Tuple[str, str]], context: ImportContext, collection,
+                      cancel_event: Event, progress: dict) -> Iterator[Tuple[ChunkSync, Iterable[str]]]:
         """
-        Prepares file content for chunking.
-        Handles different file types (TXT, MD, DOCX, PDF).
+        Parses the files in a thread pool, a few files ahead of the embedding, and yields their
+        chunk streams in order. Files that fail to parse are reported and skipped.
         """
-        file_extension = Path(file_name).suffix.lower()
-        extracted_text = ""
-        temp_file_path = None
+        message_hub = context.messageHub
+        import_params = context.parameters
+        parse_workers = max(context.settings.get_setting_int(SettingsName.BULK_IMPORT_PARSE_WORKERS, DEFAULT_BULK_PARSE_WORKERS), 1)
+        pdf_workers = context.settings.get_setting_int(SettingsName.PDF_EXTRACTION_WORKERS, DEFAULT_PDF_WORKERS)
+        use_cache = self._use_parsed_text_cache(context)
+        chunker = create_chunker(import_params.settings.chunk_type, import_params.model)
 
+        def extract(file_name: str, file_path: str) -> Iterable[str]:
+            if Path(file_name).suffix.lower() in [".txt", ".md"]:
+                # Plain text needs no parsing: it is streamed when its turn comes
+                return self._text_blocks(file_path)
+            return [self.extract_text(collection_id, file_name, file_path, message_hub, pdf_workers)]
+
+        def parse(file_name: str, file_path: str) -> Iterable[str]:
+            if not use_cache:
+                return extract(file_name, file_path)
+            return self._cached_segments(collection_id, file_name, file_path, message_hub, lambda: extract(file_name, file_path))
+
+        executor = ThreadPoolExecutor(max_workers=parse_workers, thread_name_prefix="bulk-parse")
         try:
-            if file_extension in [".docx", ".pdf"]:
-                temp_file_path = TempFileHelper.save_temp(file_content_bytes, file_name)
+            pending: Deque[Tuple[str, Future]] = deque()
+            remaining = iter(files)
 
-                try:
-                    loader = None
-                    if file_extension == ".docx":
-                        loader = Docx2txtLoader(temp_file_path)
-                        message_hub.send_message(collection_id, MessageType.INFO, f"Parsing DOCX file '{file_name}' with Docx2txtLoader.")
-                    elif file_extension == ".pdf":
-                        
-                        loader = PyPDFLoader(temp_file_path)
-                        message_hub.send_message(collection_id, MessageType.INFO, f"Parsing PDF file '{file_name}' with PDFPlumberLoader.")
-                    
-                    if loader != None:
-                        docs = loader.load() 
-                        extracted_text = "\n".join([doc.page_content.replace('\n','') for doc in docs])
+            def submit_next() -> None:
+                for file_name, file_path in remaining:
+                    pending.append((file_name, executor.submit(parse, file_name, file_path)))
+                    return
 
+            for _ in range(parse_workers * BULK_PARSE_LOOKAHEAD):
+                submit_next()
+            while pending and not cancel_event.is_set():
+                file_name, future = pending.popleft()
+                submit_next()
+                try:
+                    segments = future.result()
                 except Exception as e:
-                    message_hub.send_message(collection_id, MessageType.INFO, f"Error parsing {file_extension.upper()} file '{file_name}': {e}")
-                    raise RuntimeError(f"Failed to parse {file_extension.upper()} file '{file_name}': {e}") from e
-            elif file_extension in [".txt", ".md"]:
-                extracted_text = file_content_bytes.decode("utf-8")
-            else:
-                raise ValueError(f"Unsupported file type: {file_extension}")
+                    self._report_failed_source(collection_id, file_name, e, message_hub, progress)
+                    continue
+                progress["files"] += 1
+                chunks = chunker.iter_chunks(segments, import_params.settings.chunk_type, import_params.settings.chunk_size, import_params.settings.chunk_overlap) \
+                    if not import_params.settings.no_chunks else ["".join(segments)]
+                yield ChunkSync(context.db, collection, collection_id, file_name), chunks
         finally:
-            if temp_file_path:
-                TempFileHelper.remove_temp(temp_file_path)
-        
-        return extracted_text
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _expand_uploads(self, uploads: List[Tuple[str, str]], spool_paths: List[str]) -> List[Tuple[str, str]]:
+        """Replaces archives by the supported files they contain, whose temp files are added to spool_paths."""
+        files = []
+        for file_name, file_path in uploads:
+            if not is_archive(file_name):
+                files.append((file_name, file_path))
+                continue
+            for member_name, member_path in expand_archive(file_path, SUPPORTED_EXTENSIONS):
+                spool_paths.append(member_path)
+                files.append((f"{file_name}/{member_name}", member_path))
+        return files
 
-    async def import_data(self, collection_id: str, file_name: str, file_content_bytes: bytes, context: ImportContext, cancel_event: Event) -> None: # Modified signature
+    def _store_sources(self, collection_id: str, collection, sources: Iterable[Tuple[ChunkSync, Iterable[str]]], file_count: int,
+                       context: ImportContext, cancel_event: Event, progress: dict) -> Optional[List[ChunkSyncResult]]:
+        """
+        Syncs the chunks of several sources through shared embedding batches.
+        Returns the results of the sources, or None when the import was cancelled.
+        """
+        message_hub = context.messageHub
+        import_params = context.parameters
+        memory_limit_mb = context.settings.get_setting_int(SettingsName.EMBEDDING_MEMORY_LIMIT, DEFAULT_MEMORY_LIMIT_MB)
+        chunk_chars = chunk_length_chars(import_params.settings.chunk_type, import_params.settings.chunk_size)
+        batch_size = get_batch_size(memory_limit_mb, chunk_chars, EmbedderRegistry().get_dimension(import_params.model))
+
+        results = ChunkSync.run_many(
+            collection,
+            sources,
+            self.create_embedder(context),
+            batch_size,
+            cancel_event,
+            on_batch=lambda batch_num, stored: message_hub.send_message(collection_id, MessageType.INFO, f"Bulk import batch {batch_num} completed ({stored} chunks stored, {progress['files']} of {file_count} files started)"),
+            near_duplicates=self.create_near_duplicate_index(context, SettingsName.NEAR_DUPLICATE_CHUNK_DISTANCE),
+            on_error=lambda sync, e: self._report_failed_source(collection_id, sync.source, e, message_hub, progress)
+        )
+
+        if cancel_event.is_set() or not all(result.completed or result.error is not None for result in results):
+            self.check_cancelled(collection_id, f"{file_count} files", message_hub, cancel_event)
+            return None
+        # Failed sources were reported already
+        return [result for result in results if result.error is None]
+
+    @staticmethod
+    def _report_failed_source(collection_id: str, source: str, e: Exception, message_hub: MessageHub, progress: dict) -> None:
+        progress["failed"].append(source)
+        message_hub.send_message(collection_id, MessageType.LOG, f"FAILED import of {source}. Exception {e}")
+
+    @staticmethod
+    def _total(results: List[ChunkSyncResult]) -> ChunkSyncResult:
+        total = ChunkSyncResult()
+        for result in results:
+            for counter in ("added", "unchanged", "removed", "duplicates", "near_duplicates", "chunks"):
+                setattr(total, counter, getattr(total, counter) + getattr(result, counter))
+        return total
+
+    async def import_bulk(self, collection_id: str, uploads: List[Tuple[str, str]], context: ImportContext, cancel_event: Event) -> None:
+        """
+        Imports many uploaded files, and the files of uploaded zip/tar archives, as one task.
+        uploads are (file name, spool path) pairs; the spool files are removed once the import ends.
+        Files are parsed in parallel and their new chunks share the embedding batches of one pipeline.
+        """
+        message_hub = context.messageHub
+        import_params = context.parameters
+        spool_paths = [file_path for _, file_path in uploads]
+        try:
+            message_hub.send_message(collection_id, MessageType.LOCK, f"Starting bulk import of {len(uploads)} uploads")
+            files = self._expand_uploads(uploads, spool_paths)
+            unsupported = [file_name for file_name, _ in files if Path(file_name).suffix.lower() not in SUPPORTED_EXTENSIONS]
+            files = [(file_name, file_path) for file_name, file_path in files if file_name not in unsupported]
+            for file_name in unsupported:
+                message_hub.send_message(collection_id, MessageType.LOG, f"FAILED import of {file_name} in bulk import. Unsupported file type")
+
+            progress = {"files": 0, "failed": []}
+            message_hub.send_message(collection_id, MessageType.INFO, f"Parsing, chunking and embedding {len(files)} files....")
+            collection = chroma_manager.get_or_create_collection(collection_id, metadata={"hnsw:space": "cosine"})
+            results = self._store_sources(collection_id, collection, self._bulk_sources(collection_id, files, context, collection, cancel_event, progress),
+                                          len(files), context, cancel_event, progress)
+            if results is None:
+                return
+
+            total = self._total(results)
+            message_hub.send_message(collection_id, MessageType.UNLOCK, f"Bulk import of {len(results)} files completed successfully")
+            message_hub.send_message(collection_id, MessageType.LOG, f"SUCCESSFUL bulk import of {len(results)} files ({len(progress['failed']) + len(unsupported)} failed), {total.chunks} chunks of length {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap} ({total.summary()}).")
+        except Exception as e:
+            print("FAIL import_bulk", e)
+            message_hub.send_message(collection_id, MessageType.UNLOCK, f"Bulk import failed: {e}")
+            message_hub.send_message(collection_id, MessageType.LOG, f"FAILED bulk import of {len(uploads)} uploads. Exception {e}")
+        finally:
+            remove_files(spool_paths)
+
+    async def import_data(self, collection_id: str, file_name: str, file_path: str, context: ImportContext, cancel_event: Event) -> None: # Modified signature
+        """Imports an upload spooled to file_path; the spool file is removed once the import ends."""
         file_extension = Path(file_name).suffix.lower()
         message_hub = context.messageHub
         import_params = context.parameters
+        segments = []
         try:
             
             message_hub.send_message(collection_id,  MessageType.LOCK, f"Starting import of {file_name}")
                           
-            text_content = await self.prepare_data(collection_id, file_name, file_content_bytes, message_hub)
+            pdf_workers = context.settings.get_setting_int(SettingsName.PDF_EXTRACTION_WORKERS, DEFAULT_PDF_WORKERS)
+            if self._use_parsed_text_cache(context):
+                segments = self._cached_segments(collection_id, file_name, file_path, message_hub,
+                                                 lambda: self._segments(collection_id, file_name, file_path, message_hub, pdf_workers))
+            else:
+                segments = await self.prepare_segments(collection_id, file_name, file_path, message_hub, pdf_workers)
             
             if self.check_cancelled(collection_id, file_name, message_hub, cancel_event):
                 return
 
             chunks = []
             if not import_params.settings.no_chunks:
-                chunks = Chunker().create_chunks(text_content, import_params.settings.chunk_type , import_params.settings.chunk_size, import_params.settings.chunk_overlap)
+                chunks = create_chunker(import_params.settings.chunk_type, import_params.model).iter_chunks(segments, import_params.settings.chunk_type, import_params.settings.chunk_size, import_params.settings.chunk_overlap)
             else:
-                chunks = [text_content]
+                chunks = ["".join(segments)]
 
             # delegate embedding + DB storage to helper
-            self._process_chunks_and_store(collection_id, file_name, file_extension, chunks, import_params, message_hub, cancel_event)
+            self._process_chunks_and_store(collection_id, file_name, file_extension, chunks, context, cancel_event)
         except Exception as e:
             print("FAIL import_data", e)
             message_hub.send_message(collection_id, MessageType.UNLOCK, f"Import of {file_name} failed: {e}")
             message_hub.send_message(collection_id, MessageType.LOG, f"FAILED import {file_extension.upper()} from {file_name}. Chunk size {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap}. Exception {e}")
+        finally:
+            # A stream stopped early (cancel, error) still holds the file open
+            if hasattr(segments, "close"):
+                segments.close()
+            TempFileHelper.remove_temp(file_path)
             
     
-    async def step_1(self, collection_id: str, file_name: str, file_content_bytes: bytes, context: ImportContext, cancel_event:Event) -> None: # Modified signature
-        if not context.settings.check(SettingsName.TWO_STEP_IMPORT, 'True'):
-            context.messageHub.send_message(collection_id, MessageType.INFO, "Set 2 Step mode to use this function")
-            return
-        
-        context.messageHub.send_message(collection_id, MessageType.LOCK, f"Step 1 of import of {file_name} started")
-        text_content = await self.prepare_data(collection_id, file_name, file_content_bytes, context.messageHub)
+    async def rechunk(self, collection_id: str, context: ImportContext, cancel_event: Event) -> None:
+        """
+        Chunks the files of a collection again with the settings of the context, from the text cached
+        when they were imported. Only new chunks are embedded and chunks no longer produced are deleted.
+        Sources without cached text, like crawled pages, are left as they are.
+        """
+        message_hub = context.messageHub
+        import_params = context.parameters
+        try:
+            message_hub.send_message(collection_id, MessageType.LOCK, "Starting rechunk")
+            imported = set(get_chunk_sources(context.db, collection_id))
+            cached = [(source, text_path) for source, text_path in ParsedTextCache().sources(collection_id) if source in imported]
+            if not cached:
+                message_hub.send_message(collection_id, MessageType.UNLOCK, "No imported files with cached text to rechunk")
+                return
+
+            chunker = create_chunker(import_params.settings.chunk_type, import_params.model)
+            collection = chroma_manager.get_or_create_collection(collection_id, metadata={"hnsw:space": "cosine"})
+            progress = {"files": 0, "failed": []}
 
-        tmp_file = TempFileHelper.save_temp_str(text_content, file_name)
-        create_file(context.db, collection_id, tmp_file, file_name)
-        context.messageHub.send_message(collection_id, MessageType.UNLOCK, f"Step 1 of import of {file_name} completed successfully")
+            def sources() -> Iterator[Tuple[ChunkSync, Iterable[str]]]:
+                for source, text_path in cached:
+                    progress["files"] += 1
+                    blocks = ParsedTextCache.read(text_path)
+                    chunks = chunker.iter_chunks(blocks, import_params.settings.chunk_type, import_params.settings.chunk_size, import_params.settings.chunk_overlap) \
+                        if not import_params.settings.no_chunks else ["".join(blocks)]
+                    yield ChunkSync(context.db, collection, collection_id, source), chunks
+
+            message_hub.send_message(collection_id, MessageType.INFO, f"Rechunking and embedding {len(cached)} files....")
+            results = self._store_sources(collection_id, collection, sources(), len(cached), context, cancel_event, progress)
+            if results is None:
+                return
+
+            total = self._total(results)
+            message_hub.send_message(collection_id, MessageType.UNLOCK, f"Rechunk of {len(results)} files completed successfully")
+            message_hub.send_message(collection_id, MessageType.LOG, f"SUCCESSFUL rechunk of {len(results)} files ({len(progress['failed'])} failed, {len(imported) - len(cached)} sources without cached text skipped), {total.chunks} chunks of length {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap} ({total.summary()}).")
+        except Exception as e:
+            print("FAIL rechunk", e)
+            message_hub.send_message(collection_id, MessageType.UNLOCK, f"Rechunk failed: {e}")
+            message_hub.send_message(collection_id, MessageType.LOG, f"FAILED rechunk. Chunk size {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap}. Exception {e}")
+
+    async def step_1(self, collection_id: str, file_name: str, file_path: str, context: ImportContext, cancel_event:Event) -> None: # Modified signature
+        try:
+            if not context.settings.check(SettingsName.TWO_STEP_IMPORT, 'True'):
+                context.messageHub.send_message(collection_id, MessageType.INFO, "Set 2 Step mode to use this function")
+                return
+            
+            context.messageHub.send_message(collection_id, MessageType.LOCK, f"Step 1 of import of {file_name} started")
+            pdf_workers = context.settings.get_setting_int(SettingsName.PDF_EXTRACTION_WORKERS, DEFAULT_PDF_WORKERS)
+            if self._use_parsed_text_cache(context):
+                segments = self._cached_segments(collection_id, file_name, file_path, context.messageHub,
+                                                 lambda: self._segments(collection_id, file_name, file_path, context.messageHub, pdf_workers))
+            else:
+                segments = await self.prepare_segments(collection_id, file_name, file_path, context.messageHub, pdf_workers)
+
+            # The text is compressed into the staging store as it is parsed
+            staged_file = staging_store.save(collection_id, segments)
+            create_file(context.db, collection_id, staged_file, file_name)
+            context.messageHub.send_message(collection_id, MessageType.UNLOCK, f"Step 1 of import of {file_name} completed successfully")
+        finally:
+            TempFileHelper.remove_temp(file_path)
 
     
     async def step_2(self, collection_id: str, context: ImportContext, files_ids: List[str], cancel_event:Event) -> None: # Modified signature
@@ -203,24 +469,27 @@ class FileImport(ImportBase):
                 if file.id not in files_ids:
                     continue
                 if os.path.exists(file.path):
-                    with open(file.path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                        
+                    with staging_store.open(file.path) as staged:
                         if self.check_cancelled(collection_id, "", context.messageHub, cancel_event):
                             return
 
+                        # The staged text is chunked as its blocks are decompressed
                         chunks = []
                         if not context.parameters.settings.no_chunks:
-                            chunks = Chunker().create_chunks(content, context.parameters.settings.chunk_type, context.parameters.settings.chunk_size, context.parameters.settings.chunk_overlap)
+                            chunks = create_chunker(context.parameters.settings.chunk_type, context.parameters.model).iter_chunks(staged.iter_blocks(), context.parameters.settings.chunk_type, context.parameters.settings.chunk_size, context.parameters.settings.chunk_overlap)
                         else:
-                            chunks = [content]
+                            chunks = ["".join(staged.iter_blocks())]
 
                         # delegate embedding + DB storage to helper
-                        self._process_chunks_and_store(collection_id, file.source, "txt", chunks, context.parameters, context.messageHub, cancel_event)
+                        self._process_chunks_and_store(collection_id, file.source, "txt", chunks, context, cancel_event)
                 else:
                     print("File does not exist")
+            except ValueError as e:
+                # A staged file that cannot be read is skipped, the other files are still imported
+                context.messageHub.send_message(collection_id, MessageType.LOG, f"FAILED import of {file.source}. Exception {e}")
             finally:
                 delete_file(context.db, file.id)
+                chunk_preview_cache.discard(file.id)
                 TempFileHelper.remove_temp(file.path)
             
             
@@ -1,24 +1,35 @@
+import asyncio
 import os
 from threading import Event
-import time
+from typing import Optional
+import uuid
 
-import chromadb
-from fastembed import TextEmbedding
-import numpy as np
+from app.crud import crud_crawl_job
 from app.crud.crud_files import create_file, delete_file, get_files_for_collection
+from app.database import get_db_connection
 from app.internal import simple_crawler
-from app.internal.chunker import Chunker
-from app.internal.embedding_manager import get_embedder
+from app.internal.chroma_manager import chroma_manager
+from app.internal.chunker import chunk_length_chars, create_chunker
+from app.internal.chunk_sync import ChunkSync
+from app.internal.crawl_checkpoint import CrawlCheckpoint
+from app.internal.embedding_pipeline import DEFAULT_MEMORY_LIMIT_MB, get_batch_size
+from app.internal.embedding_manager import EmbedderRegistry
 from app.internal.message_hub import MessageHub
-from app.internal.temp_file_helper import TempFileHelper
+from app.internal.near_duplicates import NearDuplicateIndex
+from app.internal.page_cache import PageCache, text_digest
+from app.internal.staging_store import staging_store
 from app.models.import_context import ImportContext
 from app.models.imports import ImportBase
 from app.models.messages import MessageType
+from app.schemas.crawl_job import CrawlJobStatus
 from app.schemas.imports import FileImportSettings, Import
 from app.schemas.setting import SettingsName
 
 import re
 
+PAGE_QUEUE_SIZE = 16  # crawled pages waiting to be indexed
+DEFAULT_EXTRACTION_WORKERS = 2
+
 
 class UrlImport(ImportBase):
     name = 'URL'
@@ -35,11 +46,15 @@ class UrlImport(ImportBase):
             )
         )
     
-    async def prepare_data(self, collection_id: str, file_name: str, file_content_bytes: bytes, message_hub: MessageHub) -> str:
-         extracted_text = file_content_bytes.decode("utf-8")
-         return extracted_text
+    async def prepare_data(self, collection_id: str, file_name: str, file_path: str, message_hub: MessageHub) -> str:
+         with open(file_path, "r", encoding="utf-8") as file:
+             return file.read()
     
-    async def import_data(self, collection_id: str, file_name: str, file_content_bytes: bytes, context: ImportContext, cancel_event: Event) -> None: # Modified signature
+    async def import_data(self, collection_id: str, file_name: str, file_path: str, context: ImportContext, cancel_event: Event, job_id: Optional[str] = None) -> None: # Modified signature
+        """
+        Crawls and imports the site at file_name; file_path is unused since nothing is uploaded.
+        With job_id, continues the crawl job where it was interrupted.
+        """
         message_hub = context.messageHub
         import_params = context.parameters
         
@@ -47,6 +62,7 @@ class UrlImport(ImportBase):
         message_hub.send_message(collection_id, MessageType.INFO, f"Crawling and parsing {file_name} ....")
         
         max_depth = context.settings.get_setting_int(SettingsName.CRAWL_DEPTH, 1)
+        extraction_workers = context.settings.get_setting_int(SettingsName.CRAWL_EXTRACTION_WORKERS, DEFAULT_EXTRACTION_WORKERS)
 
         compiled_regex = None
         if context.parameters.settings.filter:
@@ -56,85 +72,157 @@ class UrlImport(ImportBase):
                 # Invalid regex, ignore it
                 pass
             
-        pages = simple_crawler.simple_crawl(file_name, cancel_event, compiled_regex, max_depth=max_depth)
+        # Own connection: the page cache and the checkpoint are used on the event loop while pages are indexed in a thread
+        crawl_db = get_db_connection()
+        page_cache = PageCache(crawl_db, collection_id, self.__import_fingerprint(import_params))
+        if job_id is None:
+            # A new import replaces the interrupted crawls of the same site
+            crud_crawl_job.delete_interrupted_jobs(crawl_db, collection_id, file_name)
+            job_id = str(uuid.uuid4())
+            crud_crawl_job.create_job(crawl_db, job_id, collection_id, file_name, import_params.model_dump_json())
+        else:
+            crud_crawl_job.update_job_status(crawl_db, job_id, CrawlJobStatus.RUNNING)
+        checkpoint = CrawlCheckpoint(crawl_db, job_id)
+        crawler = simple_crawler.AsyncCrawler(file_name, cancel_event, compiled_regex, max_depth=max_depth,
+                                              extraction_workers=extraction_workers, page_cache=page_cache,
+                                              use_sitemap=context.settings.check(SettingsName.CRAWL_USE_SITEMAP, 'True'),
+                                              checkpoint=checkpoint,
+                                              near_duplicates=self.create_near_duplicate_index(context, SettingsName.NEAR_DUPLICATE_PAGE_DISTANCE))
+        # Shared by all pages of the crawl, so chunks repeated across pages are embedded once
+        chunk_duplicates = self.create_near_duplicate_index(context, SettingsName.NEAR_DUPLICATE_CHUNK_DISTANCE)
 
-        if pages == None:
-             message_hub.send_message(collection_id, MessageType.LOG, f"NOTHING imported from {file_name}. Parsed no pages.")
-             return
+        # Pages are indexed while the crawl goes on; the bounded queue pauses the crawl when indexing falls behind
+        pages: asyncio.Queue = asyncio.Queue(maxsize=PAGE_QUEUE_SIZE)
+        indexer = asyncio.create_task(self.__index_pages(collection_id, pages, context, page_cache, checkpoint, self.create_embedder(context), chunk_duplicates, cancel_event))
+        crawled = 0
+        indexed = 0
+        finished = False
+        try:
+            try:
+                async for page in crawler.pages():
+                    if compiled_regex and not compiled_regex.match(page["url"]):
+                        checkpoint.done(page["url"])
+                        continue
+                    crawled += 1
+                    await self.__queue_page(pages, page, indexer)
+                finished = not cancel_event.is_set()
+            finally:
+                if not indexer.done():
+                    await self.__queue_page(pages, None, indexer)
+                indexed = await indexer
+        except Exception as e:
+            finished = False
+            print("FAIL import_data", e)
+            message_hub.send_message(collection_id, MessageType.UNLOCK, f"Import of {file_name} failed: {e}")
+            message_hub.send_message(collection_id, MessageType.LOG, f"FAILED crawl of {file_name} after {indexed} pages, resume job {job_id} to continue. Exception {e}")
+            return
+        finally:
+            if not indexer.done():
+                indexer.cancel()
+            if finished:
+                crud_crawl_job.delete_job(crawl_db, job_id)
+            else:
+                crud_crawl_job.update_job_status(crawl_db, job_id, CrawlJobStatus.INTERRUPTED)
+            crawl_db.close()
 
-        message_hub.send_message(collection_id, MessageType.INFO, f"Parsed {len(pages)} pages")
+        if cancel_event.is_set():
+            message_hub.send_message(collection_id, MessageType.INFO, f"Crawl progress of {file_name} saved, resume job {job_id} to continue")
+            message_hub.send_message(collection_id, MessageType.UNLOCK, f"Import of {file_name} was cancelled")
+            message_hub.send_message(collection_id, MessageType.LOG, f"CANCELLED Import from {file_name} after {indexed} pages, chunks of length {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap}.")
+            return
 
-        for page in pages:
+        if crawled == 0 and crawler.unchanged_pages == 0 and crawler.resumed_pages == 0:
+            message_hub.send_message(collection_id, MessageType.UNLOCK, f"Import of {file_name} completed.")
+            message_hub.send_message(collection_id, MessageType.LOG, f"NOTHING imported from {file_name}. Parsed no pages.")
+            return
+
+        if crawler.resumed_pages:
+            message_hub.send_message(collection_id, MessageType.INFO, f"Resumed crawl, {crawler.resumed_pages} pages were done before")
+        if crawler.sitemap_pages:
+            message_hub.send_message(collection_id, MessageType.INFO, f"Found {crawler.sitemap_pages} pages in sitemaps")
+        message_hub.send_message(collection_id, MessageType.INFO, f"Parsed {crawled} pages, {crawler.unchanged_pages} unchanged pages skipped")
+        near_duplicate_chunks = chunk_duplicates.dropped if chunk_duplicates else 0
+        message_hub.send_message(collection_id, MessageType.LOG, f"SUCCESSFUL crawl of {file_name}: {indexed} pages imported, {crawler.unchanged_pages} unchanged, {crawler.near_duplicate_pages} near-duplicate pages and {near_duplicate_chunks} near-duplicate chunks skipped.")
+        message_hub.send_message(collection_id, MessageType.UNLOCK, f"Import of {file_name} completed.")
+
+    async def __index_pages(self, collection_id: str, pages: asyncio.Queue, context: ImportContext, page_cache: PageCache, checkpoint: CrawlCheckpoint, embedder, chunk_duplicates: Optional[NearDuplicateIndex], cancel_event: Event) -> int:
+        """Chunks, embeds and stores crawled pages until the None sentinel. Returns the number of pages indexed."""
+        indexed = 0
+        while True:
+            page = await pages.get()
+            if page is None:
+                return indexed
             if cancel_event.is_set():
-                 message_hub.send_message(collection_id, MessageType.UNLOCK, f"Import of {file_name} was cancelled")
-                 message_hub.send_message(collection_id, MessageType.LOG, f"CANCELLED Import from {file_name} chunks of length {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap}.") 
-                 return
-            
-            if compiled_regex and not compiled_regex.match(page["url"]):
+                # Keep draining so the crawl is never blocked on a full queue
                 continue
-            
-            await self.__import_data_internal(collection_id, page["url"], page["text"], import_params, message_hub,cancel_event )
+            try:
+                # Embedding is blocking; run it in a thread so the crawl keeps fetching meanwhile
+                stored = await asyncio.to_thread(self.__import_data_internal, collection_id, page["url"], page["text"], context, embedder, chunk_duplicates, cancel_event)
+                if stored:
+                    if page.get("cache_entry"):
+                        page_cache.save(page["cache_entry"])
+                    checkpoint.done(page["url"], indexed=True)
+                    indexed += 1
+            except Exception as e:
+                # The page stays pending in the checkpoint, so a resumed crawl indexes it again
+                context.messageHub.send_message(collection_id, MessageType.LOG, f"FAILED import from {page['url']}. Exception {e}")
 
-        message_hub.send_message(collection_id, MessageType.UNLOCK, f"Import of {file_name} completed.")
+    @staticmethod
+    async def __queue_page(pages: asyncio.Queue, page: Optional[dict], indexer: asyncio.Task) -> None:
+        """
+        Queues a page for the indexer. Raises if the indexer stopped, instead of waiting forever for room in a full queue.
+        """
+        put = asyncio.ensure_future(pages.put(page))
+        await asyncio.wait({put, indexer}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            indexer.result()
+            raise RuntimeError("The page indexer stopped before the crawl ended")
 
-    async def __import_data_internal(self, collection_id: str, file_name: str, page_content: str, import_params: Import, message_hub:MessageHub, cancel_event: Event) -> None: # Modified signature
+    @staticmethod
+    def __import_fingerprint(import_params: Import) -> str:
+        """Pages cached by an import with another model or chunk settings must be indexed again."""
+        return text_digest(f"{import_params.model}|{import_params.settings.model_dump_json()}")
+
+    def __import_data_internal(self, collection_id: str, file_name: str, page_content: str, context: ImportContext, embedder, chunk_duplicates: Optional[NearDuplicateIndex], cancel_event: Event) -> bool:
+        """Chunks, embeds and stores one page. Returns True once the page is stored completely."""
+        message_hub = context.messageHub
+        import_params = context.parameters
         try:
            
             chunks = []
             if not import_params.settings.no_chunks:
-                chunks = Chunker().create_chunks(page_content, import_params.settings.chunk_type, import_params.settings.chunk_size, import_params.settings.chunk_overlap)
+                chunks = create_chunker(import_params.settings.chunk_type, import_params.model).create_chunks(page_content, import_params.settings.chunk_type, import_params.settings.chunk_size, import_params.settings.chunk_overlap)
             else:
                 chunks = [page_content]
 
-            message_hub.send_message(collection_id, MessageType.INFO, f"Created {len(chunks)} chunks. Embedding....")
+            message_hub.send_message(collection_id, MessageType.INFO, f"Created {len(chunks)} chunks. Embedding and saving to Database....")
 
-            embedder = get_embedder()
-            embeddings = np.array(list(embedder.embed(chunks)))
-            message_hub.send_message(collection_id, MessageType.INFO, "Embeddings created. Saving to Database....")
+            collection = chroma_manager.get_or_create_collection(collection_id)
 
-            if cancel_event.is_set():
-                 message_hub.send_message(collection_id, MessageType.UNLOCK, f"Import of {file_name} was cancelled")
-                 message_hub.send_message(collection_id, MessageType.LOG, f"CANCELLED Import from {file_name} {len(chunks)} chunks of length {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap}.")
-                 return
-
-            client = chromadb.PersistentClient(path="./chroma_data")
-            collection = client.get_or_create_collection(name=collection_id)
-
-            ts = int(time.time())
-            # ---- batching logic ----
-            max_batch_size = 5000  # safe limit below Chroma's 5461 cap
-
-            batch_num = 1
-            for start in range(0, len(chunks), max_batch_size):
-                if cancel_event.is_set():
-                    message_hub.send_message(collection_id, MessageType.UNLOCK, f"Import of {file_name} was cancelled")
-                    message_hub.send_message(collection_id, MessageType.LOG, f"CANCELLED Import from {file_name} {len(chunks)} chunks of length {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap}.")
-                    return
+            memory_limit_mb = context.settings.get_setting_int(SettingsName.EMBEDDING_MEMORY_LIMIT, DEFAULT_MEMORY_LIMIT_MB)
+            chunk_chars = chunk_length_chars(import_params.settings.chunk_type, import_params.settings.chunk_size)
+            batch_size = get_batch_size(memory_limit_mb, chunk_chars, EmbedderRegistry().get_dimension(import_params.model))
 
-                end = start + max_batch_size
-
-                batch_chunks = chunks[start:end]
-                batch_embeddings = embeddings[start:end].tolist()
-
-                batch_ids = [
-                    f"{file_name}_{i}"
-                    for i in range(start, min(end, len(chunks)))
-                ]
-
-                collection.upsert(
-                    documents=batch_chunks,
-                    embeddings=batch_embeddings,
-                    metadatas=[{"source": file_name, "chunk": i, "ts":ts} for i in range(start, min(end, len(chunks)))],
-                    ids=batch_ids
-                )
+            result = ChunkSync(context.db, collection, collection_id, file_name).run(
+                chunks,
+                embedder,
+                batch_size,
+                cancel_event,
+                on_batch=lambda batch_num, stored: message_hub.send_message(collection_id, MessageType.INFO, f"Import of batch {batch_num} completed successfully"),
+                near_duplicates=chunk_duplicates
+            )
 
-                message_hub.send_message(collection_id, MessageType.INFO, f"Import of batch {batch_num} completed successfully")
-                batch_num += 1
+            if not result.completed:
+                # import_data reports the cancellation of the whole crawl
+                return False
                 
-            message_hub.send_message(collection_id, MessageType.LOG, f"SUCCESSFUL imported from {file_name} {len(chunks)} chunks of length {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap}.")
+            message_hub.send_message(collection_id, MessageType.LOG, f"SUCCESSFUL imported from {file_name} {len(chunks)} chunks of length {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap} ({result.summary()}).")
+            return True
         except Exception as e:
             print("FAIL import_data", e)
             message_hub.send_message(collection_id, MessageType.LOG, f"FAILED import from {file_name}. Chunk size {import_params.settings.chunk_size}, overlap {import_params.settings.chunk_overlap}. Exception {e}")
+            return False
 
 
     async def step_1(self, collection_id: str, url: str, context: ImportContext, cancel_event:Event) -> None: # Modified signature
@@ -146,6 +234,7 @@ class UrlImport(ImportBase):
         context.messageHub.send_message(collection_id, MessageType.INFO, f"Crawling and parsing {url} ....")
         
         max_depth = context.settings.get_setting_int(SettingsName.CRAWL_DEPTH, 1)
+        extraction_workers = context.settings.get_setting_int(SettingsName.CRAWL_EXTRACTION_WORKERS, DEFAULT_EXTRACTION_WORKERS)
 
         compiled_regex = None
         if context.parameters.settings.filter:
@@ -155,7 +244,9 @@ class UrlImport(ImportBase):
                 # Invalid regex, ignore it
                 pass    
         
-        pages = simple_crawler.simple_crawl(url, cancel_event, compiled_regex, max_depth=max_depth)
+        pages = await simple_crawler.crawl(url, cancel_event, compiled_regex, max_depth=max_depth, extraction_workers=extraction_workers,
+                                           use_sitemap=context.settings.check(SettingsName.CRAWL_USE_SITEMAP, 'True'),
+                                           near_duplicates=self.create_near_duplicate_index(context, SettingsName.NEAR_DUPLICATE_PAGE_DISTANCE))
 
         if pages == None:
              context.messageHub.send_message(collection_id, MessageType.LOG, f"NOTHING imported from {url}. Parsed no pages.")
@@ -173,8 +264,8 @@ class UrlImport(ImportBase):
                 continue
             
             print('Match', page["url"])
-            tmp_file = TempFileHelper.save_temp_str(page["text"], page["url"])
-            create_file(context.db, collection_id, tmp_file, page["url"])
+            staged_file = staging_store.save(collection_id, [page["text"]])
+            create_file(context.db, collection_id, staged_file, page["url"])
             
             
         context.messageHub.send_message(collection_id, MessageType.UNLOCK, f"Import of {url} completed.")
@@ -1,4 +1,3 @@
-import chromadb
 import os
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List
@@ -6,14 +5,19 @@ from sqlite3 import Connection
 
 from app.crud.crud_log import delete_log_by_collection_id
 from app.schemas.collection import Collection, CollectionCreate, CollectionDetails
-from app.schemas.collection_content import CollectionContentRequest, CollectionContentResponse, CollectionQueryResponse
+from app.schemas.collection_content import CollectionContentRequest, CollectionContentResponse, CollectionQueryResponse, CollectionScrollRequest, CollectionScrollResponse
 from app.crud.crud_collection import get_collections, create_collection, update_collection_description_and_enabled, delete_collection, get_collection, get_collection_details
-from app.crud.crud_collection_content import get_collection_chunks, query_collection
+from app.crud.crud_collection_content import get_collection_chunks, query_collection, scroll_collection_chunks
 from app.dependencies import get_db
-from app.internal.exceptions import DuplicateCollectionError
+from app.internal.chroma_manager import chroma_manager
+from app.internal.exceptions import CollectionNotReadyError, DuplicateCollectionError, InvalidCursorError
 from app.internal.utils import prepare_collection_name
 from app.internal.mcp_manager import mcp_manager
 from app.crud.crud_summary import delete_all_summaries_for_collection
+from app.crud.crud_chunk_hash import delete_chunk_hashes_by_collection_id
+from app.internal.parsed_text_cache import ParsedTextCache
+from app.crud.crud_page_cache import delete_pages_by_collection_id
+from app.crud.crud_crawl_job import delete_jobs_by_collection_id
 
 router = APIRouter()
 
@@ -48,13 +52,30 @@ def read_collection_content(collection_id: str, request: CollectionContentReques
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
+@router.post("/{collection_id}/content/scroll", response_model=CollectionScrollResponse)
+def scroll_collection_content(collection_id: str, request: CollectionScrollRequest, db: Connection = Depends(get_db)):
+    db_collection = get_collection(db, collection_id=collection_id)
+    if db_collection is None:
+        raise HTTPException(status_code=404, detail="Collection not found")
+    try:
+        chunks_data = scroll_collection_chunks(collection_id, request.cursor, request.page_size)
+        return CollectionScrollResponse(**chunks_data)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CollectionNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
 @router.get("/{collection_id}/query", response_model=CollectionQueryResponse)
 def query_collection_endpoint(collection_id: str, query_text: str = Query(..., min_length=1), db: Connection = Depends(get_db)):
     db_collection = get_collection(db, collection_id=collection_id)
     if db_collection is None:
         raise HTTPException(status_code=404, detail="Collection not found")
     try:
-        query_result = query_collection(collection_id, query_text)
+        query_result = query_collection(collection_id, query_text, model_name=db_collection.model)
         return CollectionQueryResponse(**query_result)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
@@ -83,10 +104,13 @@ def delete_existing_collection(collection_id: str, db: Connection = Depends(get_
         raise HTTPException(status_code=404, detail="Collection not found")
     delete_log_by_collection_id(db, collection_id)
     delete_all_summaries_for_collection(db,collection_id)
+    delete_chunk_hashes_by_collection_id(db, collection_id)
+    ParsedTextCache().delete_collection(collection_id)
+    delete_pages_by_collection_id(db, collection_id)
+    delete_jobs_by_collection_id(db, collection_id)
 
     try:
-        client = chromadb.PersistentClient(path="./chroma_data")
-        client.delete_collection(name=collection_id)
+        chroma_manager.delete_collection(collection_id)
         
     except Exception as e:
         print(f"Error deleting collection '{collection_id}' from ChromaDB: {e}")
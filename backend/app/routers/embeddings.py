@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+
+from app.internal.embedding_cache import EmbeddingCache
+from app.internal.embedding_manager import get_query_cache
+from app.schemas.embedding import ChunkCacheStats, QueryCacheStats
+
+router = APIRouter()
+
+@router.get("/query_cache", response_model=QueryCacheStats)
+def read_query_cache_stats():
+    """
+    Returns size and hit/miss counters of the query embedding cache.
+    """
+    return QueryCacheStats(**get_query_cache().stats())
+
+@router.delete("/query_cache")
+def clear_query_cache():
+    get_query_cache().clear()
+    return {"message": "Query embedding cache cleared"}
+
+@router.get("/chunk_cache", response_model=ChunkCacheStats)
+def read_chunk_cache_stats():
+    """
+    Returns the number of entries and the size of the on-disk chunk embedding cache.
+    """
+    return ChunkCacheStats(**EmbeddingCache().stats())
+
+@router.delete("/chunk_cache")
+def clear_chunk_cache():
+    EmbeddingCache().clear()
+    return {"message": "Chunk embedding cache cleared"}
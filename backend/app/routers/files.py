@@ -3,12 +3,15 @@ from sqlite3 import Connection
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 
+from app.crud.crud_collection import get_collection
 from app.crud.crud_files import delete_files_by_collection_id, get_file, get_files_for_collection
 from app.dependencies import get_db
-from app.internal.chunker import Chunker
+from app.internal.chunk_preview_cache import chunk_preview_cache
+from app.internal.chunker import ChunkType
+from app.internal.staging_store import staging_store
 from app.internal.temp_file_helper import TempFileHelper
 from app.models.imports import FileImport
-from app.schemas.file import File, ChunkPreviewRequest, ChunkPreviewResponse
+from app.schemas.file import File, ChunkPreviewRequest, ChunkPreviewResponse, StagingUsage
 
 
 router = APIRouter()
@@ -21,27 +24,38 @@ def read_files(collection_id: str, db: Connection = Depends(get_db)):
 def get_chunk_preview(request: ChunkPreviewRequest, db: Connection = Depends(get_db)):
     try:
         filename = get_file(db, request.file_id)
-        content = TempFileHelper.get_temp_file_content(filename.path)
-        
-        all_chunks = []
-        if not request.no_chunks:
-            all_chunks =  Chunker().create_chunks(content, request.chunk_type , request.chunk_size, request.chunk_overlap)
-        else:
-            all_chunks = [content]
-            
-        start_index = request.skip_number
-        end_index = start_index + request.take_number
-        
-        paginated_chunks = all_chunks[start_index:end_index]
-        
-        more_chunks = end_index < len(all_chunks)
-        
-        return ChunkPreviewResponse(chunks=paginated_chunks, more_chunks=more_chunks)
+
+        if request.no_chunks:
+            with staging_store.open(filename.path) as staged:
+                all_chunks = ["".join(staged.iter_blocks())]
+            start_index = request.skip_number
+            end_index = start_index + request.take_number
+            return ChunkPreviewResponse(chunks=all_chunks[start_index:end_index], more_chunks=end_index < len(all_chunks))
+
+        # TOKEN chunks are counted with the tokenizer of the collection's embedding model
+        model_name = None
+        if request.chunk_type == ChunkType.TOKEN:
+            collection = get_collection(db, filename.collection_id)
+            model_name = collection.model if collection else None
+
+        # Chunk boundaries are cached per file and chunking, so each page only chunks and reads its own window
+        chunks, more_chunks = chunk_preview_cache.get_page(request.file_id, filename.path, request.chunk_type, request.chunk_size,
+                                                           request.chunk_overlap, request.skip_number, request.take_number, model_name)
+        return ChunkPreviewResponse(chunks=chunks, more_chunks=more_chunks)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Temporary file not found.")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
     
+@router.get("/staging/{collection_id}", response_model=StagingUsage)
+def get_staging_usage(collection_id: str):
+    files, stored_bytes, text_chars = staging_store.usage(collection_id)
+    return StagingUsage(files=files, stored_bytes=stored_bytes, text_chars=text_chars)
+
 @router.delete("/{collection_id}")
 def delete_files(collection_id: str, db: Connection = Depends(get_db)):
+    # Staged texts are removed with their rows, so dropped step 1 results do not stay on disk
+    for file in get_files_for_collection(db, collection_id):
+        chunk_preview_cache.discard(file.id)
+        TempFileHelper.remove_temp(file.path)
     delete_files_by_collection_id(db, collection_id)
\ No newline at end of file
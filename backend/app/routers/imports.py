@@ -1,4 +1,4 @@
-import io
+from functools import partial
 from fastapi import APIRouter, UploadFile, File, Depends, Form
 from typing import List
 from sqlite3 import Connection
@@ -6,20 +6,37 @@ from sqlite3 import Connection
 from fastapi.responses import JSONResponse
 from app.crud.crud_setting import get_settings
 from app.dependencies import get_message_hub, get_task_dispatcher
+from app.internal.embedding_manager import EmbedderRegistry
 from app.internal.message_hub import MessageHub
 from app.models.import_context import ImportContext
 from app.models.imports import FileImport
+from app.models.messages import MessageType
 from app.internal.background_task_dispatcher import BackgroundTaskDispatcher
-from app.crud import crud_collection
+from app.crud import crud_collection, crud_crawl_job
 from app.database import get_db_connection
 from app.models.url_import import UrlImport
 from app.schemas.collection import ImportType
+from app.schemas.crawl_job import CrawlJob, CrawlJobStatus
 from app.schemas.imports import Import, ImportFileStep2In
 from app.schemas.setting import SettingsName
 from app.internal.chunker import ChunkType
+from app.internal.temp_file_helper import TempFileHelper
+from app.internal.archive_reader import remove_files
 
 router = APIRouter()
 
+def use_collection_model(collection_id: str, collection, import_params_model: Import, message_hub: MessageHub):
+    """
+    Keeps the embedding model of a collection that already has data, so all its vectors share one model.
+    The user is told when the import asked for another model.
+    """
+    if collection.import_type != ImportType.NONE and collection.model:
+        registry = EmbedderRegistry()
+        if registry.resolve_model_name(import_params_model.model) != registry.resolve_model_name(collection.model):
+            message_hub.send_message(collection_id, MessageType.INFO,
+                                     f"Model {import_params_model.model} ignored: the collection already holds data embedded with {collection.model}, which is used instead")
+        import_params_model.model = collection.model
+
 @router.get("/")
 def get_imports() -> List[Import]:
     return [FileImport.getDefault(), UrlImport.getDefault()]
@@ -30,6 +47,7 @@ def get_chunk_types() -> List[str]:
 
 @router.post("/{collection_id}")
 async def import_file(collection_id: str, import_params: str = Form(...), file: UploadFile = File(...), db: Connection = Depends(get_db_connection), task_dispatcher = Depends(get_task_dispatcher), message_hub:MessageHub = Depends(get_message_hub)):
+    file_path = None
     try:
         task_name = f"Importing {file.filename} to {collection_id}"
         import_params_model = Import.model_validate_json(import_params)
@@ -39,12 +57,16 @@ async def import_file(collection_id: str, import_params: str = Form(...), file:
         collection = crud_collection.get_collection(db, collection_id)
         if (collection == None):
             return {"message": "Collection not found."}
+        use_collection_model(collection_id, collection, import_params_model, message_hub)
         
-        # Read the file content into bytes
-        file_content_bytes = await file.read()
+        # Stream the upload to a spool file; the task gets its path, not the body
+        file_path = await TempFileHelper.spool_upload(file, file.filename)
         message_hub.send_task_message('START IMPORT')
 
-        task_dispatcher.add_task(collection_id, task_name, FileImport().import_data, file.filename, file_content_bytes, import_context)
+        task_dispatcher.add_task(collection_id, task_name, FileImport().import_data, file.filename, file_path, import_context,
+                                 on_discard=partial(TempFileHelper.remove_temp, file_path))
+        # From here on the task removes the spool file
+        file_path = None
         
         if collection and collection.import_type == ImportType.NONE:
             crud_collection.update_collection_import_type(db, collection_id, import_params_model)
@@ -52,6 +74,74 @@ async def import_file(collection_id: str, import_params: str = Form(...), file:
             crud_collection.update_collection_import_settings(db, collection_id, import_params_model)
             
         return {"message": "File import started in the background."}
+    except Exception as e:
+        if file_path is not None:
+            TempFileHelper.remove_temp(file_path)
+        return JSONResponse(
+        status_code=500,
+        content={"message": str(e)}
+    )
+
+@router.post("/bulk/{collection_id}")
+async def import_files_bulk(collection_id: str, import_params: str = Form(...), files: List[UploadFile] = File(...), db: Connection = Depends(get_db_connection), task_dispatcher = Depends(get_task_dispatcher), message_hub:MessageHub = Depends(get_message_hub)):
+    """Imports many files, or zip/tar archives of files, in one task whose chunks share embedding batches."""
+    uploads = []
+    try:
+        task_name = f"Importing {len(files)} files to {collection_id}"
+        import_params_model = Import.model_validate_json(import_params)
+
+        import_context = ImportContext(db, message_hub, import_params_model)
+        
+        collection = crud_collection.get_collection(db, collection_id)
+        if (collection == None):
+            return {"message": "Collection not found."}
+        use_collection_model(collection_id, collection, import_params_model, message_hub)
+        
+        # Archives are spooled as they are and expanded by the task
+        for file in files:
+            uploads.append((file.filename, await TempFileHelper.spool_upload(file, file.filename)))
+        message_hub.send_task_message('START IMPORT')
+
+        task_dispatcher.add_task(collection_id, task_name, FileImport().import_bulk, uploads, import_context,
+                                 on_discard=partial(remove_files, [file_path for _, file_path in uploads]))
+        # From here on the task removes the spool files
+        uploads = []
+        
+        if collection and collection.import_type == ImportType.NONE:
+            crud_collection.update_collection_import_type(db, collection_id, import_params_model)
+        elif collection.import_type != ImportType.NONE:
+            crud_collection.update_collection_import_settings(db, collection_id, import_params_model)
+            
+        return {"message": f"Bulk import of {len(files)} files started in the background."}
+    except Exception as e:
+        remove_files([file_path for _, file_path in uploads])
+        return JSONResponse(
+        status_code=500,
+        content={"message": str(e)}
+    )
+
+@router.post("/rechunk/{collection_id}")
+async def rechunk_collection(collection_id: str, import_params: str = Form(...), db: Connection = Depends(get_db_connection), task_dispatcher = Depends(get_task_dispatcher), message_hub:MessageHub = Depends(get_message_hub)):
+    """Chunks the imported files of a collection again with new chunk settings, from their cached text."""
+    try:
+        task_name = f"Rechunking {collection_id}"
+        import_params_model = Import.model_validate_json(import_params)
+
+        import_context = ImportContext(db, message_hub, import_params_model)
+        
+        collection = crud_collection.get_collection(db, collection_id)
+        if (collection == None):
+            return {"message": "Collection not found."}
+        use_collection_model(collection_id, collection, import_params_model, message_hub)
+        
+        message_hub.send_task_message('START IMPORT')
+
+        task_dispatcher.add_task(collection_id, task_name, FileImport().rechunk, import_context)
+        
+        if collection.import_type != ImportType.NONE:
+            crud_collection.update_collection_import_settings(db, collection_id, import_params_model)
+            
+        return {"message": "Rechunk started in the background."}
     except Exception as e:
         return JSONResponse(
         status_code=500,
@@ -71,10 +161,11 @@ async def import_url(collection_id: str,  url: str, import_params: str = Form(..
         collection = crud_collection.get_collection(db, collection_id)
         if (collection == None):
             return {"message": "Collection not found."}
+        use_collection_model(collection_id, collection, import_params_model, message_hub)
         
         message_hub.send_task_message('START IMPORT')
 
-        task_dispatcher.add_task(collection_id, task_name, UrlImport().import_data, url, [], import_context)
+        task_dispatcher.add_task(collection_id, task_name, UrlImport().import_data, url, "", import_context)
         
         if collection and collection.import_type == ImportType.NONE:
             crud_collection.update_collection_import_type(db, collection_id, import_params_model)
@@ -88,8 +179,65 @@ async def import_url(collection_id: str,  url: str, import_params: str = Form(..
         content={"message": str(e)}
     )
 
+@router.get("/url/jobs/{collection_id}")
+def get_crawl_jobs(collection_id: str, db: Connection = Depends(get_db_connection)) -> List[CrawlJob]:
+    return crud_crawl_job.get_jobs_for_collection(db, collection_id)
+
+def interrupt_crawl_job(job_id: str):
+    """Marks a resumed crawl job as interrupted again when its task is cancelled before it starts."""
+    # The request's connection may be closed by then
+    db = get_db_connection()
+    try:
+        crud_crawl_job.update_job_status(db, job_id, CrawlJobStatus.INTERRUPTED)
+    finally:
+        db.close()
+
+@router.post("/url/resume/{job_id}")
+async def resume_url_import(job_id: str, db: Connection = Depends(get_db_connection), task_dispatcher = Depends(get_task_dispatcher), message_hub:MessageHub = Depends(get_message_hub)):
+    try:
+        job = crud_crawl_job.get_job(db, job_id)
+        if job is None:
+            return JSONResponse(status_code=404, content={"message": "Crawl job not found."})
+
+        collection = crud_collection.get_collection(db, job.collection_id)
+        if (collection == None):
+            return {"message": "Collection not found."}
+
+        # Same parameters as the interrupted crawl, so resumed pages match the pages stored before
+        import_context = ImportContext(db, message_hub, Import.model_validate_json(job.import_params))
+        # Checked and set in one update, so concurrent requests cannot queue two crawls of the same frontier
+        if not crud_crawl_job.start_job(db, job_id):
+            return JSONResponse(status_code=409, content={"message": "Crawl job is already running."})
+        message_hub.send_task_message('START IMPORT')
+
+        task_name = f"Resuming import of {job.url} to {job.collection_id}"
+        try:
+            task_dispatcher.add_task(job.collection_id, task_name, UrlImport().import_data, job.url, "", import_context,
+                                     on_discard=partial(interrupt_crawl_job, job_id), job_id=job_id)
+        except Exception:
+            crud_crawl_job.update_job_status(db, job_id, CrawlJobStatus.INTERRUPTED)
+            raise
+
+        return {"message": "Url import resumed in the background."}
+    except Exception as e:
+        return JSONResponse(
+        status_code=500,
+        content={"message": str(e)}
+    )
+
+@router.delete("/url/jobs/{job_id}")
+def delete_crawl_job(job_id: str, db: Connection = Depends(get_db_connection)):
+    job = crud_crawl_job.get_job(db, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": "Crawl job not found."})
+    if job.status == CrawlJobStatus.RUNNING:
+        return JSONResponse(status_code=409, content={"message": "Crawl job is running, cancel its task first."})
+    crud_crawl_job.delete_job(db, job_id)
+    return {"message": "Crawl job deleted."}
+
 @router.post("/step1/{collection_id}")
 async def import_file_step_1(collection_id: str, import_params: str = Form(...), file: UploadFile = File(...), db: Connection = Depends(get_db_connection), task_dispatcher = Depends(get_task_dispatcher), message_hub:MessageHub = Depends(get_message_hub)):
+    file_path = None
     try:
         
         task_name = f"Importing {file.filename} to {collection_id} step 1"
@@ -103,12 +251,16 @@ async def import_file_step_1(collection_id: str, import_params: str = Form(...),
         collection = crud_collection.get_collection(db, collection_id)
         if (collection == None):
             return {"message": "Collection not found."}
+        use_collection_model(collection_id, collection, import_params_model, message_hub)
         
-        # Read the file content into bytes
-        file_content_bytes = await file.read()
+        # Stream the upload to a spool file; the task gets its path, not the body
+        file_path = await TempFileHelper.spool_upload(file, file.filename)
         message_hub.send_task_message('START IMPORT')
         
-        task_dispatcher.add_task(collection_id, task_name, FileImport().step_1, file.filename, file_content_bytes, import_context)
+        task_dispatcher.add_task(collection_id, task_name, FileImport().step_1, file.filename, file_path, import_context,
+                                 on_discard=partial(TempFileHelper.remove_temp, file_path))
+        # From here on the task removes the spool file
+        file_path = None
         
         if collection and collection.import_type == ImportType.NONE:
             crud_collection.update_collection_import_type(db, collection_id, import_params_model)
@@ -116,6 +268,8 @@ async def import_file_step_1(collection_id: str, import_params: str = Form(...),
             crud_collection.update_collection_import_settings(db, collection_id, import_params_model)
 
     except Exception as e:
+        if file_path is not None:
+            TempFileHelper.remove_temp(file_path)
         return JSONResponse(
         status_code=500,
         content={"message": str(e)}) 
@@ -135,6 +289,7 @@ async def import_file_step_2(collection_id: str, data: ImportFileStep2In,  db: C
         collection = crud_collection.get_collection(db, collection_id)
         if (collection == None):
             return {"message": "Collection not found."}
+        use_collection_model(collection_id, collection, import_params_model, message_hub)
                
         task_dispatcher.add_task(collection_id, task_name, FileImport().step_2, import_context, data.import_files_ids)
         
@@ -164,6 +319,7 @@ async def import_url_step_1(collection_id: str, url:str, import_params: str = Fo
         collection = crud_collection.get_collection(db, collection_id)
         if (collection == None):
             return {"message": "Collection not found."}
+        use_collection_model(collection_id, collection, import_params_model, message_hub)
         
         message_hub.send_task_message('START IMPORT')
         
@@ -1,10 +1,9 @@
-import chromadb
 from fastapi import APIRouter, HTTPException
-from app.internal.embedding_manager import get_embedder
-import numpy as np
+from app.internal.chroma_manager import chroma_manager
+from app.internal.embedding_manager import embed_query
 from pydantic import BaseModel
 
-from app.crud.crud_collection import get_enabled_collections_for_mcp
+from app.crud.crud_collection import get_collection, get_enabled_collections_for_mcp
 from app.database import get_db_connection
 
 router = APIRouter()
@@ -25,14 +24,12 @@ def read_items():
 @router.post("/query/{collection_id}")
 def query_database(collection_id: str, payload: QueryRequest):
     try:
-        client = chromadb.PersistentClient(path="./chroma_data")
-        collection = client.get_collection(name=collection_id)
-        embedder = get_embedder()
+        with get_db_connection() as db:
+            db_collection = get_collection(db, collection_id)
+        collection = chroma_manager.get_collection(collection_id)
+        query_emb = embed_query(payload.query, db_collection.model if db_collection else None)
 
-        query_emb = np.array(list(embedder.embed([payload.query])))
-
-
-        results = collection.query(query_embeddings=query_emb.tolist(), n_results=payload.n_results)
+        results = collection.query(query_embeddings=[query_emb], n_results=payload.n_results)
         return {"status": "success", "results": results}
     except ValueError:
         raise HTTPException(status_code=404, detail=f"Collection '{collection_id}' not found.")
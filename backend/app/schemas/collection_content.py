@@ -1,9 +1,11 @@
-from pydantic import BaseModel
-from typing import List, Any
+from pydantic import BaseModel, Field
+from typing import List, Any, Optional
+
+MAX_PAGE_SIZE = 1000  # items a content page may ask for
 
 class CollectionContentRequest(BaseModel):
-    page: int = 1
-    page_size: int = 10
+    page: int = Field(default=1, ge=1)
+    page_size: int = Field(default=10, ge=1, le=MAX_PAGE_SIZE)
 
 class CollectionContentResponse(BaseModel):
     chunks: List[Any]
@@ -11,6 +13,15 @@ class CollectionContentResponse(BaseModel):
     page: int
     page_size: int
 
+class CollectionScrollRequest(BaseModel):
+    cursor: Optional[str] = None
+    page_size: int = Field(default=10, ge=1, le=MAX_PAGE_SIZE)
+
+class CollectionScrollResponse(BaseModel):
+    chunks: List[Any]
+    total_chunks: int
+    next_cursor: Optional[str] = None
+
 class CollectionQueryResponse(BaseModel):
     status: str
     results: Any
@@ -0,0 +1,18 @@
+from enum import Enum
+from typing import Optional
+from pydantic import BaseModel
+
+class CrawlJobStatus(str, Enum):
+    RUNNING = "RUNNING"
+    INTERRUPTED = "INTERRUPTED"
+
+class CrawlJob(BaseModel):
+    id: str
+    collection_id: str
+    url: str
+    import_params: str
+    status: CrawlJobStatus
+    pages_indexed: int = 0
+    pages_queued: int = 0
+    pages_visited: int = 0
+    updated_at: Optional[str] = None
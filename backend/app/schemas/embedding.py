@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+
+class QueryCacheStats(BaseModel):
+    size: int
+    max_size: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    evictions: int
+    hit_rate: float
+
+class ChunkCacheStats(BaseModel):
+    entries: int
+    size_bytes: int
+    max_size_bytes: int
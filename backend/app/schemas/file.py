@@ -21,4 +21,9 @@ class ChunkPreviewRequest(BaseModel):
 
 class ChunkPreviewResponse(BaseModel):
     chunks: List[str]
-    more_chunks: bool
\ No newline at end of file
+    more_chunks: bool
+
+class StagingUsage(BaseModel):
+    files: int
+    stored_bytes: int
+    text_chars: int
@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class PageCacheEntry(BaseModel):
+    collection_id: str
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: str
+    text_hash: Optional[str] = None
+    links: List[str] = []
+    fingerprint: str = ""
+    fetched_at: Optional[str] = None
@@ -6,6 +6,18 @@ class SettingsName(str, Enum):
     TWO_STEP_IMPORT = "TwoStepImport"
     FOR_TEST_ONLY = "ForTestOnly"
     CRAWL_DEPTH = "CrawlDepth"
+    CRAWL_EXTRACTION_WORKERS = "CrawlExtractionWorkers"
+    CRAWL_USE_SITEMAP = "CrawlUseSitemap"
+    EMBEDDING_MEMORY_LIMIT = "EmbeddingMemoryLimitMb"
+    EMBEDDING_WORKERS = "EmbeddingWorkers"
+    EMBEDDING_WORKER_THREADS = "EmbeddingWorkerThreads"
+    EMBEDDING_CACHE_SIZE = "EmbeddingCacheSizeMb"
+    NEAR_DUPLICATE_PAGE_DISTANCE = "NearDuplicatePageDistance"
+    NEAR_DUPLICATE_CHUNK_DISTANCE = "NearDuplicateChunkDistance"
+    PDF_EXTRACTION_WORKERS = "PdfExtractionWorkers"
+    BULK_IMPORT_PARSE_WORKERS = "BulkImportParseWorkers"
+    PARSED_TEXT_CACHE = "ParsedTextCache"
+    PARSED_TEXT_CACHE_SIZE = "ParsedTextCacheSizeMb"
 
 class SettingBase(BaseModel):
     name: str
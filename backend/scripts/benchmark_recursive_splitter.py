@@ -0,0 +1,76 @@
+"""
+Compares the native RecursiveSplitter of app/internal/chunker.py with langchain's
+RecursiveCharacterTextSplitter: checks that both return the same chunks and times them.
+
+Run from the backend directory:
+    python -m scripts.benchmark_recursive_splitter [--size-mb 8] [--chunk-size 800] [--chunk-overlap 80] [--file path]
+"""
+import argparse
+import random
+import time
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.internal.chunker import RecursiveSplitter
+
+
+def sample_text(size_mb: float, seed: int = 0) -> str:
+    """Paragraphs of lines of random words, with a few long lines and long words."""
+    rng = random.Random(seed)
+    words = ["retrieval", "augmented", "generation", "chunk", "vector", "the", "a", "of", "embedding", "collection"]
+    paragraphs, size = [], 0
+    while size < size_mb * 1024 * 1024:
+        lines = []
+        for _ in range(rng.randint(1, 8)):
+            line = " ".join(rng.choice(words) for _ in range(rng.randint(3, 40 if rng.random() < 0.9 else 600)))
+            if rng.random() < 0.02:
+                line += " " + "x" * rng.randint(900, 2000)
+            lines.append(line)
+        paragraph = "\n".join(lines)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def best_time(function, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=8)
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=80)
+    parser.add_argument("--file", help="benchmark this UTF-8 text file instead of generated text")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = sample_text(args.size_mb)
+
+    langchain_splitter = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    native_splitter = RecursiveSplitter(args.chunk_size, args.chunk_overlap)
+
+    expected = langchain_splitter.split_text(text)
+    chunks = [text[start:end] for start, end in native_splitter.split_spans(text)]
+    if chunks != expected:
+        raise SystemExit("Native splitter output differs from RecursiveCharacterTextSplitter")
+
+    langchain_time = best_time(lambda: langchain_splitter.split_text(text), args.repeat)
+    native_time = best_time(lambda: native_splitter.split_spans(text), args.repeat)
+
+    print(f"{len(text) / 1024 / 1024:.1f} MB, chunk size {args.chunk_size}, overlap {args.chunk_overlap}: {len(chunks)} identical chunks")
+    print(f"langchain RecursiveCharacterTextSplitter: {langchain_time:.3f} s")
+    print(f"native RecursiveSplitter:                 {native_time:.3f} s ({langchain_time / native_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
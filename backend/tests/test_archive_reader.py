@@ -0,0 +1,70 @@
+import io
+import os
+import tarfile
+import zipfile
+
+from app.internal.archive_reader import expand_archive, is_archive, remove_files
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+
+def make_tar(path, members):
+    with tarfile.open(path, "w:gz") as archive:
+        for name, content in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+
+def read_expanded(expanded):
+    contents = {}
+    for name, temp_path in expanded:
+        with open(temp_path, "rb") as f:
+            contents[name] = f.read()
+    return contents
+
+def test_is_archive():
+    assert is_archive("docs.zip")
+    assert is_archive("docs.TAR.GZ")
+    assert is_archive("docs.tgz")
+    assert not is_archive("notes.txt")
+
+def test_expand_zip_keeps_supported_documents(tmp_path):
+    """
+    Test that only supported, visible files of a zip are expanded to temp files.
+    """
+    # Arrange
+    archive_path = str(tmp_path / "docs.zip")
+    make_zip(archive_path, {
+        "a.txt": b"alpha",
+        "sub/b.md": b"beta",
+        "image.png": b"png",
+        ".hidden.txt": b"hidden",
+        "__MACOSX/sub/._b.md": b"fork",
+    })
+
+    # Act
+    expanded = expand_archive(archive_path, [".txt", ".md"])
+
+    # Assert
+    assert read_expanded(expanded) == {"a.txt": b"alpha", "sub/b.md": b"beta"}
+    remove_files(temp_path for _, temp_path in expanded)
+    assert not any(os.path.exists(temp_path) for _, temp_path in expanded)
+
+def test_expand_tar_does_not_write_member_paths(tmp_path):
+    """
+    Test that tar members are copied to temp files, never to the paths they name.
+    """
+    # Arrange
+    archive_path = str(tmp_path / "docs.tar.gz")
+    make_tar(archive_path, {"docs/a.txt": b"alpha", "../escape.txt": b"escape"})
+
+    # Act
+    expanded = expand_archive(archive_path, [".txt"])
+
+    # Assert
+    assert read_expanded(expanded) == {"docs/a.txt": b"alpha"}
+    assert not os.path.exists(tmp_path.parent / "escape.txt")
+    remove_files(temp_path for _, temp_path in expanded)
@@ -103,5 +103,53 @@ class TestBackgroundTaskDispatcher(unittest.TestCase):
             
             dispatcher.stop()
 
+    def test_discard_callback_runs_only_for_tasks_cancelled_before_start(self):
+        with patch('app.internal.background_task_dispatcher.crud_task'):
+            mock_message_hub = MagicMock()
+            dispatcher = BackgroundTaskDispatcher(mock_message_hub, self.mock_db, num_workers=1)
+            collection_id = "test_collection"
+            started_discard = MagicMock()
+            queued_discard = MagicMock()
+
+            # Enqueue a long-running task first so the next one stays in the queue
+            long_task_id = dispatcher.add_task(collection_id, "long_task", cancellable_dummy_task, 10, on_discard=started_discard)
+            time.sleep(0.1)
+            queued_task_id = dispatcher.add_task(collection_id, "queued_task", cancellable_dummy_task, 0.1, on_discard=queued_discard)
+
+            # Cancel both
+            dispatcher.cancel_task(queued_task_id)
+            dispatcher.cancel_task(long_task_id)
+
+            queued_discard.assert_called_once_with()
+            started_discard.assert_not_called()
+            dispatcher.stop()
+
+    def test_failing_discard_callback_does_not_undo_the_cancel(self):
+        """
+        Test that a discard callback that raises still leaves the task cancelled, and runs without the dispatcher lock.
+        """
+        with patch('app.internal.background_task_dispatcher.crud_task') as mock_crud_task:
+            dispatcher = BackgroundTaskDispatcher(MagicMock(), self.mock_db, num_workers=1)
+            lock_held = []
+            def failing_discard():
+                lock_held.append(dispatcher.lock.locked())
+                raise OSError("disk unavailable")
+
+            long_task_id = dispatcher.add_task("test_collection", "long_task", cancellable_dummy_task, 10)
+            time.sleep(0.1)
+            queued_task_id = dispatcher.add_task("test_collection", "queued_task", cancellable_dummy_task, 0.1, on_discard=failing_discard)
+
+            # Act
+            cancelled = dispatcher.cancel_task(queued_task_id)
+
+            # Assert
+            self.assertTrue(cancelled)
+            self.assertEqual(lock_held, [False])
+            mock_crud_task.update_task_status.assert_any_call(self.mock_db, queued_task_id, "CANCELLING")
+            with dispatcher.lock:
+                self.assertNotIn(queued_task_id, dispatcher.waiting_tasks)
+            dispatcher.cancel_task(long_task_id)
+            dispatcher.stop()
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,102 @@
+import threading
+from unittest.mock import MagicMock, patch
+import pytest
+
+from app.internal.chroma_manager import ChromaManager
+
+
+@pytest.fixture
+def manager():
+    manager = ChromaManager()
+    manager.reset()
+    yield manager
+    manager.reset()
+
+def test_chroma_manager_is_singleton():
+    assert ChromaManager() is ChromaManager()
+
+@patch('app.internal.chroma_manager.chromadb.PersistentClient')
+def test_client_is_opened_once(mock_persistent_client, manager):
+    """
+    Test that the client is created once and shared by every call.
+    """
+    # Act
+    first = manager.get_client()
+    second = manager.get_client()
+
+    # Assert
+    assert first is second
+    mock_persistent_client.assert_called_once_with(path="./chroma_data")
+
+@patch('app.internal.chroma_manager.chromadb.PersistentClient')
+def test_collection_handles_are_cached(mock_persistent_client, manager):
+    """
+    Test that repeated lookups of the same collection reuse the cached handle.
+    """
+    # Arrange
+    client = mock_persistent_client.return_value
+
+    # Act
+    first = manager.get_collection("docs")
+    second = manager.get_collection("docs")
+    created = manager.get_or_create_collection("docs")
+
+    # Assert
+    assert first is second is created
+    client.get_collection.assert_called_once_with(name="docs")
+    client.get_or_create_collection.assert_not_called()
+
+@patch('app.internal.chroma_manager.chromadb.PersistentClient')
+def test_delete_collection_invalidates_handle(mock_persistent_client, manager):
+    """
+    Test that deleting a collection drops its cached handle so a recreated
+    collection is looked up again.
+    """
+    # Arrange
+    client = mock_persistent_client.return_value
+    client.get_or_create_collection.side_effect = [MagicMock(name="old"), MagicMock(name="new")]
+    old = manager.get_or_create_collection("docs", metadata={"hnsw:space": "cosine"})
+
+    # Act
+    manager.delete_collection("docs")
+    new = manager.get_or_create_collection("docs")
+
+    # Assert
+    client.delete_collection.assert_called_once_with(name="docs")
+    assert old is not new
+    assert client.get_or_create_collection.call_count == 2
+
+@patch('app.internal.chroma_manager.chromadb.PersistentClient')
+def test_get_collection_propagates_missing_collection(mock_persistent_client, manager):
+    mock_persistent_client.return_value.get_collection.side_effect = ValueError("Collection missing does not exist.")
+
+    with pytest.raises(ValueError):
+        manager.get_collection("missing")
+
+    # a failed lookup must not be cached
+    mock_persistent_client.return_value.get_collection.side_effect = None
+    assert manager.get_collection("missing") is mock_persistent_client.return_value.get_collection.return_value
+
+@patch('app.internal.chroma_manager.chromadb.PersistentClient')
+def test_concurrent_lookups_share_one_handle(mock_persistent_client, manager):
+    """
+    Test that worker threads looking up a collection at the same time get one handle.
+    """
+    # Arrange
+    mock_persistent_client.return_value.get_collection.side_effect = lambda name: MagicMock()
+    results = []
+
+    def lookup():
+        results.append(manager.get_collection("shared"))
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+
+    # Act
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Assert
+    assert len(set(map(id, results))) == 1
+    mock_persistent_client.assert_called_once()
@@ -0,0 +1,98 @@
+import pytest
+
+from app.internal.chunk_preview_cache import ChunkPreviewCache
+from app.internal.chunker import Chunker, ChunkType
+from app.internal.staging_store import write_staged
+
+
+@pytest.fixture
+def cache():
+    return ChunkPreviewCache(max_files=2)
+
+@pytest.fixture
+def text_file(tmp_path):
+    text = "".join(f"Line {i}: some préview text with ünicode.\n" for i in range(2000))
+    path = tmp_path / "preview.stg"
+    write_staged(str(path), [text])
+    return str(path), text
+
+@pytest.mark.parametrize("chunk_type", [ChunkType.DEFAULT, ChunkType.RECURSIVE_CHARACTER])
+def test_pages_match_chunks_of_the_whole_text(cache, text_file, chunk_type):
+    """
+    Test that paging through a file returns the same chunks as chunking it at once.
+    """
+    # Arrange
+    path, text = text_file
+    expected = list(Chunker().iter_chunks([text], chunk_type, 100, 10))
+
+    # Act
+    pages = []
+    more_chunks = True
+    while more_chunks:
+        page, more_chunks = cache.get_page("file", path, chunk_type, 100, 10, len(pages), 25)
+        pages.extend(page)
+
+    # Assert
+    assert pages == expected
+
+def test_file_is_chunked_only_up_to_the_requested_page(cache, text_file):
+    """
+    Test that chunk boundaries are computed lazily and reused by later requests.
+    """
+    # Arrange
+    path, text = text_file
+
+    # Act
+    first, more_first = cache.get_page("file", path, ChunkType.DEFAULT, 100, 10, 0, 5)
+    boundaries = cache._entries[("file", ChunkType.DEFAULT, 100, 10, None)]
+    computed_after_first = len(boundaries)
+    again, _ = cache.get_page("file", path, ChunkType.DEFAULT, 100, 10, 0, 5)
+
+    # Assert
+    assert first == again == [text[i * 90:i * 90 + 100] for i in range(5)]
+    assert more_first is True
+    assert computed_after_first == 6
+    assert len(boundaries) == 6
+    assert not boundaries.complete
+
+def test_changed_or_removed_file_is_rechunked(cache, tmp_path):
+    # Arrange
+    path = tmp_path / "preview.stg"
+    write_staged(str(path), ["first version of the text"])
+    cache.get_page("file", str(path), ChunkType.DEFAULT, 10, 0, 0, 1)
+
+    # Act
+    write_staged(str(path), ["second version, a bit longer"])
+    page, more_chunks = cache.get_page("file", str(path), ChunkType.DEFAULT, 10, 0, 0, 1)
+    cache.discard("file")
+    path.unlink()
+
+    # Assert
+    assert page == ["second ver"]
+    assert more_chunks is True
+    assert not cache._entries
+    with pytest.raises(FileNotFoundError):
+        cache.get_page("file", str(path), ChunkType.DEFAULT, 10, 0, 0, 1)
+
+def test_least_recently_used_file_is_evicted(cache, tmp_path):
+    # Arrange
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.stg"
+        write_staged(str(path), [f"{name} text " * 20])
+        paths.append(str(path))
+
+    # Act
+    for name, path in zip(("a", "b", "c"), paths):
+        cache.get_page(name, path, ChunkType.DEFAULT, 10, 0, 0, 1)
+
+    # Assert
+    assert [key[0] for key in cache._entries] == ["b", "c"]
+
+def test_invalid_overlap_is_not_cached(cache, text_file):
+    path, _ = text_file
+
+    with pytest.raises(ValueError):
+        cache.get_page("file", path, ChunkType.DEFAULT, 10, 10, 0, 1)
+
+    assert not cache._entries
@@ -0,0 +1,276 @@
+import sqlite3
+from threading import Event
+from unittest.mock import MagicMock
+import chromadb
+import numpy as np
+import pytest
+
+from app.crud.crud_chunk_hash import get_source_hashes
+from app.database import create_tables
+from app.internal.chunk_sync import ChunkSync, content_hash, make_chunk_id
+
+
+@pytest.fixture
+def db():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    create_tables(conn)
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def collection():
+    client = chromadb.EphemeralClient()
+    collection = client.get_or_create_collection("sync_test")
+    yield collection
+    client.delete_collection("sync_test")
+
+@pytest.fixture
+def embedder():
+    embedder = MagicMock()
+    embedder.embed.side_effect = lambda documents: (np.array([float(len(d)), 1.0]) for d in documents)
+    return embedder
+
+def embedded_documents(embedder):
+    return [doc for call in embedder.embed.call_args_list for doc in call.args[0]]
+
+def sync(db, collection, embedder, chunks, cancel_event=None):
+    return ChunkSync(db, collection, "sync_test", "doc.txt").run(chunks, embedder, 2, cancel_event or Event())
+
+def test_first_import_stores_chunks_with_hash_ids(db, collection, embedder):
+    # Act
+    result = sync(db, collection, embedder, ["alpha", "beta", "gamma"])
+
+    # Assert
+    assert result.completed is True
+    assert result.added == 3
+    stored = collection.get(ids=[make_chunk_id("doc.txt", content_hash("beta"))])
+    assert stored["documents"] == ["beta"]
+    assert stored["metadatas"][0]["chunk"] == 1
+    assert stored["metadatas"][0]["hash"] == content_hash("beta")
+    assert len(get_source_hashes(db, "sync_test", "doc.txt")) == 3
+
+def test_reimport_embeds_only_changed_chunks(db, collection, embedder):
+    """
+    Test that unchanged chunks are not re-embedded and removed chunks are deleted.
+    """
+    # Arrange
+    sync(db, collection, embedder, ["alpha", "beta", "gamma"])
+    embedder.embed.reset_mock()
+
+    # Act
+    result = sync(db, collection, embedder, ["beta", "gamma", "delta"])
+
+    # Assert
+    assert embedded_documents(embedder) == ["delta"]
+    assert (result.added, result.unchanged, result.removed) == (1, 2, 1)
+    assert collection.count() == 3
+    assert sorted(collection.get()["documents"]) == ["beta", "delta", "gamma"]
+    moved = collection.get(ids=[make_chunk_id("doc.txt", content_hash("beta"))])
+    assert moved["metadatas"][0]["chunk"] == 0
+
+def test_identical_reimport_does_not_embed(db, collection, embedder):
+    sync(db, collection, embedder, ["alpha", "beta"])
+    embedder.embed.reset_mock()
+
+    result = sync(db, collection, embedder, ["alpha", "beta"])
+
+    embedder.embed.assert_not_called()
+    assert (result.added, result.unchanged, result.removed) == (0, 2, 0)
+
+def test_repeated_chunks_are_stored_once(db, collection, embedder):
+    result = sync(db, collection, embedder, ["footer", "text", "footer"])
+
+    assert result.duplicates == 1
+    assert collection.count() == 2
+
+def test_first_sync_removes_chunks_stored_without_hash_index(db, collection, embedder):
+    """
+    Test that chunks imported with the old position/timestamp ids are replaced on the first sync.
+    """
+    # Arrange
+    collection.add(ids=["doc.txt_0", "doc.txt_1"], documents=["alpha", "old tail"],
+                   embeddings=[[1.0, 0.0], [0.0, 1.0]], metadatas=[{"source": "doc.txt", "chunk": 0}, {"source": "doc.txt", "chunk": 1}])
+    collection.add(ids=["other.txt_0"], documents=["other"], embeddings=[[1.0, 1.0]], metadatas=[{"source": "other.txt", "chunk": 0}])
+
+    # Act
+    result = sync(db, collection, embedder, ["alpha"])
+
+    # Assert
+    assert result.removed == 2
+    assert sorted(collection.get()["ids"]) == sorted([make_chunk_id("doc.txt", content_hash("alpha")), "other.txt_0"])
+
+def test_cancelled_sync_indexes_only_stored_chunks(db, collection, embedder):
+    """
+    Test that a cancelled sync keeps old chunks and indexes only the chunks that were stored.
+    """
+    # Arrange
+    sync(db, collection, embedder, ["alpha"])
+    cancel_event = Event()
+    sync_run = ChunkSync(db, collection, "sync_test", "doc.txt")
+
+    # Act
+    result = sync_run.run(["b1", "b2", "b3", "b4"], embedder, 2, cancel_event,
+                          on_batch=lambda batch_num, stored: cancel_event.set())
+
+    # Assert
+    assert result.completed is False
+    assert result.added == 2
+    indexed = get_source_hashes(db, "sync_test", "doc.txt")
+    assert set(indexed) == {make_chunk_id("doc.txt", content_hash(text)) for text in ["alpha", "b1", "b2"]}
+    assert collection.count() == 3
+
+def test_near_duplicate_chunks_are_skipped(db, collection, embedder):
+    # Arrange
+    from app.internal.near_duplicates import NearDuplicateIndex
+    footer = ("Copyright 2024 Example Corp. All rights reserved. Use of this documentation is subject to the terms of use "
+              "and the privacy policy. Cookie settings can be changed at any time on the preferences page. For questions "
+              "about the content of these pages, contact the documentation team through the support portal.")
+
+    # Act
+    result = ChunkSync(db, collection, "sync_test", "doc.txt").run(
+        ["alpha", footer, footer.replace("support portal", "help portal"), "beta"], embedder, 2, Event(), near_duplicates=NearDuplicateIndex(6))
+
+    # Assert
+    assert result.near_duplicates == 1
+    assert embedded_documents(embedder) == ["alpha", footer, "beta"]
+    assert "1 near-duplicates skipped" in result.summary()
+
+def test_indexed_chunk_is_kept_when_it_becomes_a_near_duplicate(db, collection, embedder):
+    """
+    Test that a stored chunk is not deleted when a new, similar chunk comes before it in the text.
+    """
+    # Arrange
+    from app.internal.near_duplicates import NearDuplicateIndex
+    footer = ("Copyright 2024 Example Corp. All rights reserved. Use of this documentation is subject to the terms of use "
+              "and the privacy policy. Cookie settings can be changed at any time on the preferences page. For questions "
+              "about the content of these pages, contact the documentation team through the support portal.")
+    similar = footer.replace("support portal", "help portal")
+    ChunkSync(db, collection, "sync_test", "doc.txt").run(["alpha", footer], embedder, 2, Event())
+    embedder.embed.reset_mock()
+
+    # Act
+    result = ChunkSync(db, collection, "sync_test", "doc.txt").run(
+        [similar, "alpha", footer], embedder, 2, Event(), near_duplicates=NearDuplicateIndex(6))
+
+    # Assert
+    assert result.removed == 0
+    assert result.unchanged == 2
+    assert result.near_duplicates == 0
+    assert embedded_documents(embedder) == [similar]
+    indexed = get_source_hashes(db, "sync_test", "doc.txt")
+    assert make_chunk_id("doc.txt", content_hash(footer)) in indexed
+    assert collection.count() == 3
+
+def test_chunk_offsets_are_stored_and_updated(db, collection, embedder):
+    """
+    Test that chunks from the chunker carry their offsets, which follow the text when it shifts.
+    """
+    # Arrange
+    from app.internal.chunker import Chunker, ChunkType
+    text = "alpha beta gamma delta"
+    ChunkSync(db, collection, "sync_test", "doc.txt").run(Chunker().create_chunks(text, ChunkType.DEFAULT, 6, 0), embedder, 2, Event())
+
+    # Act
+    shifted = Chunker().create_chunks("intro " + text, ChunkType.DEFAULT, 6, 0)
+    ChunkSync(db, collection, "sync_test", "doc.txt").run(shifted, embedder, 2, Event())
+
+    # Assert
+    stored = collection.get(ids=[make_chunk_id("doc.txt", content_hash("beta g"))])
+    assert stored["metadatas"][0]["start"] == 12
+    assert stored["metadatas"][0]["end"] == 18
+    assert stored["metadatas"][0]["chunk"] == 2
+    assert embedder.embed.call_count == 3
+
+def test_streamed_chunks_are_synced_in_one_pass(db, collection, embedder):
+    """
+    Test that a chunk generator is consumed once and its chunks are counted and stored.
+    """
+    # Arrange
+    from app.internal.chunker import Chunker, ChunkType
+    text = "alpha beta gamma delta epsilon"
+    chunks = Chunker().iter_chunks(iter(text.split(" ")), ChunkType.DEFAULT, 8, 2)
+
+    # Act
+    result = ChunkSync(db, collection, "sync_test", "doc.txt").run(chunks, embedder, 2, Event())
+
+    # Assert
+    expected = list(Chunker().create_chunks(text.replace(" ", ""), ChunkType.DEFAULT, 8, 2))
+    assert result.chunks == len(expected)
+    assert result.added == len(set(expected))
+    assert collection.count() == len(set(expected))
+    assert next(chunks, None) is None
+
+def test_run_many_shares_batches_between_sources(db, collection, embedder):
+    """
+    Test that the new chunks of several sources are embedded in shared batches and indexed per source.
+    """
+    # Arrange
+    sources = [
+        (ChunkSync(db, collection, "sync_test", "a.txt"), ["a1"]),
+        (ChunkSync(db, collection, "sync_test", "b.txt"), ["b1", "b2"]),
+        (ChunkSync(db, collection, "sync_test", "c.txt"), ["c1"]),
+    ]
+
+    # Act
+    results = ChunkSync.run_many(collection, sources, embedder, 2, Event())
+
+    # Assert
+    assert [result.added for result in results] == [1, 2, 1]
+    assert all(result.completed for result in results)
+    assert [call.args[0] for call in embedder.embed.call_args_list] == [["a1", "b1"], ["b2", "c1"]]
+    assert set(get_source_hashes(db, "sync_test", "b.txt")) == {make_chunk_id("b.txt", content_hash(text)) for text in ["b1", "b2"]}
+    assert collection.count() == 4
+
+def test_cancelled_run_many_completes_only_stored_sources(db, collection, embedder):
+    """
+    Test that after a cancel, only the sources whose chunks were all stored are completed.
+    """
+    # Arrange
+    sync(db, collection, embedder, ["old"])
+    cancel_event = Event()
+    sources = [
+        (ChunkSync(db, collection, "sync_test", "a.txt"), ["a1"]),
+        (ChunkSync(db, collection, "sync_test", "doc.txt"), ["d1", "d2", "d3"]),
+    ]
+
+    # Act
+    results = ChunkSync.run_many(collection, sources, embedder, 2, cancel_event,
+                                 on_batch=lambda batch_num, stored: cancel_event.set())
+
+    # Assert
+    assert [result.completed for result in results] == [True, False]
+    assert [result.added for result in results] == [1, 1]
+    # The interrupted source keeps its old chunk until it is synced completely
+    indexed = get_source_hashes(db, "sync_test", "doc.txt")
+    assert set(indexed) == {make_chunk_id("doc.txt", content_hash(text)) for text in ["old", "d1"]}
+
+def test_run_many_skips_a_failing_source(db, collection, embedder):
+    """
+    Test that a source whose chunks fail to be read is reported and skipped,
+    that its stored chunks are indexed, and that the following sources are still synced.
+    """
+    # Arrange
+    def failing_chunks():
+        yield "f1"
+        yield "f2"
+        raise UnicodeDecodeError("utf-8", b"\xe9", 0, 1, "invalid continuation byte")
+
+    errors = []
+    sources = [
+        (ChunkSync(db, collection, "sync_test", "bad.txt"), failing_chunks()),
+        (ChunkSync(db, collection, "sync_test", "good.txt"), ["g1"]),
+    ]
+
+    # Act
+    results = ChunkSync.run_many(collection, sources, embedder, 2, Event(),
+                                 on_error=lambda sync, e: errors.append(sync.source))
+
+    # Assert
+    assert errors == ["bad.txt"]
+    assert results[0].completed is False
+    assert isinstance(results[0].error, UnicodeDecodeError)
+    assert results[1].completed is True and results[1].error is None
+    # The chunks of the failed source that were stored are indexed, so a re-import does not duplicate them
+    assert set(get_source_hashes(db, "sync_test", "bad.txt")) == {make_chunk_id("bad.txt", content_hash(text)) for text in ["f1", "f2"]}
+    assert collection.count() == 3
@@ -37,3 +37,193 @@ def test_create_chunks_no_overlap(chunker):
     assert len(chunks) > 0
     assert chunks[0] == "This is a "
     assert chunks[1] == "test text "
+
+def test_chunks_are_spans_of_the_text(chunker):
+    """
+    Test that chunks are kept as offsets into the text and sliced only when read.
+    """
+    # Arrange
+    text = "This is a test text for chunking."
+
+    # Act
+    chunks = chunker.create_chunks(text, ChunkType.DEFAULT, 10, 2)
+
+    # Assert
+    assert chunks.text is text
+    assert chunks.span(1) == (8, 18)
+    assert chunks.span(len(chunks) - 1) == (32, 33)
+    assert chunks[1:3] == ["a test tex", "ext for ch"]
+    assert list(chunks) == [text[start:end] for start, end in zip(chunks.starts, chunks.ends)]
+
+def test_recursive_chunk_spans_match_split_text(chunker):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    text = "First paragraph of the text.\n\nSecond paragraph, repeated.\n\nSecond paragraph, repeated.\n\nLast one."
+
+    chunks = chunker.create_chunks(text, ChunkType.RECURSIVE_CHARACTER, 30, 5)
+
+    assert list(chunks) == RecursiveCharacterTextSplitter(chunk_size=30, chunk_overlap=5).split_text(text)
+    assert chunks.span(2)[0] > chunks.span(1)[0]
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(10, 2), (10, 0), (7, 3), (1, 0)])
+def test_iter_chunks_default_matches_create_chunks(chunker, chunk_size, chunk_overlap):
+    """
+    Test that streamed DEFAULT chunks equal the chunks of the whole text, however the text is split.
+    """
+    # Arrange
+    text = "This is a test text for chunking, streamed in segments of any length."
+    segmentations = [[text], list(text), [text[:3], "", text[3:40], text[40:]], [text[i:i + 11] for i in range(0, len(text), 11)]]
+    expected = chunker.create_chunks(text, ChunkType.DEFAULT, chunk_size, chunk_overlap)
+
+    for segments in segmentations:
+        # Act
+        chunks = list(chunker.iter_chunks(segments, ChunkType.DEFAULT, chunk_size, chunk_overlap))
+
+        # Assert
+        assert chunks == list(expected)
+        assert [(chunk.start, chunk.end) for chunk in chunks] == [expected.span(i) for i in range(len(expected))]
+
+def test_iter_chunks_default_rejects_overlap_equal_to_size(chunker):
+    with pytest.raises(ValueError):
+        list(chunker.iter_chunks(["some text"], ChunkType.DEFAULT, 5, 5))
+
+def test_iter_chunks_recursive_offsets_point_into_the_text(chunker):
+    """
+    Test that streamed recursive chunks cover the text and their offsets locate them in it.
+    """
+    # Arrange
+    text = "\n\n".join(f"Paragraph {i} has a few words in it.\nAnd a second line." for i in range(200))
+    segments = [text[i:i + 97] for i in range(0, len(text), 97)]
+
+    # Act
+    chunks = list(chunker.iter_chunks(segments, ChunkType.RECURSIVE_CHARACTER, 50, 10))
+
+    # Assert
+    assert all(text[chunk.start:chunk.end] == chunk for chunk in chunks)
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert chunks[-1].end == len(text)
+    assert set(chunks) >= set(chunker.create_chunks(text[:1000], ChunkType.RECURSIVE_CHARACTER, 50, 10)[:5])
+
+@pytest.fixture
+def word_tokenizer():
+    """A small WordPiece tokenizer built in memory, like the BERT tokenizers of the embedding models."""
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers
+    vocab = {"[UNK]": 0, "the": 1, "quick": 2, "brown": 3, "fox": 4, "jumps": 5, "over": 6, "lazy": 7, "dog": 8, "##s": 9, ".": 10}
+    tokenizer = Tokenizer(models.WordPiece(vocab, unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    return tokenizer
+
+def test_token_chunks_have_exact_token_budgets(word_tokenizer):
+    """
+    Test that TOKEN chunks hold chunk_size tokens, overlap by chunk_overlap tokens and point into the text.
+    """
+    # Arrange
+    text = "The quick brown fox jumps over the lazy dogs. " * 20
+    chunker = Chunker(word_tokenizer)
+
+    # Act
+    chunks = chunker.create_chunks(text, ChunkType.TOKEN, 8, 2)
+
+    # Assert
+    token_counts = [len(word_tokenizer.encode(chunk, add_special_tokens=False).ids) for chunk in chunks]
+    assert token_counts[:-1] == [8] * (len(chunks) - 1)
+    assert 2 < token_counts[-1] <= 8
+    assert chunks[0] == "The quick brown fox jumps over the lazy"
+    assert chunks[1].startswith("the lazy dog")
+    assert all(text[chunk.start:chunk.end] == chunk for chunk in chunks)
+    assert chunks[len(chunks) - 1].end == len(text.rstrip())
+
+def test_token_chunks_are_the_same_when_streamed(word_tokenizer, monkeypatch):
+    # Arrange
+    import app.internal.chunker as chunker_module
+    monkeypatch.setattr(chunker_module, "TOKEN_BATCH_CHARS", 50)
+    monkeypatch.setattr(chunker_module, "TOKEN_PIECE_CHARS", 16)
+    text = "The quick brown fox jumps over the lazy dogs. " * 20
+    chunker = Chunker(word_tokenizer)
+
+    # Act
+    streamed = list(chunker.iter_chunks([text[i:i + 7] for i in range(0, len(text), 7)], ChunkType.TOKEN, 8, 2))
+
+    # Assert
+    assert streamed == list(Chunker(word_tokenizer).create_chunks(text, ChunkType.TOKEN, 8, 2))
+    assert [(chunk.start, chunk.end) for chunk in streamed] == [(chunk.start, chunk.end) for chunk in chunker.create_chunks(text, ChunkType.TOKEN, 8, 2)]
+
+def test_token_chunks_are_capped_at_the_model_limit(word_tokenizer):
+    chunks = Chunker(word_tokenizer, max_tokens=4).create_chunks("the quick brown fox jumps over the lazy dog", ChunkType.TOKEN, 100, 0)
+
+    assert list(chunks) == ["the quick brown fox", "jumps over the lazy", "dog"]
+
+def test_token_chunks_need_a_tokenizer(chunker):
+    with pytest.raises(ValueError):
+        chunker.create_chunks("some text", ChunkType.TOKEN, 10, 2)
+
+def test_create_chunker_uses_the_model_tokenizer(word_tokenizer):
+    from unittest.mock import patch
+    from app.internal.chunker import create_chunker
+
+    with patch("app.internal.chunker.get_chunk_tokenizer", return_value=(word_tokenizer, 254)) as mock_get_tokenizer:
+        token_chunker = create_chunker(ChunkType.TOKEN, "all-MiniLM-L6-v2")
+        default_chunker = create_chunker(ChunkType.DEFAULT, "all-MiniLM-L6-v2")
+
+    mock_get_tokenizer.assert_called_once_with("all-MiniLM-L6-v2")
+    assert token_chunker.tokenizer is word_tokenizer
+    assert token_chunker.max_tokens == 254
+    assert default_chunker.tokenizer is None
+
+PARITY_TEXTS = [
+    "",
+    "   ",
+    "single",
+    "First paragraph of the text.\n\nSecond paragraph, repeated.\n\nSecond paragraph, repeated.\n\nLast one.",
+    "\n\n\nLeading breaks and a line\nthen another line\n\n\n\nand trailing breaks\n\n",
+    "averyveryverylongwordwithoutanyseparatorthatmustbesplitbycharacters and then short words",
+    "Tabs\tand  double  spaces\t\tshould survive\n \n between lines",
+    "Unicode — “quotes”, émojis 🙂 and non-breaking spaces too.\n\nНовый абзац здесь.",
+]
+
+@pytest.mark.parametrize("text", PARITY_TEXTS)
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(1, 0), (5, 2), (10, 0), (30, 5), (30, 30), (800, 80)])
+def test_native_recursive_splitter_matches_langchain(text, chunk_size, chunk_overlap):
+    """
+    Test that the native splitter returns the chunks of RecursiveCharacterTextSplitter, at offsets into the text.
+    """
+    # Arrange
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from app.internal.chunker import RecursiveSplitter
+    expected = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap).split_text(text)
+
+    # Act
+    spans = RecursiveSplitter(chunk_size, chunk_overlap).split_spans(text)
+
+    # Assert
+    assert [text[start:end] for start, end in spans] == expected
+
+def test_native_recursive_splitter_matches_langchain_on_random_texts():
+    # Arrange
+    import random
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from app.internal.chunker import RecursiveSplitter
+    rng = random.Random(7)
+    pieces = ["a", "bb", "word", "x" * 45, " ", "  ", "\t", "\n", "\n\n", "\n\n\n", " \n "]
+
+    for _ in range(300):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 150)))
+        chunk_size = rng.randint(1, 60)
+        chunk_overlap = rng.randint(0, chunk_size)
+
+        # Act
+        spans = RecursiveSplitter(chunk_size, chunk_overlap).split_spans(text)
+
+        # Assert
+        expected = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap).split_text(text)
+        assert [text[start:end] for start, end in spans] == expected, (text, chunk_size, chunk_overlap)
+
+def test_native_recursive_splitter_rejects_invalid_sizes():
+    from app.internal.chunker import RecursiveSplitter
+
+    with pytest.raises(ValueError):
+        RecursiveSplitter(0, 0)
+    with pytest.raises(ValueError):
+        RecursiveSplitter(10, 11)
+    with pytest.raises(ValueError):
+        RecursiveSplitter(10, -1)
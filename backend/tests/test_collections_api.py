@@ -5,6 +5,7 @@ from app.main import app as fastapi_app
 from app.dependencies import get_db
 import app.database
 import chromadb
+from app.internal.chroma_manager import chroma_manager
 import tempfile
 import uuid
 
@@ -20,8 +21,8 @@ database_url_patch.start()
 @pytest.fixture(scope="function")
 def client():
     with tempfile.TemporaryDirectory() as tmpdir:
-        with patch('chromadb.PersistentClient') as mock_persistent_client:
-            mock_persistent_client.return_value = chromadb.PersistentClient(path=tmpdir)
+        with patch.object(chroma_manager, '_client', chromadb.PersistentClient(path=tmpdir)), \
+             patch.object(chroma_manager, '_collections', {}):
             connection = app.database.get_db_connection()
             app.database.create_tables(connection)
 
@@ -65,8 +66,8 @@ def test_delete_collection(client):
 def test_read_collection_details(client):
     create_response = client.post("/collections/", json={"name": "Details Test"})
     collection_id = create_response.json()["id"]
-    with patch('chromadb.PersistentClient') as mock_persistent_client:
-        mock_collection = mock_persistent_client.return_value.get_collection.return_value
+    with patch('app.crud.crud_collection.chroma_manager') as mock_chroma_manager:
+        mock_collection = mock_chroma_manager.get_collection.return_value
         mock_collection.count.return_value = 42
         mock_collection.metadata = {"source": "api_test"}
         response = client.get(f"/collections/{collection_id}/details")
@@ -98,6 +99,39 @@ def test_read_collection_content_success(mock_get_chunks, client):
     assert data["total_chunks"] == 1
     mock_get_chunks.assert_called_once_with(collection_id, 1, 10)
 
+@patch('app.routers.collections.scroll_collection_chunks')
+def test_scroll_collection_content_success(mock_scroll_chunks, client):
+    create_response = client.post("/collections/", json={"name": "Scroll Test"})
+    collection_id = create_response.json()["id"]
+
+    mock_scroll_chunks.return_value = {
+        "chunks": [{"id": "1", "document": "doc1"}],
+        "total_chunks": 2,
+        "next_cursor": "MQ=="
+    }
+
+    response = client.post(f"/collections/{collection_id}/content/scroll", json={"page_size": 1})
+
+    assert response.status_code == 200
+    assert response.json()["next_cursor"] == "MQ=="
+    mock_scroll_chunks.assert_called_once_with(collection_id, None, 1)
+
+def test_scroll_collection_content_invalid_cursor(client):
+    create_response = client.post("/collections/", json={"name": "Bad Cursor Test"})
+    collection_id = create_response.json()["id"]
+
+    response = client.post(f"/collections/{collection_id}/content/scroll", json={"cursor": "***", "page_size": 1})
+
+    assert response.status_code == 400
+
+def test_scroll_collection_content_rejects_oversized_pages(client):
+    create_response = client.post("/collections/", json={"name": "Big Page Test"})
+    collection_id = create_response.json()["id"]
+
+    response = client.post(f"/collections/{collection_id}/content/scroll", json={"page_size": 100000})
+
+    assert response.status_code == 422
+
 def test_read_collection_content_not_found(client):
     import uuid
     non_existent_id = str(uuid.uuid4())
@@ -117,7 +151,7 @@ def test_query_collection_success(mock_query_collection, client):
     assert response.status_code == 200
     data = response.json()
     assert data["status"] == "success"
-    mock_query_collection.assert_called_once_with(collection_id, "hello")
+    mock_query_collection.assert_called_once_with(collection_id, "hello", model_name=None)
 
 def test_query_collection_not_found(client):
     non_existent_id = str(uuid.uuid4())
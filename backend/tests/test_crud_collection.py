@@ -7,6 +7,7 @@ from app.schemas.imports import Import, FileImportSettings
 from app.database import create_tables
 import uuid
 import chromadb
+from app.internal.chroma_manager import chroma_manager
 import tempfile
 import shutil
 from unittest.mock import patch
@@ -14,8 +15,8 @@ from unittest.mock import patch
 @pytest.fixture
 def db_connection():
     with tempfile.TemporaryDirectory() as tmpdir:
-        with patch('chromadb.PersistentClient') as mock_persistent_client:
-            mock_persistent_client.return_value = chromadb.PersistentClient(path=tmpdir)
+        with patch.object(chroma_manager, '_client', chromadb.PersistentClient(path=tmpdir)), \
+             patch.object(chroma_manager, '_collections', {}):
             conn = sqlite3.connect(":memory:")
             conn.row_factory = sqlite3.Row
             create_tables(conn)
@@ -208,8 +209,8 @@ def test_get_collection_details(db_connection):
     )
     created_collection = crud_collection.create_collection(db_connection, collection_data)
 
-    with patch('chromadb.PersistentClient') as mock_persistent_client:
-        mock_collection = mock_persistent_client.return_value.get_collection.return_value
+    with patch('app.crud.crud_collection.chroma_manager') as mock_chroma_manager:
+        mock_collection = mock_chroma_manager.get_collection.return_value
         mock_collection.count.return_value = 123
         mock_collection.metadata = {"source": "test"}
 
@@ -220,8 +221,8 @@ def test_get_collection_details(db_connection):
         assert details.metadata == {"source": "test"}
 
     # 2. Test case where collection exists in SQLite but not in ChromaDB
-    with patch('chromadb.PersistentClient') as mock_persistent_client:
-        mock_persistent_client.return_value.get_collection.side_effect = Exception("Collection not found")
+    with patch('app.crud.crud_collection.chroma_manager') as mock_chroma_manager:
+        mock_chroma_manager.get_collection.side_effect = Exception("Collection not found")
 
         details = crud_collection.get_collection_details(db_connection, created_collection.id)
         assert details is not None
@@ -1,23 +1,29 @@
 import pytest
 from unittest.mock import MagicMock, patch
 import numpy as np
-from app.crud.crud_collection_content import get_collection_chunks, query_collection
+from app.crud.crud_collection_content import get_collection_chunks, query_collection, scroll_collection_chunks
+from app.internal.chroma_manager import chroma_manager
+from app.internal.exceptions import CollectionNotReadyError, InvalidCursorError
+from app.internal.record_numbering import is_numbered, number_all_collections, number_records
+import chromadb
+import tempfile
+from threading import Event
+from app.internal.embedding_pipeline import EmbeddingPipeline
 
-@patch('chromadb.PersistentClient')
-def test_get_collection_chunks_success(mock_persistent_client):
+@patch('app.crud.crud_collection_content.chroma_manager')
+def test_get_collection_chunks_success(mock_chroma_manager):
     """
     Test successful retrieval of paginated chunks from a collection.
     """
     # Arrange
     mock_collection = MagicMock()
     mock_collection.get.return_value = {
-        "ids": ["id1", "id2", "id3"],
-        "documents": ["doc1", "doc2", "doc3"]
+        "ids": ["id2"],
+        "documents": ["doc2"]
     }
     
-    mock_client_instance = MagicMock()
-    mock_client_instance.get_collection.return_value = mock_collection
-    mock_persistent_client.return_value = mock_client_instance
+    mock_chroma_manager.get_collection.return_value = mock_collection
+    mock_chroma_manager.count.return_value = 3
     
     collection_id = "test_collection"
     page = 2
@@ -27,9 +33,8 @@ def test_get_collection_chunks_success(mock_persistent_client):
     result = get_collection_chunks(collection_id, page, page_size)
     
     # Assert
-    mock_persistent_client.assert_called_once_with(path="./chroma_data")
-    mock_client_instance.get_collection.assert_called_once_with(name=collection_id)
-    mock_collection.get.assert_called_once()
+    mock_chroma_manager.get_collection.assert_called_once_with(collection_id)
+    mock_collection.get.assert_called_once_with(limit=1, offset=1, include=["documents"])
     
     assert result["total_chunks"] == 3
     assert result["page"] == page
@@ -37,37 +42,31 @@ def test_get_collection_chunks_success(mock_persistent_client):
     assert result["chunks"][0]["id"] == "id2"
     assert result["chunks"][0]["document"] == "doc2"
 
-@patch('chromadb.PersistentClient')
-def test_get_collection_chunks_not_found(mock_persistent_client):
+@patch('app.crud.crud_collection_content.chroma_manager')
+def test_get_collection_chunks_not_found(mock_chroma_manager):
     """
     Test behavior when the collection is not found.
     """
     # Arrange
-    mock_client_instance = MagicMock()
-    mock_client_instance.get_collection.side_effect = ValueError("Collection not found")
-    mock_persistent_client.return_value = mock_client_instance
+    mock_chroma_manager.get_collection.side_effect = ValueError("Collection not found")
     
     # Act & Assert
     with pytest.raises(ValueError, match="Collection 'test_collection' not found"):
         get_collection_chunks("test_collection", 1, 10)
 
-@patch('app.crud.crud_collection_content.get_embedder')
-@patch('chromadb.PersistentClient')
-def test_query_collection_success(mock_persistent_client, mock_get_embedder):
+@patch('app.crud.crud_collection_content.embed_query')
+@patch('app.crud.crud_collection_content.chroma_manager')
+def test_query_collection_success(mock_chroma_manager, mock_embed_query):
     """
     Test successful querying of a collection.
     """
     # Arrange
-    mock_embedder = MagicMock()
-    mock_embedder.embed.return_value = [np.array([0.1, 0.2, 0.3])]
-    mock_get_embedder.return_value = mock_embedder
+    mock_embed_query.return_value = [0.1, 0.2, 0.3]
     
     mock_collection = MagicMock()
     mock_collection.query.return_value = {"results": "some_results"}
     
-    mock_client_instance = MagicMock()
-    mock_client_instance.get_collection.return_value = mock_collection
-    mock_persistent_client.return_value = mock_client_instance
+    mock_chroma_manager.get_collection.return_value = mock_collection
     
     collection_id = "test_collection"
     query_text = "test query"
@@ -76,25 +75,155 @@ def test_query_collection_success(mock_persistent_client, mock_get_embedder):
     result = query_collection(collection_id, query_text)
     
     # Assert
-    mock_persistent_client.assert_called_once_with(path="./chroma_data")
-    mock_client_instance.get_collection.assert_called_once_with(name=collection_id)
-    mock_get_embedder.assert_called_once()
-    mock_embedder.embed.assert_called_once_with([query_text])
-    mock_collection.query.assert_called_once()
+    mock_chroma_manager.get_collection.assert_called_once_with(collection_id)
+    mock_embed_query.assert_called_once_with(query_text, None)
+    mock_collection.query.assert_called_once_with(query_embeddings=[[0.1, 0.2, 0.3]], n_results=10)
     
     assert result["status"] == "success"
     assert result["results"] == {"results": "some_results"}
 
-@patch('chromadb.PersistentClient')
-def test_query_collection_not_found(mock_persistent_client):
+@patch('app.crud.crud_collection_content.chroma_manager')
+def test_query_collection_not_found(mock_chroma_manager):
     """
     Test query behavior when the collection is not found.
     """
     # Arrange
-    mock_client_instance = MagicMock()
-    mock_client_instance.get_collection.side_effect = ValueError("Collection not found")
-    mock_persistent_client.return_value = mock_client_instance
+    mock_chroma_manager.get_collection.side_effect = ValueError("Collection not found")
     
     # Act & Assert
     with pytest.raises(ValueError, match="Collection 'test_collection' not found"):
         query_collection("test_collection", "test query")
+
+@pytest.fixture
+def populated_collection():
+    """
+    A real ChromaDB collection with 25 items in a temporary directory.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        client = chromadb.PersistentClient(path=tmpdir)
+        with patch.object(chroma_manager, '_client', client), \
+             patch.object(chroma_manager, '_collections', {}), \
+             patch.object(chroma_manager, '_counts', {}):
+            collection = chroma_manager.get_or_create_collection("paged")
+            collection.add(
+                ids=[f"id{i:02d}" for i in range(25)],
+                documents=[f"doc{i:02d}" for i in range(25)],
+                embeddings=[[float(i), 1.0] for i in range(25)],
+            )
+            chroma_manager.invalidate_count("paged")
+            yield "paged"
+
+def test_get_collection_chunks_pages_are_disjoint(populated_collection):
+    """
+    Test that pages are read from ChromaDB with limit/offset and cover the collection once.
+    """
+    pages = [get_collection_chunks(populated_collection, page, 10) for page in (1, 2, 3)]
+
+    ids = [chunk["id"] for page in pages for chunk in page["chunks"]]
+    assert len(ids) == 25
+    assert len(set(ids)) == 25
+    assert [len(page["chunks"]) for page in pages] == [10, 10, 5]
+    assert all(page["total_chunks"] == 25 for page in pages)
+
+def test_get_collection_chunks_count_is_cached(populated_collection):
+    """
+    Test that the total is served from the cached count until the collection is written to.
+    """
+    get_collection_chunks(populated_collection, 1, 5)
+
+    with patch.object(chroma_manager.get_collection(populated_collection).__class__, 'count', side_effect=AssertionError("count not cached")):
+        result = get_collection_chunks(populated_collection, 2, 5)
+    assert result["total_chunks"] == 25
+
+    chroma_manager.get_collection(populated_collection).add(ids=["extra"], documents=["extra"], embeddings=[[0.0, 0.0]])
+    chroma_manager.invalidate_count(populated_collection)
+    assert get_collection_chunks(populated_collection, 1, 5)["total_chunks"] == 26
+
+def test_scroll_collection_chunks_follows_cursor(populated_collection):
+    """
+    Test that following next_cursor walks the whole collection and stops at the end.
+    """
+    number_records(chroma_manager.get_collection(populated_collection))
+    ids = []
+    cursor = None
+    calls = 0
+    while True:
+        result = scroll_collection_chunks(populated_collection, cursor, 10)
+        ids.extend(chunk["id"] for chunk in result["chunks"])
+        calls += 1
+        cursor = result["next_cursor"]
+        if cursor is None:
+            break
+
+    assert calls == 3
+    assert len(set(ids)) == 25
+
+def test_scroll_collection_chunks_invalid_cursor():
+    with pytest.raises(InvalidCursorError):
+        scroll_collection_chunks("any", "not a cursor!", 10)
+
+def test_scroll_collection_chunks_is_not_shifted_by_deletes(populated_collection):
+    """
+    Test that deleting items already read does not make the next page skip items, as an offset would.
+    """
+    # Arrange
+    collection = chroma_manager.get_collection(populated_collection)
+    number_records(collection)
+    first_page = scroll_collection_chunks(populated_collection, None, 10)
+    collection.delete(ids=[chunk["id"] for chunk in first_page["chunks"][:5]])
+    chroma_manager.invalidate_count(populated_collection)
+
+    # Act
+    second_page = scroll_collection_chunks(populated_collection, first_page["next_cursor"], 10)
+
+    # Assert
+    assert [chunk["id"] for chunk in second_page["chunks"]] == [f"id{i:02d}" for i in range(10, 20)]
+    assert second_page["total_chunks"] == 20
+
+def test_scroll_collection_chunks_after_reimporting_stored_records(populated_collection):
+    """
+    Test that upserting records that are already stored keeps their sequence numbers,
+    so scrolling still walks the whole collection.
+    """
+    # Arrange
+    collection = chroma_manager.get_collection(populated_collection)
+    number_records(collection)
+    sequence_before = collection.get(ids=["id01"], include=["metadatas"])["metadatas"][0]["seq"]
+    embedder = MagicMock()
+    embedder.embed.side_effect = lambda documents: [[1.0, 1.0] for _ in documents]
+
+    # Act
+    EmbeddingPipeline(collection, embedder, 10, Event()).run([("id01", "doc01", {}), ("new", "new", {})])
+    ids = []
+    cursor = None
+    while True:
+        result = scroll_collection_chunks(populated_collection, cursor, 2)
+        ids.extend(chunk["id"] for chunk in result["chunks"])
+        cursor = result["next_cursor"]
+        if cursor is None:
+            break
+
+    # Assert
+    assert collection.get(ids=["id01"], include=["metadatas"])["metadatas"][0]["seq"] == sequence_before
+    assert sorted(ids) == sorted([f"id{i:02d}" for i in range(25)] + ["new"])
+
+def test_scroll_collection_chunks_waits_for_numbering(populated_collection):
+    """
+    Test that a collection whose records are not numbered yet is not scrolled, and is not numbered on the request.
+    """
+    with pytest.raises(CollectionNotReadyError):
+        scroll_collection_chunks(populated_collection, None, 5)
+    assert not is_numbered(chroma_manager.get_collection(populated_collection))
+
+def test_number_all_collections_numbers_records_in_stored_order(populated_collection):
+    """
+    Test that records stored without a sequence number are numbered once, in the order they were stored.
+    """
+    # Act
+    number_all_collections()
+
+    # Assert
+    items = chroma_manager.get_collection(populated_collection).get(include=["metadatas"])
+    sequences = [metadata["seq"] for metadata in items["metadatas"]]
+    assert items["ids"] == [f"id{i:02d}" for i in range(25)]
+    assert sequences == sorted(set(sequences))
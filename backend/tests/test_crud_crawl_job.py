@@ -0,0 +1,69 @@
+import sqlite3
+import pytest
+from app.crud import crud_crawl_job
+from app.database import create_tables
+from app.schemas.crawl_job import CrawlJobStatus
+
+@pytest.fixture
+def db_connection():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    create_tables(conn)
+    yield conn
+    conn.close()
+
+def test_create_and_get_job(db_connection):
+    crud_crawl_job.create_job(db_connection, "job1", "collection1", "http://example.com", '{"name": "URL"}')
+    crud_crawl_job.add_frontier_urls(db_connection, "job1", [("http://example.com", 0, None), ("http://example.com/a", 1, "2024-05-01T00:00:00+00:00")])
+    crud_crawl_job.mark_url_done(db_connection, "job1", "http://example.com", indexed=True)
+
+    job = crud_crawl_job.get_job(db_connection, "job1")
+
+    assert job.status == CrawlJobStatus.RUNNING
+    assert job.import_params == '{"name": "URL"}'
+    assert (job.pages_indexed, job.pages_queued, job.pages_visited) == (1, 1, 2)
+
+def test_get_frontier(db_connection):
+    crud_crawl_job.create_job(db_connection, "job1", "collection1", "http://example.com", "{}")
+    crud_crawl_job.add_frontier_urls(db_connection, "job1", [("http://example.com", 0, None), ("http://example.com/a", 1, None)])
+    # Known URLs are not queued twice
+    crud_crawl_job.add_frontier_urls(db_connection, "job1", [("http://example.com", 1, None), ("http://example.com/b", 1, None)])
+    crud_crawl_job.mark_url_done(db_connection, "job1", "http://example.com/a")
+
+    visited, queued = crud_crawl_job.get_frontier(db_connection, "job1")
+
+    assert visited == {"http://example.com", "http://example.com/a", "http://example.com/b"}
+    assert queued == [("http://example.com", 0, None), ("http://example.com/b", 1, None)]
+
+def test_start_job_only_once(db_connection):
+    crud_crawl_job.create_job(db_connection, "job1", "collection1", "http://example.com", "{}")
+    crud_crawl_job.update_job_status(db_connection, "job1", CrawlJobStatus.INTERRUPTED)
+
+    first = crud_crawl_job.start_job(db_connection, "job1")
+    second = crud_crawl_job.start_job(db_connection, "job1")
+
+    assert (first, second) == (True, False)
+    assert crud_crawl_job.get_job(db_connection, "job1").status == CrawlJobStatus.RUNNING
+    assert crud_crawl_job.start_job(db_connection, "unknown") is False
+
+def test_interrupt_running_jobs(db_connection):
+    crud_crawl_job.create_job(db_connection, "job1", "collection1", "http://example.com", "{}")
+
+    crud_crawl_job.interrupt_running_jobs(db_connection)
+
+    assert crud_crawl_job.get_job(db_connection, "job1").status == CrawlJobStatus.INTERRUPTED
+
+def test_delete_jobs(db_connection):
+    crud_crawl_job.create_job(db_connection, "job1", "collection1", "http://example.com", "{}")
+    crud_crawl_job.create_job(db_connection, "job2", "collection1", "http://example.com", "{}")
+    crud_crawl_job.create_job(db_connection, "job3", "collection2", "http://example.com", "{}")
+    crud_crawl_job.add_frontier_urls(db_connection, "job1", [("http://example.com", 0, None)])
+    crud_crawl_job.update_job_status(db_connection, "job1", CrawlJobStatus.INTERRUPTED)
+
+    crud_crawl_job.delete_interrupted_jobs(db_connection, "collection1", "http://example.com")
+    assert [job.id for job in crud_crawl_job.get_jobs_for_collection(db_connection, "collection1")] == ["job2"]
+    assert crud_crawl_job.get_frontier(db_connection, "job1") == (set(), [])
+
+    crud_crawl_job.delete_jobs_by_collection_id(db_connection, "collection1")
+    assert crud_crawl_job.get_jobs_for_collection(db_connection, "collection1") == []
+    assert crud_crawl_job.get_job(db_connection, "job3") is not None
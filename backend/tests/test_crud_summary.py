@@ -3,6 +3,7 @@ import sqlite3
 import tempfile
 from unittest.mock import patch
 import chromadb
+from app.internal.chroma_manager import chroma_manager
 
 from app.database import create_tables
 from app.crud import crud_summary
@@ -11,8 +12,8 @@ from app.schemas.summary import Summary, SummaryType
 @pytest.fixture
 def db_connection():
     with tempfile.TemporaryDirectory() as tmpdir:
-        with patch('chromadb.PersistentClient') as mock_persistent_client:
-            mock_persistent_client.return_value = chromadb.PersistentClient(path=tmpdir)
+        with patch.object(chroma_manager, '_client', chromadb.PersistentClient(path=tmpdir)), \
+             patch.object(chroma_manager, '_collections', {}):
             conn = sqlite3.connect(":memory:")
             conn.row_factory = sqlite3.Row
             create_tables(conn)
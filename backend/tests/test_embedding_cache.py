@@ -0,0 +1,91 @@
+import os
+import tempfile
+from unittest.mock import MagicMock, patch
+import numpy as np
+import pytest
+
+from app.internal.embedding_cache import CachedEmbedder, EmbeddingCache
+
+
+@pytest.fixture
+def cache():
+    cache = EmbeddingCache()
+    cache.close()
+    with tempfile.TemporaryDirectory() as tmpdir, \
+         patch.object(cache, 'path', os.path.join(tmpdir, "embedding_cache.db")):
+        cache.configure(1)
+        yield cache
+        cache.close()
+
+@pytest.fixture
+def embedder():
+    embedder = MagicMock()
+    embedder.embed.side_effect = lambda documents: (np.array([float(len(d)), 1.0]) for d in documents)
+    return embedder
+
+def test_cached_embedder_embeds_each_text_once(cache, embedder):
+    """
+    Test that texts embedded before are served from the cache, also for another wrapper of the same model.
+    """
+    # Arrange
+    first = CachedEmbedder(embedder, "model-a", cache)
+    second = CachedEmbedder(embedder, "model-a", cache)
+
+    # Act
+    first_vectors = list(first.embed(["footer", "page one"]))
+    second_vectors = list(second.embed(["page two", "footer"]))
+
+    # Assert
+    embedded = [doc for call in embedder.embed.call_args_list for doc in call.args[0]]
+    assert embedded == ["footer", "page one", "page two"]
+    assert [v[0] for v in first_vectors] == [6.0, 8.0]
+    assert [v[0] for v in second_vectors] == [8.0, 6.0]
+    assert (second.hits, second.misses) == (1, 1)
+
+def test_cache_is_keyed_by_model(cache, embedder):
+    list(CachedEmbedder(embedder, "model-a", cache).embed(["text"]))
+    list(CachedEmbedder(embedder, "model-b", cache).embed(["text"]))
+
+    assert embedder.embed.call_count == 2
+
+def test_duplicate_texts_in_batch_are_embedded_once(cache, embedder):
+    vectors = list(CachedEmbedder(embedder, "model-a", cache).embed(["same", "same", "other"]))
+
+    embedder.embed.assert_called_once_with(["same", "other"])
+    assert len(vectors) == 3
+
+def test_cache_persists_across_connections(cache):
+    cache.put_many("model-a", {"h1": np.array([1.0, 2.0])})
+    cache.close()
+
+    found = cache.get_many("model-a", ["h1", "h2"])
+
+    assert list(found) == ["h1"]
+    assert found["h1"].tolist() == [1.0, 2.0]
+
+def test_least_recently_used_entries_are_evicted(cache):
+    """
+    Test that the cache stays under its size limit by dropping the least recently used vectors.
+    """
+    # Arrange: 1 MB limit, vectors of 256 KB
+    vector = np.zeros(64 * 1024, dtype=np.float32)
+    cache.put_many("model-a", {"old": vector, "used": vector})
+    cache.get_many("model-a", ["used"])
+
+    # Act
+    cache.put_many("model-a", {"new1": vector, "new2": vector, "new3": vector})
+
+    # Assert
+    stats = cache.stats()
+    assert stats["size_bytes"] <= stats["max_size_bytes"]
+    remaining = cache.get_many("model-a", ["old", "used", "new1", "new2", "new3"])
+    assert "old" not in remaining
+    assert "new3" in remaining
+
+def test_clear(cache):
+    cache.put_many("model-a", {"h1": np.array([1.0])})
+
+    cache.clear()
+
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["size_bytes"] == 0
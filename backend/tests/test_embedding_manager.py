@@ -0,0 +1,186 @@
+from collections import OrderedDict
+from unittest.mock import MagicMock, patch
+import numpy as np
+import pytest
+
+from app.internal import embedding_manager
+from app.internal.embedding_manager import DEFAULT_MODEL_NAME, EmbedderRegistry, QueryEmbeddingCache, embed_query
+
+
+@pytest.fixture
+def query_cache():
+    cache = embedding_manager.get_query_cache()
+    cache.clear()
+    yield cache
+    cache.clear()
+
+def test_cache_hit_and_miss_counters():
+    cache = QueryEmbeddingCache(max_size=4)
+
+    assert cache.get("model", "hello") is None
+    cache.put("model", "hello", [1.0])
+
+    assert cache.get("model", "hello") == [1.0]
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+def test_cache_key_normalizes_whitespace():
+    cache = QueryEmbeddingCache()
+    cache.put("model", "  what is   RAG?\n", [1.0])
+
+    assert cache.get("model", "what is RAG?") == [1.0]
+
+def test_cache_key_includes_model():
+    cache = QueryEmbeddingCache()
+    cache.put("model-a", "query", [1.0])
+
+    assert cache.get("model-b", "query") is None
+
+def test_cache_evicts_least_recently_used():
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.put("model", "a", [1.0])
+    cache.put("model", "b", [2.0])
+    cache.get("model", "a")
+
+    cache.put("model", "c", [3.0])
+
+    assert cache.get("model", "b") is None
+    assert cache.get("model", "a") == [1.0]
+    assert cache.stats()["evictions"] == 1
+
+def test_cache_expires_entries_after_ttl():
+    cache = QueryEmbeddingCache(ttl_seconds=10)
+    with patch('app.internal.embedding_manager.time.monotonic', return_value=100.0):
+        cache.put("model", "query", [1.0])
+    with patch('app.internal.embedding_manager.time.monotonic', return_value=111.0):
+        assert cache.get("model", "query") is None
+    assert cache.stats()["size"] == 0
+
+@patch('app.internal.embedding_manager.get_embedder')
+def test_embed_query_runs_model_once_for_repeated_queries(mock_get_embedder, query_cache):
+    """
+    Test that a repeated query is served from the cache without running the model.
+    """
+    # Arrange
+    mock_embedder = MagicMock()
+    mock_embedder.embed.side_effect = lambda texts: iter([np.array([0.1, 0.2])])
+    mock_get_embedder.return_value = mock_embedder
+
+    # Act
+    first = embed_query("find my notes")
+    second = embed_query("find  my notes ")
+
+    # Assert
+    assert first == second == [0.1, 0.2]
+    mock_embedder.embed.assert_called_once_with(["find my notes"])
+    assert query_cache.stats()["hits"] == 1
+
+@patch('app.internal.embedding_manager.get_embedder')
+def test_embed_query_result_does_not_share_the_cached_vector(mock_get_embedder, query_cache):
+    """
+    Test that changing a returned query embedding does not change the one served to later queries.
+    """
+    # Arrange
+    mock_embedder = MagicMock()
+    mock_embedder.embed.side_effect = lambda texts: iter([np.array([0.1, 0.2])])
+    mock_get_embedder.return_value = mock_embedder
+
+    # Act
+    embed_query("find my notes").append(1.0)
+    embed_query("find my notes")[0] = 9.0
+
+    # Assert
+    assert embed_query("find my notes") == [0.1, 0.2]
+
+@pytest.fixture
+def registry():
+    registry = EmbedderRegistry()
+    with patch.object(registry, '_models', OrderedDict()), \
+         patch.object(registry, '_load_locks', {}), \
+         patch.object(registry, '_tokenizers', {}), \
+         patch('app.internal.embedding_manager.TextEmbedding') as mock_text_embedding:
+        mock_text_embedding.list_supported_models.return_value = [
+            {"model": "sentence-transformers/all-MiniLM-L6-v2", "size_in_GB": 0.09, "dim": 384},
+            {"model": "BAAI/bge-small-en-v1.5", "size_in_GB": 0.067, "dim": 384},
+            {"model": "BAAI/bge-base-en-v1.5", "size_in_GB": 0.21, "dim": 768},
+        ]
+        mock_text_embedding.side_effect = lambda name, cache_dir: MagicMock(name=name)
+        with patch.object(registry, '_supported', None):
+            yield registry, mock_text_embedding
+
+def test_registry_resolves_short_model_names(registry):
+    registry, _ = registry
+
+    assert registry.resolve_model_name("all-MiniLM-L6-v2") == "sentence-transformers/all-MiniLM-L6-v2"
+    assert registry.resolve_model_name("BAAI/bge-base-en-v1.5") == "BAAI/bge-base-en-v1.5"
+    assert registry.resolve_model_name(None) == DEFAULT_MODEL_NAME
+    assert registry.get_dimension("bge-base-en-v1.5") == 768
+    with pytest.raises(ValueError, match="Unsupported embedding model"):
+        registry.resolve_model_name("unknown-model")
+
+def test_registry_loads_each_model_once(registry):
+    """
+    Test that a model is loaded on first use and reused afterwards.
+    """
+    registry, mock_text_embedding = registry
+
+    first = registry.get("all-MiniLM-L6-v2")
+    second = registry.get("sentence-transformers/all-MiniLM-L6-v2")
+    other = registry.get("bge-small-en-v1.5")
+
+    assert first is second
+    assert other is not first
+    assert mock_text_embedding.call_count == 2
+    assert registry.loaded_models() == ["sentence-transformers/all-MiniLM-L6-v2", "BAAI/bge-small-en-v1.5"]
+
+def test_registry_evicts_least_recently_used_model_over_budget(registry):
+    """
+    Test that loading a model over the memory budget drops the least recently used one.
+    """
+    registry, mock_text_embedding = registry
+    with patch.object(registry, 'memory_budget_mb', 320):
+        registry.get("all-MiniLM-L6-v2")
+        registry.get("bge-small-en-v1.5")
+        registry.get("all-MiniLM-L6-v2")
+
+        registry.get("bge-base-en-v1.5")
+
+        assert registry.loaded_models() == ["sentence-transformers/all-MiniLM-L6-v2", "BAAI/bge-base-en-v1.5"]
+
+        registry.get("bge-small-en-v1.5")
+        assert mock_text_embedding.call_count == 4
+
+@patch('app.internal.embedding_manager.get_embedder')
+def test_embed_query_uses_collection_model(mock_get_embedder, query_cache):
+    mock_get_embedder.return_value.embed.side_effect = lambda texts: iter([np.array([1.0])])
+
+    embed_query("question", "all-MiniLM-L6-v2")
+    embed_query("question", "bge-small-en-v1.5")
+
+    assert [c.args[0] for c in mock_get_embedder.call_args_list] == ["sentence-transformers/all-MiniLM-L6-v2", "BAAI/bge-small-en-v1.5"]
+
+def test_registry_returns_untruncated_tokenizer_and_token_budget(registry):
+    """
+    Test that the chunk tokenizer is a copy of the model's without truncation, with the model limit minus special tokens.
+    """
+    # Arrange
+    from tokenizers import Tokenizer, models, pre_tokenizers, processors
+    registry, mock_text_embedding = registry
+    model_tokenizer = Tokenizer(models.WordLevel({"[UNK]": 0, "[CLS]": 1, "[SEP]": 2, "word": 3}, unk_token="[UNK]"))
+    model_tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    model_tokenizer.post_processor = processors.BertProcessing(("[SEP]", 2), ("[CLS]", 1))
+    model_tokenizer.enable_truncation(max_length=8)
+    mock_text_embedding.side_effect = lambda name, cache_dir: MagicMock(**{"model.tokenizer": model_tokenizer})
+
+    # Act
+    tokenizer, max_tokens = registry.get_tokenizer("all-MiniLM-L6-v2")
+    again, _ = registry.get_tokenizer("sentence-transformers/all-MiniLM-L6-v2")
+
+    # Assert
+    assert max_tokens == 6
+    assert len(tokenizer.encode(" ".join(["word"] * 20), add_special_tokens=False).ids) == 20
+    assert model_tokenizer.truncation["max_length"] == 8
+    assert again is tokenizer
+    assert mock_text_embedding.call_count == 1
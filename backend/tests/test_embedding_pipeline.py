@@ -0,0 +1,150 @@
+import threading
+from threading import Event
+from unittest.mock import MagicMock
+import numpy as np
+
+from app.internal.embedding_pipeline import EmbeddingPipeline, get_batch_size, MAX_CHROMA_BATCH_SIZE
+
+
+def make_records(count):
+    return [(f"id_{i}", f"doc {i}", {"chunk": i}) for i in range(count)]
+
+def make_embedder():
+    embedder = MagicMock()
+    embedder.embed.side_effect = lambda documents: (np.array([float(len(d)), 0.0]) for d in documents)
+    return embedder
+
+def test_pipeline_upserts_all_records_in_batches():
+    """
+    Test that records are embedded and upserted in batches of batch_size.
+    """
+    # Arrange
+    collection = MagicMock()
+    embedder = make_embedder()
+    on_batch = MagicMock()
+    pipeline = EmbeddingPipeline(collection, embedder, 4, Event(), on_batch=on_batch)
+
+    # Act
+    completed = pipeline.run(make_records(10))
+
+    # Assert
+    assert completed is True
+    assert pipeline.stored == 10
+    assert embedder.embed.call_count == 3
+    assert collection.upsert.call_count == 3
+    batch_sizes = [len(call.kwargs["ids"]) for call in collection.upsert.call_args_list]
+    assert batch_sizes == [4, 4, 2]
+    assert collection.upsert.call_args_list[0].kwargs["ids"][0] == "id_0"
+    assert collection.upsert.call_args_list[2].kwargs["metadatas"][-1]["chunk"] == 9
+    sequences = [metadata["seq"] for call in collection.upsert.call_args_list for metadata in call.kwargs["metadatas"]]
+    assert sequences == sorted(set(sequences))
+    on_batch.assert_called_with(3, 10)
+
+def test_pipeline_consumes_records_lazily():
+    """
+    Test that the record iterator is not drained before the first batch is stored.
+    """
+    # Arrange
+    collection = MagicMock()
+    pulled = []
+
+    def records():
+        for record in make_records(6):
+            pulled.append(record[0])
+            yield record
+
+    first_upsert_pulled = []
+    collection.upsert.side_effect = lambda **kwargs: first_upsert_pulled.append(len(pulled)) if not first_upsert_pulled else None
+    pipeline = EmbeddingPipeline(collection, make_embedder(), 2, Event())
+
+    # Act
+    pipeline.run(records())
+
+    # Assert
+    assert first_upsert_pulled[0] < 6
+
+def test_pipeline_embeds_next_batch_while_upserting():
+    """
+    Test that embedding of the next batch overlaps with the upsert of the previous one.
+    """
+    # Arrange
+    upsert_in_progress = threading.Event()
+    release_upsert = threading.Event()
+    embedded_during_upsert = []
+
+    collection = MagicMock()
+    def slow_upsert(**kwargs):
+        upsert_in_progress.set()
+        release_upsert.wait(timeout=5)
+        upsert_in_progress.clear()
+    collection.upsert.side_effect = slow_upsert
+
+    embedder = MagicMock()
+    def embed(documents):
+        if documents[0] == "doc 2":
+            upsert_in_progress.wait(timeout=5)
+            embedded_during_upsert.append(upsert_in_progress.is_set())
+            release_upsert.set()
+        return (np.array([1.0]) for _ in documents)
+    embedder.embed.side_effect = embed
+
+    pipeline = EmbeddingPipeline(collection, embedder, 2, Event())
+
+    # Act
+    pipeline.run(make_records(4))
+
+    # Assert
+    assert embedded_during_upsert == [True]
+    assert pipeline.stored == 4
+
+def test_pipeline_stops_between_batches_when_cancelled():
+    """
+    Test that cancellation takes effect before the next batch is embedded.
+    """
+    # Arrange
+    cancel_event = Event()
+    collection = MagicMock()
+    embedder = make_embedder()
+    pipeline = EmbeddingPipeline(collection, embedder, 2, cancel_event, on_batch=lambda batch_num, stored: cancel_event.set())
+
+    # Act
+    completed = pipeline.run(make_records(10))
+
+    # Assert
+    assert completed is False
+    assert pipeline.stored < 10
+    assert embedder.embed.call_count <= 3
+
+def test_pipeline_cancelled_after_last_record_is_complete():
+    """
+    Test that a cancel request arriving after every record was stored does not report the run as incomplete.
+    """
+    # Arrange
+    cancel_event = Event()
+    collection = MagicMock()
+    pipeline = EmbeddingPipeline(collection, make_embedder(), 4, cancel_event,
+                                 on_batch=lambda batch_num, stored: stored == 10 and cancel_event.set())
+
+    # Act
+    completed = pipeline.run(make_records(10))
+
+    # Assert
+    assert cancel_event.is_set()
+    assert completed is True
+    assert pipeline.stored == 10
+
+def test_pipeline_with_no_records():
+    collection = MagicMock()
+    pipeline = EmbeddingPipeline(collection, make_embedder(), 2, Event())
+
+    assert pipeline.run([]) is True
+    collection.upsert.assert_not_called()
+
+def test_get_batch_size_respects_memory_limit():
+    small = get_batch_size(1, 800)
+    large = get_batch_size(256, 800)
+
+    assert 1 <= small < large
+    assert large <= MAX_CHROMA_BATCH_SIZE
+    assert get_batch_size(100000, 10) == MAX_CHROMA_BATCH_SIZE
+    assert get_batch_size(0, 100000) == 1
@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from unittest.mock import MagicMock, patch
+import numpy as np
+import pytest
+
+from app.internal import embedding_workers
+from app.internal.embedding_manager import DEFAULT_MODEL_NAME
+from app.internal.embedding_workers import EmbeddingWorkerPool, PooledEmbedder, get_import_embedder
+
+
+@pytest.fixture
+def pool():
+    pool = EmbeddingWorkerPool()
+    yield pool
+    pool.shutdown()
+
+@pytest.fixture
+def fake_worker_model():
+    # Worker function runs in threads of this process, with a fake model in the worker state
+    model = MagicMock()
+    model.embed.side_effect = lambda documents: (np.array([float(len(d)), 1.0]) for d in documents)
+    with patch.dict(embedding_workers._worker_models, {"fake-model": model}):
+        yield model
+
+def test_pool_splits_documents_and_keeps_order(pool, fake_worker_model):
+    """
+    Test that a batch is split into one slice per worker and the embeddings come back in input order.
+    """
+    # Arrange
+    pool._executor = ThreadPoolExecutor(max_workers=3)
+    pool.num_workers = 3
+    documents = ["a" * i for i in range(1, 8)]
+
+    # Act
+    embeddings = pool.embed("fake-model", documents)
+
+    # Assert
+    assert fake_worker_model.embed.call_count == 3
+    assert [len(call.args[0]) for call in fake_worker_model.embed.call_args_list] == [3, 3, 1]
+    assert embeddings.dtype == np.float32
+    assert embeddings[:, 0].tolist() == [float(i) for i in range(1, 8)]
+
+def test_pooled_embedder_has_text_embedding_interface(pool, fake_worker_model):
+    pool._executor = ThreadPoolExecutor(max_workers=2)
+    pool.num_workers = 2
+
+    embedder = PooledEmbedder(pool, "fake-model")
+    embeddings = list(embedder.embed(doc for doc in ["one", "three"]))
+
+    assert [e[0] for e in embeddings] == [3.0, 5.0]
+
+def test_embed_fails_when_pool_is_not_running(pool):
+    with pytest.raises(RuntimeError):
+        pool.embed("fake-model", ["text"])
+
+def test_configure_restarts_only_on_change(pool):
+    """
+    Test that the pool is recreated when the configuration changes and stopped with zero workers.
+    """
+    # Arrange
+    with patch('app.internal.embedding_workers.ProcessPoolExecutor') as mock_executor_class:
+        first, second = MagicMock(), MagicMock()
+        mock_executor_class.side_effect = [first, second]
+
+        # Act
+        pool.configure(2, 1)
+        pool.configure(2, 1)
+        pool.configure(4, 2)
+        pool.configure(0, 2)
+
+    # Assert
+    assert mock_executor_class.call_count == 2
+    assert mock_executor_class.call_args.kwargs["max_workers"] == 4
+    assert mock_executor_class.call_args.kwargs["initargs"] == (2,)
+    first.shutdown.assert_called_once_with(wait=False)
+    second.shutdown.assert_called_once_with(wait=False)
+    assert pool.is_enabled() is False
+
+def test_reconfigure_does_not_stop_running_import(pool, fake_worker_model):
+    """
+    Test that an import keeps embedding on its executor while another import reconfigures or stops the pool,
+    and that the replaced executor is shut down once the import is done with it.
+    """
+    # Arrange
+    started, proceed = threading.Event(), threading.Event()
+    embed_batch = fake_worker_model.embed.side_effect
+    def blocking_embed(documents):
+        started.set()
+        proceed.wait(5)
+        return embed_batch(documents)
+    fake_worker_model.embed.side_effect = blocking_embed
+    old_executor = ThreadPoolExecutor(max_workers=2)
+    pool._executor = old_executor
+    pool.num_workers = 2
+    embedder = PooledEmbedder(pool, "fake-model")
+    result = {}
+    running = threading.Thread(target=lambda: result.update(first=list(embedder.embed(["one", "three"]))))
+
+    # Act
+    with patch.object(old_executor, 'shutdown', wraps=old_executor.shutdown) as old_shutdown, \
+         patch('app.internal.embedding_workers.ProcessPoolExecutor'):
+        running.start()
+        assert started.wait(5)
+        pool.configure(4, 2)
+        pool.configure(0, 2)
+        proceed.set()
+        running.join(5)
+        second = list(embedder.embed(["four"]))
+        shut_down_while_in_use = old_shutdown.called
+        del embedder
+
+    # Assert
+    assert [e[0] for e in result["first"]] == [3.0, 5.0]
+    assert [e[0] for e in second] == [4.0]
+    assert shut_down_while_in_use is False
+    old_shutdown.assert_called_once_with(wait=False)
+
+def test_get_import_embedder_inline_without_workers(pool):
+    with patch('app.internal.embedding_workers.get_embedder') as mock_get_embedder:
+        embedder = get_import_embedder(None, 0, 1)
+
+    assert embedder is mock_get_embedder.return_value
+    mock_get_embedder.assert_called_once_with(None)
+
+def test_get_import_embedder_uses_pool_with_workers(pool):
+    with patch('app.internal.embedding_workers.ProcessPoolExecutor'):
+        embedder = get_import_embedder("all-MiniLM-L6-v2", 2, 1)
+
+    assert isinstance(embedder, PooledEmbedder)
+    assert embedder.model_name == DEFAULT_MODEL_NAME
+
+def test_embed_in_worker_loads_model_once_with_pinned_threads():
+    with patch('app.internal.embedding_workers.TextEmbedding') as mock_text_embedding, \
+         patch.dict(embedding_workers._worker_models, clear=True):
+        mock_text_embedding.return_value.embed.side_effect = lambda documents: (np.zeros(2) for _ in documents)
+        embedding_workers._init_worker(3)
+
+        first = embedding_workers._embed_in_worker("some-model", ["a", "b"])
+        embedding_workers._embed_in_worker("some-model", ["c"])
+
+    mock_text_embedding.assert_called_once_with("some-model", cache_dir='.fastembed', threads=3)
+    assert first.shape == (2, 2)
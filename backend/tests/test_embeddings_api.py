@@ -0,0 +1,52 @@
+import os
+import tempfile
+from unittest.mock import patch
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.internal.embedding_cache import EmbeddingCache
+from app.internal.embedding_manager import get_query_cache
+
+client = TestClient(app)
+
+def test_read_query_cache_stats():
+    cache = get_query_cache()
+    cache.clear()
+    cache.put("model", "query", [1.0])
+    cache.get("model", "query")
+    cache.get("model", "other")
+
+    response = client.get("/embeddings/query_cache")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["size"] == 1
+    assert data["hits"] == 1
+    assert data["misses"] == 1
+    cache.clear()
+
+def test_clear_query_cache():
+    get_query_cache().put("model", "query", [1.0])
+
+    response = client.delete("/embeddings/query_cache")
+
+    assert response.status_code == 200
+    assert get_query_cache().stats()["size"] == 0
+
+def test_read_and_clear_chunk_cache():
+    cache = EmbeddingCache()
+    cache.close()
+    with tempfile.TemporaryDirectory() as tmpdir, \
+         patch.object(cache, 'path', os.path.join(tmpdir, "embedding_cache.db")):
+        cache.put_many("model", {"h1": np.array([1.0, 2.0])})
+
+        stats_response = client.get("/embeddings/chunk_cache")
+        clear_response = client.delete("/embeddings/chunk_cache")
+
+        assert stats_response.status_code == 200
+        assert stats_response.json()["entries"] == 1
+        assert stats_response.json()["size_bytes"] == 8
+        assert clear_response.status_code == 200
+        assert cache.stats()["entries"] == 0
+        cache.close()
@@ -5,6 +5,7 @@ from unittest.mock import patch, MagicMock
 from app.main import app
 from app.schemas.file import File
 from app.internal.chunker import ChunkType
+from app.internal.staging_store import write_staged
 
 client = TestClient(app)
 
@@ -14,19 +15,20 @@ def mock_get_file():
         yield mock_get
 
 @pytest.fixture
-def mock_temp_file_helper():
-    with patch('app.routers.files.TempFileHelper') as mock_helper:
-        yield mock_helper
+def mock_staging_store():
+    with patch('app.routers.files.staging_store') as mock_store:
+        yield mock_store
 
-def test_get_chunk_preview_success(mock_get_file, mock_temp_file_helper):
+def test_get_chunk_preview_success(mock_get_file, tmp_path):
     """
     Test successful chunk preview generation.
     """
     # Arrange
     test_content = "This is a test content that will be split into chunks." * 5
-    mock_temp_file_helper.get_temp_file_content.return_value = test_content
+    test_file = tmp_path / "existing_file.stg"
+    write_staged(str(test_file), [test_content])
     
-    mock_file = File(id="existing_file.txt", path="/path/to/existing_file.txt", collection_id="123", timestamp="2023-01-01T12:00:00", source="existing_file.txt")
+    mock_file = File(id="existing_file.txt", path=str(test_file), collection_id="123", timestamp="2023-01-01T12:00:00", source="existing_file.txt")
     mock_get_file.return_value = mock_file
     
     request_payload = {
@@ -50,7 +52,6 @@ def test_get_chunk_preview_success(mock_get_file, mock_temp_file_helper):
     assert len(data["chunks"]) == 2
     assert data["chunks"][0] == "This is a test content that will be split into chu"
     assert data["more_chunks"] is True
-    mock_temp_file_helper.get_temp_file_content.assert_called_once_with(mock_file.path)
 
 def test_get_chunk_preview_file_not_found_in_db(mock_get_file):
     """
@@ -75,14 +76,13 @@ def test_get_chunk_preview_file_not_found_in_db(mock_get_file):
     # Assert
     assert response.status_code == 500 # Because it will raise an AttributeError
 
-def test_get_chunk_preview_file_not_found_on_disk(mock_get_file, mock_temp_file_helper):
+def test_get_chunk_preview_file_not_found_on_disk(mock_get_file, tmp_path):
     """
     Test the case where the file is not found on disk (404).
     """
     # Arrange
-    mock_file = File(id="existing_file.txt", path="/path/to/existing_file.txt", collection_id="123", timestamp="2023-01-01T12:00:00", source="existing_file.txt")
+    mock_file = File(id="existing_file.txt", path=str(tmp_path / "existing_file.stg"), collection_id="123", timestamp="2023-01-01T12:00:00", source="existing_file.txt")
     mock_get_file.return_value = mock_file
-    mock_temp_file_helper.get_temp_file_content.side_effect = FileNotFoundError
     
     request_payload = {
         "file_id": "non_existent_file.txt",
@@ -101,14 +101,14 @@ def test_get_chunk_preview_file_not_found_on_disk(mock_get_file, mock_temp_file_
     assert response.status_code == 404
     assert response.json() == {"detail": "Temporary file not found."}
 
-def test_get_chunk_preview_invalid_params(mock_get_file, mock_temp_file_helper):
+def test_get_chunk_preview_invalid_params(mock_get_file, mock_staging_store):
     """
     Test the case with invalid request parameters (422).
     """
     # Arrange
     mock_file = File(id="any_file.txt", path="/path/to/any_file.txt", collection_id="123", timestamp="2023-01-01T12:00:00", source="any_file.txt")
     mock_get_file.return_value = mock_file
-    mock_temp_file_helper.get_temp_file_content.return_value = "some content"
+    mock_staging_store.open.return_value.__enter__.return_value.iter_blocks.return_value = iter(["some content"])
     request_payload = {
         "file_id": "any_file.txt",
         "skip_number": 0,
@@ -125,13 +125,13 @@ def test_get_chunk_preview_invalid_params(mock_get_file, mock_temp_file_helper):
     # Assert
     assert response.status_code == 422  # Unprocessable Entity
 
-def test_get_chunk_preview_no_chunks_mode(mock_get_file, mock_temp_file_helper):
+def test_get_chunk_preview_no_chunks_mode(mock_get_file, mock_staging_store):
     """
     Test the 'no_chunks' mode where the entire content is returned as a single chunk.
     """
     # Arrange
     test_content = "This is the full content."
-    mock_temp_file_helper.get_temp_file_content.return_value = test_content
+    mock_staging_store.open.return_value.__enter__.return_value.iter_blocks.return_value = iter([test_content])
     mock_file = File(id="some_file.txt", path="/path/to/some_file.txt", collection_id="123", timestamp="2023-01-01T12:00:00", source="some_file.txt")
     mock_get_file.return_value = mock_file
 
@@ -153,4 +153,24 @@ def test_get_chunk_preview_no_chunks_mode(mock_get_file, mock_temp_file_helper):
     data = response.json()
     assert len(data["chunks"]) == 1
     assert data["chunks"][0] == test_content
-    assert data["more_chunks"] is False
\ No newline at end of file
+    assert data["more_chunks"] is False
+
+def test_get_staging_usage(tmp_path):
+    """
+    Test that the staging usage of a collection counts its staged texts.
+    """
+    # Arrange
+    from app.internal.staging_store import StagingStore
+    store = StagingStore(str(tmp_path))
+    store.save("123", ["staged text " * 100])
+
+    # Act
+    with patch('app.routers.files.staging_store', store):
+        response = client.get("/files/staging/123")
+
+    # Assert
+    assert response.status_code == 200
+    data = response.json()
+    assert data["files"] == 1
+    assert data["text_chars"] == len("staged text " * 100)
+    assert 0 < data["stored_bytes"] < data["text_chars"]
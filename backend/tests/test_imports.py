@@ -1,11 +1,16 @@
 import asyncio
 import io
+import os
+import tempfile
 import threading
+import zipfile
 from unittest.mock import MagicMock, patch
 import pytest
 from fastapi import UploadFile
-from app.routers.imports import import_file
+from app.routers.imports import import_file, import_files_bulk
 from app.models.imports import FileImport
+from app.internal.parsed_text_cache import ParsedTextCache
+from app.internal.temp_file_helper import TempFileHelper
 from app.database import create_tables # New import
 import sqlite3
 from fastapi.testclient import TestClient
@@ -13,10 +18,17 @@ from app.main import app
 
 client = TestClient(app)
 
+def make_zip_bytes(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
 def test_get_chunk_types():
     response = client.get("/import/chunktypes/")
     assert response.status_code == 200
-    assert response.json() == ["DEFAULT", "RECURSIVE_CHARACTER"]
+    assert response.json() == ["DEFAULT", "RECURSIVE_CHARACTER", "TOKEN"]
 
 @pytest.mark.asyncio
 async def test_import_file_background_task():
@@ -67,20 +79,20 @@ async def test_import_file_background_task():
         importer = FileImport() # Still need an instance to call import_data
         cancellation_event = threading.Event()
         
-        # task_dispatcher.add_task(collection_id, task_name, FileImport().import_data, file.filename, file_content_bytes, import_params_model, message_hub)
+        # task_dispatcher.add_task(collection_id, task_name, FileImport().import_data, file.filename, file_path, import_context, on_discard=...)
         
         # args[0] = collection_id
         # args[1] = task_name
         # args[2] = FileImport().import_data (the function itself)
         # args[3] = file.filename
-        # args[4] = file_content_bytes
+        # args[4] = path of the spooled upload
         # args[5] = import_params_model
         # args[6] = message_hub
 
         await importer.import_data(
             collection_id=args[0], 
             file_name=args[3],
-            file_content_bytes=args[4],
+            file_path=args[4],
             context=args[5],
             cancel_event=cancellation_event
         )
@@ -88,6 +100,10 @@ async def test_import_file_background_task():
         # 10. Assert that the file was read correctly
         # (This is an indirect way to check that no error was raised)
         assert not cancellation_event.is_set()
+
+        # The upload was spooled to disk for the task, and the spool file is removed after the import
+        assert "on_discard" in kwargs
+        assert not os.path.exists(args[4])
         
         # 11. Check the response
         assert response == {"message": "File import started in the background."}
@@ -123,7 +139,7 @@ async def test_import_file_with_chunk_type():
          patch("app.dependencies.get_task_dispatcher", return_value=mock_task_dispatcher), \
          patch("app.dependencies.get_message_hub", return_value=mock_message_hub), \
          patch("app.routers.imports.get_settings", mock_get_settings), \
-         patch("app.models.imports.Chunker.create_chunks") as mock_create_chunks:
+         patch("app.internal.chunker.Chunker.iter_chunks") as mock_iter_chunks:
         create_tables(in_memory_conn)  # Create tables in the in-memory db
     
         # 5. Call the endpoint function
@@ -149,17 +165,406 @@ async def test_import_file_with_chunk_type():
         await importer.import_data(
             collection_id=args[0], 
             file_name=args[3],
-            file_content_bytes=args[4],
+            file_path=args[4],
             context=args[5],
             cancel_event=cancellation_event
         )
         
-        # 10. Assert that create_chunks was called with the correct parameters
-        mock_create_chunks.assert_called_once()
-        call_args, call_kwargs = mock_create_chunks.call_args
+        # 10. Assert that iter_chunks was called with the correct parameters
+        mock_iter_chunks.assert_called_once()
+        call_args, call_kwargs = mock_iter_chunks.call_args
         assert call_args[1] == "RECURSIVE_CHARACTER"
         
         # 11. Check the response
         assert response == {"message": "File import started in the background."}
     
-    in_memory_conn.close() # Close the in-memory database connection
\ No newline at end of file
+    in_memory_conn.close() # Close the in-memory database connection
+
+@pytest.mark.asyncio
+async def test_resume_url_import():
+    """
+    Test that an interrupted crawl job is dispatched again with its stored import parameters.
+    """
+    # Arrange
+    from app.crud import crud_crawl_job
+    from app.routers.imports import resume_url_import
+    from app.schemas.crawl_job import CrawlJobStatus
+
+    in_memory_conn = sqlite3.connect(":memory:")
+    in_memory_conn.row_factory = sqlite3.Row
+    create_tables(in_memory_conn)
+    import_params = '{"name": "URL", "model": "all-MiniLM-L6-v2", "settings": {"chunk_size": 800, "chunk_overlap": 40, "no_chunks": true}}'
+    crud_crawl_job.create_job(in_memory_conn, "job1", "test_collection", "http://example.com", import_params)
+    mock_task_dispatcher = MagicMock()
+
+    with patch("app.routers.imports.crud_collection") as mock_crud_collection:
+        mock_crud_collection.get_collection.return_value = MagicMock(import_type="URL")
+
+        # Act
+        running = await resume_url_import("job1", db=in_memory_conn, task_dispatcher=mock_task_dispatcher, message_hub=MagicMock())
+        crud_crawl_job.update_job_status(in_memory_conn, "job1", CrawlJobStatus.INTERRUPTED)
+        response = await resume_url_import("job1", db=in_memory_conn, task_dispatcher=mock_task_dispatcher, message_hub=MagicMock())
+        repeated = await resume_url_import("job1", db=in_memory_conn, task_dispatcher=mock_task_dispatcher, message_hub=MagicMock())
+        missing = await resume_url_import("unknown", db=in_memory_conn, task_dispatcher=mock_task_dispatcher, message_hub=MagicMock())
+
+    # Assert
+    assert running.status_code == 409
+    assert missing.status_code == 404
+    assert response == {"message": "Url import resumed in the background."}
+    assert repeated.status_code == 409
+    mock_task_dispatcher.add_task.assert_called_once()
+    args, kwargs = mock_task_dispatcher.add_task.call_args
+    assert args[0] == "test_collection"
+    assert args[3] == "http://example.com"
+    assert args[5].parameters.settings.chunk_overlap == 40
+    assert kwargs["job_id"] == "job1"
+    assert crud_crawl_job.get_job(in_memory_conn, "job1").status == CrawlJobStatus.RUNNING
+
+    # A resumed task cancelled before it starts leaves the job interrupted, so it can be resumed again
+    discard_conn = MagicMock(wraps=in_memory_conn)
+    discard_conn.close = MagicMock()
+    with patch("app.routers.imports.get_db_connection", return_value=discard_conn):
+        kwargs["on_discard"]()
+    assert crud_crawl_job.get_job(in_memory_conn, "job1").status == CrawlJobStatus.INTERRUPTED
+    in_memory_conn.close()
+
+@pytest.mark.asyncio
+async def test_import_files_bulk_imports_archives_and_files_in_one_task():
+    """
+    Test that a bulk import expands archives, skips files it cannot parse,
+    stores the chunks of all other files and removes every spool file.
+    """
+    # Arrange
+    import chromadb
+    import numpy as np
+    in_memory_conn = sqlite3.connect(":memory:", check_same_thread=False)
+    in_memory_conn.row_factory = sqlite3.Row
+    create_tables(in_memory_conn)
+
+    mock_crud_collection = MagicMock()
+    mock_crud_collection.get_collection.return_value = MagicMock(id="bulk_test", import_type="NONE")
+    mock_task_dispatcher = MagicMock()
+    mock_message_hub = MagicMock()
+    embedder = MagicMock()
+    embedder.embed.side_effect = lambda documents: (np.array([float(len(d)), 1.0]) for d in documents)
+    chroma_client = chromadb.EphemeralClient()
+    collection = chroma_client.get_or_create_collection("bulk_test")
+    cache = ParsedTextCache()
+    cache.close()
+    cache_dir = tempfile.TemporaryDirectory()
+
+    archive = make_zip_bytes({"a.txt": b"alpha text", "sub/b.md": b"beta text", "image.png": b"png", "latin1.txt": b"caf\xe9 text"})
+    files = [
+        UploadFile(filename="docs.zip", file=io.BytesIO(archive)),
+        UploadFile(filename="c.txt", file=io.BytesIO(b"gamma text")),
+        UploadFile(filename="broken.pdf", file=io.BytesIO(b"not a pdf")),
+    ]
+
+    with patch("app.routers.imports.crud_collection", mock_crud_collection), \
+         patch("app.models.imports.chroma_manager.get_or_create_collection", return_value=collection), \
+         patch("app.models.imports.EmbedderRegistry.get_dimension", return_value=2), \
+         patch("app.models.imports.FileImport.create_embedder", return_value=embedder), \
+         patch.object(cache, "path", cache_dir.name):
+        # Act
+        response = await import_files_bulk(
+            collection_id="bulk_test",
+            import_params='{"name": "FILE", "model": "all-MiniLM-L6-v2", "settings": {"chunk_size": 800, "chunk_overlap": 10, "no_chunks": false}}',
+            files=files,
+            db=in_memory_conn,
+            task_dispatcher=mock_task_dispatcher,
+            message_hub=mock_message_hub
+        )
+        args, kwargs = mock_task_dispatcher.add_task.call_args
+        uploads = args[3]
+        await FileImport().import_bulk(args[0], uploads, args[4], threading.Event())
+        cached_sources = [source for source, _ in cache.sources("bulk_test")]
+
+    # Assert
+    assert response == {"message": "Bulk import of 3 files started in the background."}
+    assert [file_name for file_name, _ in uploads] == ["docs.zip", "c.txt", "broken.pdf"]
+    assert "on_discard" in kwargs
+    assert not any(os.path.exists(file_path) for _, file_path in uploads)
+
+    stored = collection.get()
+    assert sorted(metadata["source"] for metadata in stored["metadatas"]) == ["c.txt", "docs.zip/a.txt", "docs.zip/sub/b.md"]
+    # The chunks of the three files share one embedding batch
+    assert embedder.embed.call_count == 1
+    logs = [call.args[2] for call in mock_message_hub.send_message.call_args_list if call.args[1].name == "LOG"]
+    assert any(log.startswith("FAILED import of broken.pdf") for log in logs)
+    # A text member that is not UTF-8 fails while it is chunked, and only that file is skipped
+    assert any(log.startswith("FAILED import of docs.zip/latin1.txt") for log in logs)
+    assert any(log.startswith("SUCCESSFUL bulk import of 3 files (2 failed)") for log in logs)
+
+    # The parsed text of every imported file is cached for rechunk
+    assert cached_sources == ["c.txt", "docs.zip/a.txt", "docs.zip/sub/b.md"]
+
+    cache.close()
+    cache_dir.cleanup()
+    chroma_client.delete_collection("bulk_test")
+    in_memory_conn.close()
+
+@pytest.mark.asyncio
+async def test_rechunk_rebuilds_chunks_from_cached_text():
+    """
+    Test that rechunk chunks an imported file again with new settings from its cached text,
+    after the uploaded file is gone, and replaces the chunks of the old settings.
+    """
+    # Arrange
+    import chromadb
+    import numpy as np
+    from app.internal.chunk_sync import content_hash, make_chunk_id
+    from app.models.import_context import ImportContext
+    from app.schemas.imports import Import
+    in_memory_conn = sqlite3.connect(":memory:", check_same_thread=False)
+    in_memory_conn.row_factory = sqlite3.Row
+    create_tables(in_memory_conn)
+
+    mock_message_hub = MagicMock()
+    embedder = MagicMock()
+    embedder.embed.side_effect = lambda documents: (np.array([float(len(d)), 1.0]) for d in documents)
+    chroma_client = chromadb.EphemeralClient()
+    collection = chroma_client.get_or_create_collection("rechunk_test")
+    cache = ParsedTextCache()
+    cache.close()
+    cache_dir = tempfile.TemporaryDirectory()
+
+    text = "alpha beta gamma delta epsilon zeta"
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".txt") as upload:
+        upload.write(text.encode("utf-8"))
+    import_params = '{{"name": "FILE", "model": "all-MiniLM-L6-v2", "settings": {{"chunk_size": {0}, "chunk_overlap": 0, "no_chunks": false}}}}'
+
+    with patch("app.models.imports.chroma_manager.get_or_create_collection", return_value=collection), \
+         patch("app.models.imports.EmbedderRegistry.get_dimension", return_value=2), \
+         patch("app.models.imports.FileImport.create_embedder", return_value=embedder), \
+         patch.object(cache, "path", cache_dir.name):
+        await FileImport().import_data("rechunk_test", "doc.txt", upload.name,
+                                       ImportContext(in_memory_conn, mock_message_hub, Import.model_validate_json(import_params.format(800))),
+                                       threading.Event())
+        assert collection.get()["ids"] == [make_chunk_id("doc.txt", content_hash(text))]
+        assert not os.path.exists(upload.name)
+
+        # Act
+        await FileImport().rechunk("rechunk_test",
+                                   ImportContext(in_memory_conn, mock_message_hub, Import.model_validate_json(import_params.format(12))),
+                                   threading.Event())
+
+    # Assert
+    stored = collection.get()
+    assert len(stored["ids"]) > 1
+    assert make_chunk_id("doc.txt", content_hash(text)) not in stored["ids"]
+    assert all(len(document) <= 12 for document in stored["documents"])
+    logs = [call.args[2] for call in mock_message_hub.send_message.call_args_list if call.args[1].name == "LOG"]
+    assert any(log.startswith("SUCCESSFUL rechunk of 1 files") for log in logs)
+
+    cache.close()
+    cache_dir.cleanup()
+    chroma_client.delete_collection("rechunk_test")
+    in_memory_conn.close()
+
+@pytest.mark.asyncio
+async def test_two_step_import_stages_compressed_text():
+    """
+    Test that step 1 stages the parsed text in the compressed staging store,
+    and that step 2 imports the staged text and removes it.
+    """
+    # Arrange
+    import chromadb
+    import numpy as np
+    from app.crud.crud_files import get_files_for_collection
+    from app.internal.staging_store import StagingStore, StagedText
+    from app.models.import_context import ImportContext
+    from app.schemas.imports import Import
+    in_memory_conn = sqlite3.connect(":memory:", check_same_thread=False)
+    in_memory_conn.row_factory = sqlite3.Row
+    create_tables(in_memory_conn)
+    in_memory_conn.execute("UPDATE settings SET value = 'true' WHERE name = 'TwoStepImport'")
+    in_memory_conn.execute("UPDATE settings SET value = 'false' WHERE name = 'ParsedTextCache'")
+
+    embedder = MagicMock()
+    embedder.embed.side_effect = lambda documents: (np.array([float(len(d)), 1.0]) for d in documents)
+    chroma_client = chromadb.EphemeralClient()
+    collection = chroma_client.get_or_create_collection("two_step_test")
+    staging_dir = tempfile.TemporaryDirectory()
+    store = StagingStore(staging_dir.name)
+
+    text = "staged text of the first step. " * 50
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".txt") as upload:
+        upload.write(text.encode("utf-8"))
+    context = ImportContext(in_memory_conn, MagicMock(), Import.model_validate_json(
+        '{"name": "FILE", "model": "all-MiniLM-L6-v2", "settings": {"chunk_size": 200, "chunk_overlap": 20, "no_chunks": false}}'))
+
+    with patch("app.models.imports.staging_store", store), \
+         patch("app.models.imports.chroma_manager.get_or_create_collection", return_value=collection), \
+         patch("app.models.imports.EmbedderRegistry.get_dimension", return_value=2), \
+         patch("app.models.imports.FileImport.create_embedder", return_value=embedder):
+        # Act
+        await FileImport().step_1("two_step_test", "doc.txt", upload.name, context, threading.Event())
+        staged_files = get_files_for_collection(in_memory_conn, "two_step_test")
+        with StagedText(staged_files[0].path) as staged:
+            staged_text = "".join(staged.iter_blocks())
+        usage = store.usage("two_step_test")
+        await FileImport().step_2("two_step_test", context, [staged_files[0].id], threading.Event())
+
+    # Assert
+    assert staged_text == text
+    assert usage[0] == 1 and usage[1] < len(text)
+    assert not os.path.exists(upload.name)
+    assert not os.path.exists(staged_files[0].path)
+    assert get_files_for_collection(in_memory_conn, "two_step_test") == []
+    assert {metadata["source"] for metadata in collection.get()["metadatas"]} == {"doc.txt"}
+
+    staging_dir.cleanup()
+    chroma_client.delete_collection("two_step_test")
+    in_memory_conn.close()
+
+@pytest.mark.asyncio
+async def test_step_2_reads_legacy_plain_staged_files():
+    """
+    Test that step 2 imports plain text files staged by an earlier version,
+    and reports and skips a staged file it cannot read.
+    """
+    # Arrange
+    import chromadb
+    import numpy as np
+    from app.crud.crud_files import create_file, get_files_for_collection
+    from app.models.import_context import ImportContext
+    from app.models.messages import MessageType
+    from app.schemas.imports import Import
+    in_memory_conn = sqlite3.connect(":memory:", check_same_thread=False)
+    in_memory_conn.row_factory = sqlite3.Row
+    create_tables(in_memory_conn)
+    in_memory_conn.execute("UPDATE settings SET value = 'true' WHERE name = 'TwoStepImport'")
+
+    embedder = MagicMock()
+    embedder.embed.side_effect = lambda documents: (np.array([float(len(d)), 1.0]) for d in documents)
+    chroma_client = chromadb.EphemeralClient()
+    collection = chroma_client.get_or_create_collection("legacy_stage_test")
+    message_hub = MagicMock()
+    context = ImportContext(in_memory_conn, message_hub, Import.model_validate_json(
+        '{"name": "FILE", "model": "all-MiniLM-L6-v2", "settings": {"chunk_size": 200, "chunk_overlap": 20, "no_chunks": false}}'))
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".txt") as broken:
+        broken.write(b"\xff\xfe not utf-8 \x80")
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".txt") as legacy:
+        legacy.write(("legacy staged text. " * 50).encode("utf-8"))
+    create_file(in_memory_conn, "legacy_stage_test", broken.name, "broken.txt")
+    create_file(in_memory_conn, "legacy_stage_test", legacy.name, "legacy.txt")
+    file_ids = [file.id for file in get_files_for_collection(in_memory_conn, "legacy_stage_test")]
+
+    with patch("app.models.imports.chroma_manager.get_or_create_collection", return_value=collection), \
+         patch("app.models.imports.EmbedderRegistry.get_dimension", return_value=2), \
+         patch("app.models.imports.FileImport.create_embedder", return_value=embedder):
+        # Act
+        await FileImport().step_2("legacy_stage_test", context, file_ids, threading.Event())
+
+    # Assert
+    messages = [call.args[2] for call in message_hub.send_message.call_args_list if call.args[1] == MessageType.LOG]
+    assert any(message.startswith("FAILED import of broken.txt") for message in messages)
+    assert {metadata["source"] for metadata in collection.get()["metadatas"]} == {"legacy.txt"}
+    assert get_files_for_collection(in_memory_conn, "legacy_stage_test") == []
+    assert not os.path.exists(broken.name) and not os.path.exists(legacy.name)
+
+    chroma_client.delete_collection("legacy_stage_test")
+    in_memory_conn.close()
+
+@pytest.mark.asyncio
+async def test_import_files_bulk_removes_spool_files_when_dispatch_fails():
+    """
+    Test that the uploads spooled by the bulk endpoint are removed when the task cannot be added.
+    """
+    # Arrange
+    in_memory_conn = sqlite3.connect(":memory:")
+    in_memory_conn.row_factory = sqlite3.Row
+    create_tables(in_memory_conn)
+    mock_crud_collection = MagicMock()
+    mock_crud_collection.get_collection.return_value = MagicMock(id="bulk_test", import_type="NONE")
+    mock_task_dispatcher = MagicMock()
+    mock_task_dispatcher.add_task.side_effect = RuntimeError("queue closed")
+    spooled = []
+    spool_upload = TempFileHelper.spool_upload
+
+    async def recording_spool(upload, name):
+        spooled.append(await spool_upload(upload, name))
+        return spooled[-1]
+
+    with patch("app.routers.imports.crud_collection", mock_crud_collection), \
+         patch("app.routers.imports.TempFileHelper.spool_upload", side_effect=recording_spool):
+        # Act
+        response = await import_files_bulk(
+            collection_id="bulk_test",
+            import_params='{"name": "FILE", "model": "all-MiniLM-L6-v2", "settings": {"chunk_size": 800, "chunk_overlap": 10, "no_chunks": false}}',
+            files=[UploadFile(filename="a.txt", file=io.BytesIO(b"alpha")), UploadFile(filename="b.txt", file=io.BytesIO(b"beta"))],
+            db=in_memory_conn,
+            task_dispatcher=mock_task_dispatcher,
+            message_hub=MagicMock()
+        )
+
+    # Assert
+    assert response.status_code == 500
+    assert len(spooled) == 2
+    assert not any(os.path.exists(path) for path in spooled)
+    in_memory_conn.close()
+
+@pytest.mark.asyncio
+async def test_import_file_removes_spool_file_when_dispatch_fails():
+    """
+    Test that the spooled upload is removed when the import task cannot be added.
+    """
+    # Arrange
+    in_memory_conn = sqlite3.connect(":memory:")
+    in_memory_conn.row_factory = sqlite3.Row
+    create_tables(in_memory_conn)
+    mock_crud_collection = MagicMock()
+    mock_crud_collection.get_collection.return_value = MagicMock(id="test_collection", import_type="NONE")
+    mock_task_dispatcher = MagicMock()
+    mock_task_dispatcher.add_task.side_effect = RuntimeError("queue closed")
+    spooled = []
+    spool_upload = TempFileHelper.spool_upload
+
+    async def recording_spool(upload, name):
+        spooled.append(await spool_upload(upload, name))
+        return spooled[-1]
+
+    with patch("app.routers.imports.crud_collection", mock_crud_collection), \
+         patch("app.routers.imports.TempFileHelper.spool_upload", side_effect=recording_spool):
+        # Act
+        response = await import_file(
+            collection_id="test_collection",
+            import_params='{"name": "FILE", "model": "all-MiniLM-L6-v2", "settings": {"chunk_size": 800, "chunk_overlap": 10, "no_chunks": false}}',
+            file=UploadFile(filename="a.txt", file=io.BytesIO(b"alpha")),
+            db=in_memory_conn,
+            task_dispatcher=mock_task_dispatcher,
+            message_hub=MagicMock()
+        )
+
+    # Assert
+    assert response.status_code == 500
+    assert len(spooled) == 1
+    assert not os.path.exists(spooled[0])
+    in_memory_conn.close()
+
+def test_use_collection_model_tells_the_user_when_the_requested_model_is_replaced():
+    """
+    Test that an import into a collection with data uses the collection's model,
+    and that a message says so only when the request asked for a different model.
+    """
+    # Arrange
+    from app.routers.imports import use_collection_model
+    from app.schemas.collection import ImportType
+    from app.schemas.imports import Import
+    from app.models.messages import MessageType
+    collection = MagicMock(import_type=ImportType.FILE, model="sentence-transformers/all-MiniLM-L6-v2")
+    other_model = Import.model_validate_json('{"name": "FILE", "model": "BAAI/bge-small-en-v1.5", "settings": {"chunk_size": 200, "chunk_overlap": 20, "no_chunks": false}}')
+    same_model = Import.model_validate_json('{"name": "FILE", "model": "all-MiniLM-L6-v2", "settings": {"chunk_size": 200, "chunk_overlap": 20, "no_chunks": false}}')
+    other_hub, same_hub = MagicMock(), MagicMock()
+
+    # Act
+    use_collection_model("test_collection", collection, other_model, other_hub)
+    use_collection_model("test_collection", collection, same_model, same_hub)
+
+    # Assert
+    assert other_model.model == same_model.model == "sentence-transformers/all-MiniLM-L6-v2"
+    other_hub.send_message.assert_called_once()
+    assert other_hub.send_message.call_args.args[:2] == ("test_collection", MessageType.INFO)
+    assert "BAAI/bge-small-en-v1.5 ignored" in other_hub.send_message.call_args.args[2]
+    same_hub.send_message.assert_not_called()
@@ -0,0 +1,47 @@
+from app.internal.near_duplicates import NearDuplicateIndex, simhash
+
+PAGE = (
+    "Installation guide. Download the package from the releases page and unpack it into a folder of your choice. "
+    "Run the installer with administrator rights and follow the steps of the wizard. When the installation is "
+    "finished, start the application and open the settings page to configure the database connection and the "
+    "embedding model used for new collections."
+)
+
+def test_simhash_is_stable_and_similarity_preserving():
+    edited = PAGE.replace("folder of your choice", "folder of your own choice")
+    other = "Release notes. Version 2 adds streaming imports, a new settings page and faster collection queries for large indexes."
+
+    assert simhash(PAGE) == simhash(PAGE)
+    assert (simhash(PAGE) ^ simhash(edited)).bit_count() <= 6
+    assert (simhash(PAGE) ^ simhash(other)).bit_count() > 10
+
+def test_index_drops_near_duplicates():
+    """
+    Test that versioned copies of a text are reported as duplicates, distinct texts are kept.
+    """
+    # Arrange
+    index = NearDuplicateIndex(6)
+
+    # Act
+    results = [
+        index.is_duplicate(PAGE),
+        index.is_duplicate(PAGE.replace("Installation guide.", "Installation guide (v2).")),
+        index.is_duplicate("Release notes. Version 2 adds streaming imports and faster collection queries."),
+        index.is_duplicate(PAGE),
+    ]
+
+    # Assert
+    assert results == [False, True, False, True]
+    assert (index.checked, index.dropped) == (4, 2)
+
+def test_zero_distance_drops_only_identical_fingerprints():
+    index = NearDuplicateIndex(0)
+
+    index.is_duplicate(PAGE)
+
+    assert index.is_duplicate(PAGE) is True
+    assert index.is_duplicate(PAGE.replace("Installation guide.", "Installation guide (v2).")) is False
+
+def test_distance_is_clamped():
+    assert NearDuplicateIndex(100).max_distance == 15
+    assert NearDuplicateIndex(-5).max_distance == 0
@@ -0,0 +1,117 @@
+import os
+import tempfile
+from unittest.mock import patch
+import pytest
+
+from app.internal.parsed_text_cache import ParsedTextCache
+
+
+@pytest.fixture
+def cache():
+    cache = ParsedTextCache()
+    cache.close()
+    with tempfile.TemporaryDirectory() as tmpdir, \
+         patch.object(cache, 'path', os.path.join(tmpdir, "parsed_text_cache")), \
+         patch.object(cache, 'max_size_bytes', cache.max_size_bytes):
+        yield cache
+        cache.close()
+
+def test_stored_text_is_read_back(cache):
+    """
+    Test that segments are passed through while they are cached, and read back as the same text.
+    """
+    # Arrange
+    segments = ["first page\r\n", "second page ", "ünïcode"]
+
+    # Act
+    passed = list(cache.store("col", "doc.pdf", "hash1", iter(segments)))
+    text_path = cache.get("col", "doc.pdf", "hash1")
+
+    # Assert
+    assert passed == segments
+    assert text_path is not None
+    assert "".join(cache.read(text_path)) == "".join(segments)
+    assert cache.get("col", "doc.pdf", "hash2") is None
+    assert cache.sources("col") == [("doc.pdf", text_path)]
+
+def test_stream_closed_early_is_not_cached(cache):
+    # Arrange
+    stream = cache.store("col", "doc.pdf", "hash1", iter(["a", "b", "c"]))
+
+    # Act
+    next(stream)
+    stream.close()
+
+    # Assert
+    assert cache.get("col", "doc.pdf", "hash1") is None
+    assert [name for name in os.listdir(cache._directory("col")) if name.endswith(".part")] == []
+
+def test_new_content_replaces_cached_text(cache):
+    # Arrange
+    list(cache.store("col", "doc.txt", "hash1", ["old text"]))
+    old_path = cache.get("col", "doc.txt", "hash1")
+
+    # Act
+    list(cache.store("col", "doc.txt", "hash2", ["new text"]))
+
+    # Assert
+    assert cache.get("col", "doc.txt", "hash1") is None
+    assert not os.path.exists(old_path)
+    assert "".join(cache.read(cache.get("col", "doc.txt", "hash2"))) == "new text"
+
+def test_delete_collection_removes_its_texts(cache):
+    # Arrange
+    list(cache.store("col", "doc.txt", "hash1", ["text"]))
+    list(cache.store("other", "doc.txt", "hash1", ["text"]))
+
+    # Act
+    cache.delete_collection("col")
+
+    # Assert
+    assert cache.sources("col") == []
+    assert not os.path.exists(cache._directory("col"))
+    assert len(cache.sources("other")) == 1
+
+def test_file_hash(tmp_path):
+    # Arrange
+    path = tmp_path / "a.bin"
+    path.write_bytes(b"content")
+
+    # Act / Assert
+    assert ParsedTextCache.file_hash(str(path)) == ParsedTextCache.file_hash(str(path))
+    assert len(ParsedTextCache.file_hash(str(path))) == 64
+
+def test_least_recently_used_texts_are_evicted(cache):
+    """
+    Test that storing a text beyond the size limit removes the least recently used texts and their files.
+    """
+    # Arrange
+    import random
+    rng = random.Random(0)
+    texts = {name: "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(20000)) for name in ("a", "b", "c")}
+    list(cache.store("col", "a.txt", "hash_a", [texts["a"]]))
+    list(cache.store("col", "b.txt", "hash_b", [texts["b"]]))
+    b_path = cache.get("col", "b.txt", "hash_b")
+    # a is used after b, so b is the least recently used text
+    cache.get("col", "a.txt", "hash_a")
+    cache.max_size_bytes = os.path.getsize(b_path) * 5 // 2
+
+    # Act
+    list(cache.store("col", "c.txt", "hash_c", [texts["c"]]))
+
+    # Assert
+    assert cache.get("col", "b.txt", "hash_b") is None
+    assert not os.path.exists(b_path)
+    assert "".join(cache.read(cache.get("col", "a.txt", "hash_a"))) == texts["a"]
+    assert "".join(cache.read(cache.get("col", "c.txt", "hash_c"))) == texts["c"]
+
+def test_configure_applies_a_lower_limit(cache):
+    # Arrange
+    list(cache.store("col", "a.txt", "hash_a", ["some text"]))
+
+    # Act
+    cache.configure(0)
+
+    # Assert
+    assert cache.get("col", "a.txt", "hash_a") is None
+    assert cache.sources("col") == []
@@ -0,0 +1,96 @@
+from typing import List
+from unittest.mock import MagicMock
+import pytest
+
+from app.internal import pdf_extractor
+from app.internal.pdf_extractor import extract_pdf_pages
+
+
+def make_pdf(page_texts: List[str]) -> bytes:
+    """Builds a PDF with one line of Helvetica text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    pdf += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return pdf
+
+@pytest.fixture
+def pages():
+    return [f"Text of page {number}" for number in range(7)]
+
+def test_pages_are_extracted_in_order_from_bytes(pages):
+    # Act
+    extracted = list(extract_pdf_pages(make_pdf(pages)))
+
+    # Assert
+    assert extracted == pages
+
+def test_pages_are_extracted_from_a_memory_mapped_file(pages, tmp_path):
+    # Arrange
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(make_pdf(pages))
+
+    # Act
+    extracted = list(extract_pdf_pages(str(path)))
+
+    # Assert
+    assert extracted == pages
+
+def test_page_ranges_are_extracted_by_worker_processes(pages, monkeypatch):
+    """
+    Test that a process pool extracts page ranges and the pages still come out in order.
+    """
+    # Arrange
+    monkeypatch.setattr(pdf_extractor, "PARALLEL_MIN_PAGES", 1)
+    monkeypatch.setattr(pdf_extractor, "PAGES_PER_TASK", 2)
+    executors = []
+    original_executor = pdf_extractor.ProcessPoolExecutor
+    def tracking_executor(*args, **kwargs):
+        executors.append(original_executor(*args, **kwargs))
+        return executors[-1]
+    monkeypatch.setattr(pdf_extractor, "ProcessPoolExecutor", tracking_executor)
+
+    # Act
+    extracted = list(extract_pdf_pages(make_pdf(pages), workers=2))
+
+    # Assert
+    assert extracted == pages
+    assert len(executors) == 1
+    assert executors[0]._max_workers == 2
+
+def test_small_pdfs_are_extracted_without_a_pool(pages, monkeypatch):
+    mock_executor = MagicMock()
+    monkeypatch.setattr(pdf_extractor, "ProcessPoolExecutor", mock_executor)
+
+    assert list(extract_pdf_pages(make_pdf(pages), workers=4)) == pages
+    mock_executor.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_file_import_streams_pdf_pages_joined_by_line_breaks(pages, tmp_path):
+    # Arrange
+    from app.models.imports import FileImport
+    message_hub = MagicMock()
+    path = tmp_path / "upload.pdf"
+    path.write_bytes(make_pdf(pages))
+
+    # Act
+    segments = await FileImport().prepare_segments("collection", "manual.pdf", str(path), message_hub)
+    text = await FileImport().prepare_data("collection", "manual.pdf", str(path), message_hub)
+
+    # Assert
+    assert "".join(segments) == "\n".join(pages)
+    assert text == "\n".join(pages)
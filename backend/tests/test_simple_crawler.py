@@ -1,65 +1,438 @@
+import asyncio
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import re
+import sqlite3
+import threading
+import time
 from threading import Event
-from app.internal.simple_crawler import simple_crawl
+from unittest.mock import patch
+import trafilatura
+from app.crud import crud_crawl_job
+from app.database import create_tables
+from app.internal.crawl_checkpoint import CrawlCheckpoint
+from app.internal.page_cache import PageCache
+from app.internal.simple_crawler import AsyncCrawler, crawl, parse_page, shutdown_extraction_pool, simple_crawl
 import pytest
-from unittest.mock import patch, MagicMock
+
+
+class LocalSite:
+    """Serves a dict of path -> html on localhost and records what was requested."""
+
+    def __init__(self, pages, delay=0.0, etags=None):
+        self.pages = pages
+        self.delay = delay
+        self.etags = etags or {}
+        self.requested = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with site._lock:
+                    site.requested.append(self.path)
+                    site.active += 1
+                    site.max_active = max(site.max_active, site.active)
+                try:
+                    time.sleep(site.delay)
+                    etag = site.etags.get(self.path)
+                    if etag and self.headers.get("If-None-Match") == etag:
+                        self.send_response(304)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    html = site.pages.get(self.path)
+                    body = (html or "Not found").encode("utf-8")
+                    self.send_response(200 if html is not None else 404)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    if etag:
+                        self.send_header("ETag", etag)
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with site._lock:
+                        site.active -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def page(text, links=()):
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return f"<html><body><p>{text}</p>{anchors}</body></html>"
 
 @pytest.fixture
-def mock_requests_get():
-    with patch('requests.get') as mock_get:
-        yield mock_get
-
-def mock_response(content, status_code=200):
-    mock = MagicMock()
-    mock.text = content
-    mock.status_code = status_code
-    mock.raise_for_status = MagicMock()
-    if status_code != 200:
-        mock.raise_for_status.side_effect = Exception("Failed")
-    return mock
-
-def test_simple_crawl_no_filter(mock_requests_get):
-    mock_requests_get.side_effect = [
-        mock_response('<html><body><a href="http://example.com/page2">Page 2</a></body></html>'),
-        mock_response('<html><body>Content of page 2</body></html>')
-    ]
-    
-    results = simple_crawl('http://example.com', Event(), None, max_depth=1)
-    
-    assert len(results) == 2
-    assert results[0]['url'] == 'http://example.com'
-    assert results[1]['url'] == 'http://example.com/page2'
-
-def test_simple_crawl_with_valid_filter(mock_requests_get):
-    mock_requests_get.side_effect = [
-        mock_response('<html><body><a href="http://example.com/page2">Page 2</a><a href="http://example.com/page3">Page 3</a></body></html>'),
-        mock_response('<html><body>Content of page 2</body></html>'),
-    ]
-
-    # Test case where start_url matches and it finds another matching url
-    results = simple_crawl('http://example.com', Event(), re.compile(r'http://example\.com/page2'), max_depth=1)
-    assert len(results) == 2
-    assert results[0]['url'] == 'http://example.com'
-    assert results[1]['url'] == 'http://example.com/page2'
-    
-
-def test_simple_crawl_with_invalid_filter(mock_requests_get):
-    mock_requests_get.side_effect = [
-        mock_response('<html><body><a href="http://example.com/page2">Page 2</a></body></html>'),
-        mock_response('<html><body>Content of page 2</body></html>')
-    ]
+def site():
+    pages = {
+        "/": page("Start page of the test site", ["/page2", "/page3#section", "http://other.example.com/x"]),
+        "/page2": page("Content of page 2", ["/page4"]),
+        "/page3": page("Content of page 3"),
+        "/page4": page("Content of page 4"),
+    }
+    with LocalSite(pages) as site:
+        yield site
+
+def urls(results, site):
+    return sorted(result["url"].replace(site.url, "") for result in results)
+
+def test_simple_crawl_no_filter(site):
+    results = simple_crawl(site.url + "/", Event(), None, max_depth=1)
+
+    assert results[0]["url"] == site.url + "/"
+    assert urls(results, site) == ["/", "/page2", "/page3"]
+    assert "/page4" not in site.requested
+
+def test_simple_crawl_follows_links_to_max_depth(site):
+    results = simple_crawl(site.url + "/", Event(), None, max_depth=2)
+
+    assert urls(results, site) == ["/", "/page2", "/page3", "/page4"]
+
+def test_simple_crawl_with_valid_filter(site):
+    results = simple_crawl(site.url + "/", Event(), re.compile(re.escape(site.url) + r"/page2"), max_depth=1)
+
+    assert urls(results, site) == ["/", "/page2"]
+    assert "/page3" not in site.requested
+
+def test_simple_crawl_with_invalid_filter(site):
     with pytest.raises(re.error):
-        simple_crawl('http://example.com', Event(), re.compile('*'), max_depth=1)
-
-
-def test_simple_crawl_empty_filter(mock_requests_get):
-    mock_requests_get.side_effect = [
-        mock_response('<html><body><a href="http://example.com/page2">Page 2</a></body></html>'),
-        mock_response('<html><body>Content of page 2</body></html>')
-    ]
-    
-    results = simple_crawl('http://example.com', Event(), re.compile(''), max_depth=1)
-    
-    assert len(results) == 2
-    assert results[0]['url'] == 'http://example.com'
-    assert results[1]['url'] == 'http://example.com/page2'
\ No newline at end of file
+        simple_crawl(site.url + "/", Event(), re.compile('*'), max_depth=1)
+
+def test_simple_crawl_empty_filter(site):
+    results = simple_crawl(site.url + "/", Event(), re.compile(''), max_depth=1)
+
+    assert urls(results, site) == ["/", "/page2", "/page3"]
+
+def test_simple_crawl_skips_failed_pages():
+    pages = {"/": page("Start page of the test site", ["/missing", "/ok"]), "/ok": page("Content of ok page")}
+    with LocalSite(pages) as site:
+        results = simple_crawl(site.url + "/", Event(), None, max_depth=1)
+
+    assert urls(results, site) == ["/", "/ok"]
+
+def test_simple_crawl_returns_none_when_cancelled(site):
+    cancel_event = Event()
+    cancel_event.set()
+
+    assert simple_crawl(site.url + "/", cancel_event, None, max_depth=1) is None
+
+def test_crawl_fetches_pages_concurrently_within_host_limit():
+    """
+    Test that slow pages are fetched in parallel, but never more than max_per_host at a time.
+    """
+    # Arrange
+    links = [f"/p{i}" for i in range(8)]
+    pages = {"/": page("Index of the slow site", links)}
+    pages.update({link: page(f"Content of slow page {link}") for link in links})
+
+    with LocalSite(pages, delay=0.2) as site:
+        crawler = AsyncCrawler(site.url + "/", Event(), None, max_depth=1, max_concurrency=8, max_per_host=4)
+
+        async def collect():
+            return [result async for result in crawler.pages()]
+
+        # Act
+        started = time.monotonic()
+        results = asyncio.run(collect())
+        elapsed = time.monotonic() - started
+
+    # Assert
+    assert len(results) == 9
+    assert site.max_active <= 4
+    assert site.max_active > 1
+    assert elapsed < 9 * 0.2
+
+def test_pages_can_be_consumed_as_a_stream(site):
+    """
+    Test that the consumer gets pages while the crawl is running and can stop it early.
+    """
+    async def first_page():
+        async for result in AsyncCrawler(site.url + "/", Event(), None, max_depth=2).pages():
+            return result
+
+    result = asyncio.run(first_page())
+
+    assert result["url"] == site.url + "/"
+
+def test_crawl_returns_all_pages(site):
+    results = asyncio.run(crawl(site.url + "/", Event(), None, max_depth=1))
+
+    assert len(results) == 3
+
+def test_parse_page_extracts_text_and_links_from_one_parse():
+    """
+    Test that text and links come from a single parse of the page.
+    """
+    # Arrange
+    html = page("Main content of the page", ["/a#top", "http://example.com/b", "/a"])
+
+    # Act
+    with patch('app.internal.simple_crawler.trafilatura.load_html', wraps=trafilatura.load_html) as mock_load_html:
+        text, links = parse_page("http://example.com/", html)
+
+    # Assert
+    mock_load_html.assert_called_once()
+    assert "Main content of the page" in text
+    assert links == ["http://example.com/a", "http://example.com/b"]
+
+def test_crawl_with_extraction_process_pool(site):
+    try:
+        results = asyncio.run(crawl(site.url + "/", Event(), None, max_depth=2, extraction_workers=1))
+    finally:
+        shutdown_extraction_pool()
+
+    assert urls(results, site) == ["/", "/page2", "/page3", "/page4"]
+
+@pytest.fixture
+def page_cache():
+    conn = sqlite3.connect(":memory:")
+    create_tables(conn)
+    yield PageCache(conn, "collection1", "settings")
+    conn.close()
+
+def crawl_with_cache(url, cache, use_sitemap=False):
+    crawler = AsyncCrawler(url, Event(), None, max_depth=1, page_cache=cache, use_sitemap=use_sitemap)
+
+    async def collect():
+        return [result async for result in crawler.pages()]
+
+    return asyncio.run(collect()), crawler
+
+def save_entries(results, cache):
+    for result in results:
+        cache.save(result["cache_entry"])
+
+def test_recrawl_skips_pages_not_modified(page_cache):
+    """
+    Test that a recrawl sends conditional requests and does not yield pages answered with 304.
+    """
+    # Arrange
+    pages = {"/": page("Start page of the test site", ["/page2"]), "/page2": page("Content of page 2")}
+    with LocalSite(pages, etags={"/": '"v1"', "/page2": '"v1"'}) as site:
+        first, _ = crawl_with_cache(site.url + "/", page_cache)
+        save_entries(first, page_cache)
+
+        # Act
+        second, crawler = crawl_with_cache(site.url + "/", page_cache)
+
+    # Assert
+    assert len(first) == 2
+    assert second == []
+    assert crawler.unchanged_pages == 2
+
+def test_recrawl_yields_only_changed_pages(page_cache):
+    """
+    Test that pages with the same body or the same extracted text are skipped, changed pages are yielded.
+    """
+    # Arrange
+    pages = {
+        "/": page("Start page of the test site", ["/same-text", "/changed"]),
+        "/same-text": page("Text that stays the same"),
+        "/changed": page("Old text of the page"),
+    }
+    with LocalSite(pages) as site:
+        first, _ = crawl_with_cache(site.url + "/", page_cache)
+        save_entries(first, page_cache)
+        pages["/same-text"] = "<html><head><title>New title</title></head><body><p>Text that stays the same</p></body></html>"
+        pages["/changed"] = page("New text of the page")
+
+        # Act
+        second, crawler = crawl_with_cache(site.url + "/", page_cache)
+
+    # Assert
+    assert urls(second, site) == ["/changed"]
+    assert "New text" in second[0]["text"]
+    assert crawler.unchanged_pages == 2
+
+def test_pages_not_saved_to_cache_are_crawled_again(page_cache):
+    pages = {"/": page("Start page of the test site")}
+    with LocalSite(pages, etags={"/": '"v1"'}) as site:
+        crawl_with_cache(site.url + "/", page_cache)
+
+        second, _ = crawl_with_cache(site.url + "/", page_cache)
+
+    assert len(second) == 1
+
+def test_cache_entries_of_other_import_settings_are_ignored(page_cache):
+    pages = {"/": page("Start page of the test site")}
+    with LocalSite(pages, etags={"/": '"v1"'}) as site:
+        first, _ = crawl_with_cache(site.url + "/", page_cache)
+        save_entries(first, page_cache)
+
+        second, _ = crawl_with_cache(site.url + "/", PageCache(page_cache.db, "collection1", "other settings"))
+
+    assert len(second) == 1
+
+def sitemap(site, paths, lastmod=None):
+    lastmod_tag = f"<lastmod>{lastmod}</lastmod>" if lastmod else ""
+    urls_xml = "".join(f"<url><loc>{site.url}{path}</loc>{lastmod_tag}</url>" for path in paths)
+    return f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls_xml}</urlset>'
+
+def test_crawl_seeds_frontier_from_sitemap():
+    """
+    Test that sitemap pages are crawled without following links, and the regex filter applies before fetching.
+    """
+    # Arrange
+    pages = {
+        "/": page("Start page of the test site", ["/linked"]),
+        "/linked": page("Only reachable through a link"),
+        "/docs/one": page("Documentation page one"),
+        "/docs/two": page("Documentation page two"),
+        "/blog/post": page("A blog post"),
+    }
+    with LocalSite(pages) as site:
+        pages["/robots.txt"] = f"User-agent: *\nSitemap: {site.url}/sitemap_index.xml\n"
+        pages["/sitemap_index.xml"] = f'<sitemapindex><sitemap><loc>{site.url}/sitemap-pages.xml</loc></sitemap></sitemapindex>'
+        pages["/sitemap-pages.xml"] = sitemap(site, ["/docs/one", "/docs/two", "/blog/post"])
+        crawler = AsyncCrawler(site.url + "/", Event(), re.compile(re.escape(site.url) + "/docs"), max_depth=2, use_sitemap=True)
+
+        async def collect():
+            return [result async for result in crawler.pages()]
+
+        # Act
+        results = asyncio.run(collect())
+
+    # Assert
+    assert urls(results, site) == ["/", "/docs/one", "/docs/two"]
+    assert crawler.sitemap_pages == 2
+    assert "/blog/post" not in site.requested
+    assert "/linked" not in site.requested
+
+def test_crawl_without_sitemap_follows_links():
+    pages = {"/": page("Start page of the test site", ["/linked"]), "/linked": page("Only reachable through a link")}
+    with LocalSite(pages) as site:
+        results = asyncio.run(crawl(site.url + "/", Event(), None, max_depth=1, use_sitemap=True))
+
+    assert urls(results, site) == ["/", "/linked"]
+
+def test_recrawl_skips_sitemap_pages_not_modified_since_last_fetch(page_cache):
+    # Arrange
+    pages = {"/": page("Start page of the test site"), "/old": page("Old page"), "/new": page("Page edited after the crawl")}
+    with LocalSite(pages) as site:
+        pages["/sitemap.xml"] = sitemap(site, ["/old", "/new"])
+        first, _ = crawl_with_cache(site.url + "/", page_cache, use_sitemap=True)
+        save_entries(first, page_cache)
+        pages["/sitemap.xml"] = (f'<?xml version="1.0"?><urlset><url><loc>{site.url}/old</loc><lastmod>2000-01-01</lastmod></url>'
+                                 f'<url><loc>{site.url}/new</loc><lastmod>2999-01-01</lastmod></url></urlset>')
+        pages["/new"] = page("Page edited after the crawl, new text")
+        site.requested.clear()
+
+        # Act
+        second, crawler = crawl_with_cache(site.url + "/", page_cache, use_sitemap=True)
+
+    # Assert
+    assert "/old" not in site.requested
+    assert urls(second, site) == ["/new"]
+
+def test_recrawl_fetches_sitemap_pages_modified_on_the_day_they_were_fetched(page_cache):
+    """
+    Test that a date-only lastmod equal to the day of the last fetch does not mark the page unchanged.
+    """
+    # Arrange
+    pages = {"/": page("Start page of the test site"), "/edited": page("Page edited later the same day")}
+    with LocalSite(pages) as site:
+        pages["/sitemap.xml"] = sitemap(site, ["/edited"])
+        first, _ = crawl_with_cache(site.url + "/", page_cache, use_sitemap=True)
+        save_entries(first, page_cache)
+        pages["/sitemap.xml"] = sitemap(site, ["/edited"], lastmod=datetime.now(timezone.utc).date().isoformat())
+        pages["/edited"] = page("Page edited later the same day, new text")
+        site.requested.clear()
+
+        # Act
+        second, _ = crawl_with_cache(site.url + "/", page_cache, use_sitemap=True)
+
+    # Assert
+    assert "/edited" in site.requested
+    assert urls(second, site) == ["/edited"]
+
+@pytest.fixture
+def checkpoint():
+    conn = sqlite3.connect(":memory:")
+    create_tables(conn)
+    crud_crawl_job.create_job(conn, "job1", "collection1", "http://example.com", "{}")
+    yield CrawlCheckpoint(conn, "job1")
+    conn.close()
+
+def test_interrupted_crawl_resumes_from_checkpoint(site, checkpoint):
+    """
+    Test that a crawl cancelled after the first stored page continues with the pending pages only.
+    """
+    # Arrange
+    cancel_event = Event()
+
+    async def first_run():
+        async for result in AsyncCrawler(site.url + "/", cancel_event, None, max_depth=2, checkpoint=checkpoint).pages():
+            checkpoint.done(result["url"], indexed=True)
+            cancel_event.set()
+            return result
+
+    stored = asyncio.run(first_run())
+    site.requested.clear()
+    crawler = AsyncCrawler(site.url + "/", Event(), None, max_depth=2, checkpoint=checkpoint)
+
+    async def second_run():
+        return [result async for result in crawler.pages()]
+
+    # Act
+    results = asyncio.run(second_run())
+
+    # Assert
+    assert stored["url"] == site.url + "/"
+    assert "/" not in site.requested
+    assert urls(results, site) == ["/page2", "/page3", "/page4"]
+    assert crawler.resumed_pages == 1
+
+def test_checkpoint_marks_pages_without_text_done(checkpoint):
+    pages = {"/": page("Start page of the test site", ["/empty"]), "/empty": "<html><body></body></html>"}
+    with LocalSite(pages) as site:
+        async def collect():
+            return [result async for result in AsyncCrawler(site.url + "/", Event(), None, max_depth=1, checkpoint=checkpoint).pages()]
+        asyncio.run(collect())
+
+    visited, queued = checkpoint.restore()
+    assert visited == {site.url + "/", site.url + "/empty"}
+    assert [url for url, _, _ in queued] == [site.url + "/"]
+
+def test_crawl_skips_near_duplicate_pages():
+    """
+    Test that a print view of a page is not yielded, while its links are still followed.
+    """
+    # Arrange
+    from app.internal.near_duplicates import NearDuplicateIndex
+    article = ("Installation guide. Download the package from the releases page and unpack it into a folder of your choice. "
+               "Run the installer with administrator rights and follow the steps of the wizard. When the installation is "
+               "finished, start the application and open the settings page to configure the database connection.")
+    pages = {
+        "/": page("Start page of the test site", ["/install", "/install?print=1"]),
+        "/install": page(article),
+        "/install?print=1": page(article, ["/faq"]),
+        "/faq": page("Frequently asked questions about licensing and support."),
+    }
+    with LocalSite(pages) as site:
+        crawler = AsyncCrawler(site.url + "/", Event(), None, max_depth=2, max_concurrency=1, near_duplicates=NearDuplicateIndex(6))
+
+        async def collect():
+            return [result async for result in crawler.pages()]
+
+        # Act
+        results = asyncio.run(collect())
+
+    # Assert
+    assert urls(results, site) == ["/", "/faq", "/install"]
+    assert crawler.near_duplicate_pages == 1
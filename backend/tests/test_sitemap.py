@@ -0,0 +1,56 @@
+from datetime import datetime, timezone
+import gzip
+
+from app.internal.sitemap import parse_lastmod, parse_robots_sitemaps, parse_sitemap
+
+URLSET = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://example.com/a</loc><lastmod>2024-05-01</lastmod></url>
+  <url><loc> https://example.com/b </loc></url>
+</urlset>"""
+
+SITEMAP_INDEX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>https://example.com/sitemap-docs.xml</loc></sitemap>
+  <sitemap><loc>https://example.com/sitemap-blog.xml.gz</loc></sitemap>
+</sitemapindex>"""
+
+def test_parse_sitemap_urlset():
+    nested, entries = parse_sitemap(URLSET)
+
+    assert nested == []
+    assert entries == [
+        ("https://example.com/a", datetime(2024, 5, 1, 23, 59, 59, 999999, tzinfo=timezone.utc)),
+        ("https://example.com/b", None),
+    ]
+
+def test_parse_sitemap_index():
+    nested, entries = parse_sitemap(SITEMAP_INDEX)
+
+    assert nested == ["https://example.com/sitemap-docs.xml", "https://example.com/sitemap-blog.xml.gz"]
+    assert entries == []
+
+def test_parse_gzipped_sitemap():
+    _, entries = parse_sitemap(gzip.compress(URLSET))
+
+    assert len(entries) == 2
+
+def test_parse_invalid_sitemap():
+    assert parse_sitemap(b"<html><body>Not a sitemap</body></html>") == ([], [])
+    assert parse_sitemap(b"") == ([], [])
+
+def test_parse_robots_sitemaps():
+    robots = "User-agent: *\nDisallow: /private\nSitemap: https://example.com/sitemap.xml\nsitemap: /other.xml\n"
+
+    assert parse_robots_sitemaps(robots, "https://example.com") == [
+        "https://example.com/sitemap.xml",
+        "https://example.com/other.xml",
+    ]
+
+def test_parse_lastmod_formats():
+    assert parse_lastmod("2024-05-01T12:00:00+02:00") == datetime(2024, 5, 1, 10, 0, tzinfo=timezone.utc)
+    assert parse_lastmod("2024-05-01T10:00:00Z") == datetime(2024, 5, 1, 10, 0, tzinfo=timezone.utc)
+    assert parse_lastmod("2024-05-01 10:00:00") == datetime(2024, 5, 1, 10, 0, tzinfo=timezone.utc)
+    assert parse_lastmod("2024-05-01") == datetime(2024, 5, 1, 23, 59, 59, 999999, tzinfo=timezone.utc)
+    assert parse_lastmod("yesterday") is None
+    assert parse_lastmod(None) is None
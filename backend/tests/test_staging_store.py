@@ -0,0 +1,122 @@
+import os
+import pytest
+
+from app.internal import staging_store as staging_module
+from app.internal.staging_store import StagingStore, StagedText
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(staging_module, "STAGING_BLOCK_CHARS", 100)
+    return StagingStore(str(tmp_path / "staging"))
+
+@pytest.fixture
+def text():
+    return "".join(f"Line {i}: staged préview text with ünicode.\n" for i in range(200))
+
+def test_staged_text_is_read_back(store, text):
+    """
+    Test that a text staged from segments of any size is read back unchanged, block by block.
+    """
+    # Arrange
+    segments = [text[:7], text[7:350], text[350:]]
+
+    # Act
+    path = store.save("col", segments)
+
+    # Assert
+    with store.open(path) as staged:
+        blocks = list(staged.iter_blocks())
+        assert "".join(blocks) == text
+        assert len(staged) == len(text)
+        assert all(len(block) == 100 for block in blocks[:-1])
+
+def test_read_decompresses_only_the_spanned_blocks(store, text, monkeypatch):
+    # Arrange
+    path = store.save("col", [text])
+    staged = StagedText(path)
+    decompressed = []
+    block = staged.block
+    monkeypatch.setattr(staged, "block", lambda index: decompressed.append(index) or block(index))
+
+    # Act
+    part = staged.read(250, 420)
+
+    # Assert
+    assert part == text[250:420]
+    assert decompressed == [2, 3, 4]
+    assert staged.read(len(text) - 5, len(text) + 50) == text[-5:]
+    assert staged.read(10, 10) == ""
+    staged.close()
+
+def test_staged_text_is_compressed(store, text):
+    # Act
+    path = store.save("col", [text])
+
+    # Assert
+    assert os.path.getsize(path) < len(text.encode("utf-8"))
+
+def test_empty_text(store):
+    # Act
+    path = store.save("col", [])
+
+    # Assert
+    with store.open(path) as staged:
+        assert len(staged) == 0
+        assert list(staged.iter_blocks()) == []
+        assert staged.read(0, 10) == ""
+
+def test_usage_is_counted_per_collection(store, text):
+    # Arrange
+    first = store.save("col", [text])
+    store.save("col", ["short"])
+    store.save("other", [text])
+
+    # Act
+    files, stored_bytes, text_chars = store.usage("col")
+
+    # Assert
+    assert files == 2
+    assert text_chars == len(text) + len("short")
+    assert stored_bytes >= os.path.getsize(first)
+    assert store.usage("missing") == (0, 0, 0)
+
+def test_plain_text_file_is_rejected(tmp_path):
+    # Arrange
+    path = tmp_path / "plain.txt"
+    path.write_text("not staged", encoding="utf-8")
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        StagedText(str(path))
+    with pytest.raises(FileNotFoundError):
+        StagedText(str(tmp_path / "missing.stg"))
+
+def test_plain_text_file_staged_by_an_earlier_version_is_converted(store, tmp_path, text):
+    """
+    Test that opening a plain text file from an earlier version stages it in place, keeping the text unchanged.
+    """
+    # Arrange
+    path = tmp_path / "legacy.txt"
+    legacy_text = text.replace("\n", "\r\n")
+    path.write_bytes(legacy_text.encode("utf-8"))
+
+    # Act
+    with store.open(str(path)) as staged:
+        read_back = "".join(staged.iter_blocks())
+
+    # Assert
+    assert read_back == legacy_text
+    assert staging_module.is_staged(str(path))
+    assert [entry.name for entry in tmp_path.iterdir()] == ["legacy.txt"]
+
+def test_file_that_is_not_text_is_rejected(store, tmp_path):
+    # Arrange
+    path = tmp_path / "binary.txt"
+    path.write_bytes(b"\xff\xfe not utf-8 \x80")
+
+    # Act / Assert
+    with pytest.raises(ValueError):
+        store.open(str(path))
+    assert path.read_bytes() == b"\xff\xfe not utf-8 \x80"
+    assert [entry.name for entry in tmp_path.iterdir()] == ["binary.txt"]
@@ -111,3 +111,88 @@ def test_get_temp_file_content(tmp_path):
     
     with pytest.raises(FileNotFoundError):
         TempFileHelper.get_temp_file_content(str(non_existent_file))
+
+def test_read_blocks_streams_the_file(tmp_path):
+    """
+    Test that read_blocks yields the rest of an open file in blocks of at most block_size characters.
+    """
+    # Arrange
+    test_content = "line one\nline two\n" * 10
+    test_file = tmp_path / "streamed.txt"
+    test_file.write_text(test_content, encoding='utf-8')
+
+    # Act
+    with open(test_file, 'r', encoding='utf-8') as f:
+        small_blocks = list(TempFileHelper.read_blocks(f, 7))
+
+    # Assert
+    assert "".join(small_blocks) == test_content
+    assert all(len(block) <= 7 for block in small_blocks)
+
+@pytest.mark.asyncio
+async def test_spool_upload_streams_the_upload_in_blocks():
+    """
+    Test that an upload is copied to a temporary file block by block, keeping its extension.
+    """
+    # Arrange
+    import io
+    from fastapi import UploadFile
+    content = b"uploaded bytes " * 100
+    upload = UploadFile(filename="big.txt", file=io.BytesIO(content))
+    read_sizes = []
+    original_read = upload.read
+    async def tracking_read(size=-1):
+        read_sizes.append(size)
+        return await original_read(size)
+    upload.read = tracking_read
+
+    # Act
+    path = await TempFileHelper.spool_upload(upload, "big.txt", block_size=256)
+
+    # Assert
+    try:
+        assert path.endswith(".txt")
+        assert Path(path).read_bytes() == content
+        assert set(read_sizes) == {256}
+    finally:
+        TempFileHelper.remove_temp(path)
+
+@pytest.mark.asyncio
+async def test_spool_upload_removes_the_spool_file_on_error(monkeypatch, tmp_path):
+    # Arrange
+    import tempfile
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    upload = mock.MagicMock()
+    upload.read = mock.AsyncMock(side_effect=[b"first block", IOError("connection reset")])
+
+    # Act / Assert
+    with pytest.raises(IOError):
+        await TempFileHelper.spool_upload(upload, "broken.pdf")
+    assert list(tmp_path.iterdir()) == []
+
+@pytest.mark.asyncio
+async def test_spool_upload_writes_off_the_event_loop():
+    """
+    Test that the spool file is created, written and closed in worker threads, not on the event loop.
+    """
+    # Arrange
+    import asyncio
+    import io
+    from fastapi import UploadFile
+    upload = UploadFile(filename="big.txt", file=io.BytesIO(b"x" * 1000))
+    to_thread = asyncio.to_thread
+    offloaded = []
+    async def recording_to_thread(func, *args, **kwargs):
+        offloaded.append(getattr(func, "__name__", repr(func)))
+        return await to_thread(func, *args, **kwargs)
+
+    # Act
+    with mock.patch("app.internal.temp_file_helper.asyncio.to_thread", side_effect=recording_to_thread):
+        path = await TempFileHelper.spool_upload(upload, "big.txt", block_size=400)
+
+    # Assert
+    try:
+        assert offloaded == ["NamedTemporaryFile", "write", "write", "write", "close"]
+        assert Path(path).read_bytes() == b"x" * 1000
+    finally:
+        TempFileHelper.remove_temp(path)
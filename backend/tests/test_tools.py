@@ -114,9 +114,9 @@ class TestAddFactTool:
     @patch('app.internal.tools.get_db_connection')
     @patch('app.internal.tools.get_collection_by_name')
     @patch('app.internal.tools.create_collection')
-    @patch('app.internal.tools.chromadb.PersistentClient')
+    @patch('app.internal.tools.chroma_manager')
     @patch('app.internal.tools.get_embedder')
-    def test_add_fact_success(self, mock_get_embedder, mock_chroma_client, mock_create_collection, mock_get_collection_by_name, mock_get_db, captured_tools):
+    def test_add_fact_success(self, mock_get_embedder, mock_chroma_manager, mock_create_collection, mock_get_collection_by_name, mock_get_db, captured_tools):
         # Arrange
         add_fact_func = captured_tools['add_fact']
         mock_get_collection_by_name.return_value = None # Simulate collection missing
@@ -125,7 +125,7 @@ class TestAddFactTool:
         mock_get_db.return_value.__enter__.return_value = mock_db
         
         mock_collection = MagicMock()
-        mock_chroma_client.return_value.get_collection.return_value = mock_collection
+        mock_chroma_manager.get_collection.return_value = mock_collection
         
         mock_embedder = MagicMock()
         mock_get_embedder.return_value = mock_embedder
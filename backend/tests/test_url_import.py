@@ -1,14 +1,36 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
 import unittest
 from unittest.mock import MagicMock, patch
 from threading import Event
+from app.crud import crud_crawl_job
+from app.database import create_tables
 from app.models.url_import import UrlImport
+from app.schemas.crawl_job import CrawlJobStatus
 from app.schemas.setting import SettingsName
 from app.models.import_context import ImportContext
+from app.models.messages import MessageType
 
 class TestUrlImport(unittest.TestCase):
 
-    @patch('app.models.url_import.simple_crawler.simple_crawl')
-    def test_import_data_with_valid_crawl_depth(self, mock_simple_crawl):
+    def setUp(self):
+        # Crawl jobs and the page cache go to a temporary database instead of ragatouille.db
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        db_path = os.path.join(tmpdir.name, "test.db")
+        self.db = sqlite3.connect(db_path)
+        self.addCleanup(self.db.close)
+        create_tables(self.db)
+        db_patcher = patch('app.models.url_import.get_db_connection', side_effect=lambda: sqlite3.connect(db_path, check_same_thread=False))
+        db_patcher.start()
+        self.addCleanup(db_patcher.stop)
+
+    @patch.object(UrlImport, 'create_embedder')
+    @patch('app.models.url_import.simple_crawler.AsyncCrawler')
+    def test_import_data_with_valid_crawl_depth(self, mock_crawl, mock_create_embedder):
         # Arrange
         url_import = UrlImport()
         context = self._create_mock_context('2')
@@ -16,16 +38,17 @@ class TestUrlImport(unittest.TestCase):
 
         # Act
         async def run_test():
-            await url_import.import_data('collection1', 'http://example.com', b'', context, cancel_event)
+            await url_import.import_data('collection1', 'http://example.com', '', context, cancel_event)
         
         import asyncio
         asyncio.run(run_test())
 
         # Assert
-        mock_simple_crawl.assert_called_with('http://example.com', cancel_event, unittest.mock.ANY, max_depth=2)
+        mock_crawl.assert_called_with('http://example.com', cancel_event, unittest.mock.ANY, max_depth=2, extraction_workers=unittest.mock.ANY, page_cache=unittest.mock.ANY, use_sitemap=unittest.mock.ANY, checkpoint=unittest.mock.ANY, near_duplicates=unittest.mock.ANY)
 
-    @patch('app.models.url_import.simple_crawler.simple_crawl')
-    def test_import_data_with_invalid_crawl_depth(self, mock_simple_crawl):
+    @patch.object(UrlImport, 'create_embedder')
+    @patch('app.models.url_import.simple_crawler.AsyncCrawler')
+    def test_import_data_with_invalid_crawl_depth(self, mock_crawl, mock_create_embedder):
         # Arrange
         url_import = UrlImport()
         context = self._create_mock_context('invalid')
@@ -33,16 +56,17 @@ class TestUrlImport(unittest.TestCase):
 
         # Act
         async def run_test():
-            await url_import.import_data('collection1', 'http://example.com', b'', context, cancel_event)
+            await url_import.import_data('collection1', 'http://example.com', '', context, cancel_event)
         
         import asyncio
         asyncio.run(run_test())
 
         # Assert
-        mock_simple_crawl.assert_called_with('http://example.com', cancel_event, unittest.mock.ANY, max_depth=1)
+        mock_crawl.assert_called_with('http://example.com', cancel_event, unittest.mock.ANY, max_depth=1, extraction_workers=unittest.mock.ANY, page_cache=unittest.mock.ANY, use_sitemap=unittest.mock.ANY, checkpoint=unittest.mock.ANY, near_duplicates=unittest.mock.ANY)
 
-    @patch('app.models.url_import.simple_crawler.simple_crawl')
-    def test_import_data_with_missing_crawl_depth(self, mock_simple_crawl):
+    @patch.object(UrlImport, 'create_embedder')
+    @patch('app.models.url_import.simple_crawler.AsyncCrawler')
+    def test_import_data_with_missing_crawl_depth(self, mock_crawl, mock_create_embedder):
         # Arrange
         url_import = UrlImport()
         context = self._create_mock_context(None)
@@ -50,16 +74,16 @@ class TestUrlImport(unittest.TestCase):
 
         # Act
         async def run_test():
-            await url_import.import_data('collection1', 'http://example.com', b'', context, cancel_event)
+            await url_import.import_data('collection1', 'http://example.com', '', context, cancel_event)
         
         import asyncio
         asyncio.run(run_test())
 
         # Assert
-        mock_simple_crawl.assert_called_with('http://example.com', cancel_event, unittest.mock.ANY, max_depth=1)
+        mock_crawl.assert_called_with('http://example.com', cancel_event, unittest.mock.ANY, max_depth=1, extraction_workers=unittest.mock.ANY, page_cache=unittest.mock.ANY, use_sitemap=unittest.mock.ANY, checkpoint=unittest.mock.ANY, near_duplicates=unittest.mock.ANY)
 
-    @patch('app.models.url_import.simple_crawler.simple_crawl')
-    def test_step_1_with_valid_crawl_depth(self, mock_simple_crawl):
+    @patch('app.models.url_import.simple_crawler.crawl')
+    def test_step_1_with_valid_crawl_depth(self, mock_crawl):
         # Arrange
         url_import = UrlImport()
         context = self._create_mock_context('3', two_step_import='True')
@@ -73,7 +97,210 @@ class TestUrlImport(unittest.TestCase):
         asyncio.run(run_test())
 
         # Assert
-        mock_simple_crawl.assert_called_with('http://example.com', cancel_event, unittest.mock.ANY, max_depth=3)
+        mock_crawl.assert_called_with('http://example.com', cancel_event, unittest.mock.ANY, max_depth=3, extraction_workers=unittest.mock.ANY, use_sitemap=unittest.mock.ANY, near_duplicates=unittest.mock.ANY)
+
+    @patch('app.models.url_import.EmbedderRegistry')
+    @patch('app.models.url_import.chroma_manager')
+    @patch('app.models.url_import.ChunkSync')
+    @patch.object(UrlImport, 'create_embedder')
+    @patch('app.models.url_import.simple_crawler.AsyncCrawler')
+    def test_import_data_indexes_pages_while_crawling(self, mock_crawler_class, mock_create_embedder, mock_chunk_sync, mock_chroma_manager, mock_registry):
+        # Arrange
+        first_page_indexed = threading.Event()
+        indexed_sources = []
+
+        def sync_for(db, collection, collection_id, source):
+            sync = MagicMock()
+            def run(*args, **kwargs):
+                indexed_sources.append(source)
+                first_page_indexed.set()
+                return MagicMock(completed=True)
+            sync.run.side_effect = run
+            return sync
+        mock_chunk_sync.side_effect = sync_for
+        mock_registry.return_value.get_dimension.return_value = 384
+
+        crawl_state = {}
+        async def pages():
+            yield {"url": "http://example.com", "text": "first page"}
+            # The first page must reach the collection before the crawl yields the next one
+            crawl_state["indexed_before_crawl_continued"] = await asyncio.to_thread(first_page_indexed.wait, 5)
+            yield {"url": "http://example.com/skip", "text": "filtered page"}
+            yield {"url": "http://example.com/2", "text": "second page"}
+        mock_crawler_class.return_value.pages = pages
+
+        url_import = UrlImport()
+        context = self._create_mock_context('1')
+        context.parameters.settings.filter = r"http://example\.com(/2)?$"
+        context.parameters.settings.no_chunks = True
+        context.parameters.settings.chunk_size = 800
+        context.db = MagicMock()
+
+        # Act
+        asyncio.run(url_import.import_data('collection1', 'http://example.com', '', context, Event()))
+
+        # Assert
+        self.assertTrue(crawl_state["indexed_before_crawl_continued"])
+        self.assertEqual(indexed_sources, ["http://example.com", "http://example.com/2"])
+        context.messageHub.send_message.assert_any_call('collection1', MessageType.UNLOCK, "Import of http://example.com completed.")
+
+    @patch.object(UrlImport, 'create_embedder')
+    @patch('app.models.url_import.simple_crawler.AsyncCrawler')
+    def test_import_data_reports_cancellation(self, mock_crawler_class, mock_create_embedder):
+        # Arrange
+        cancel_event = Event()
+        async def pages():
+            cancel_event.set()
+            yield {"url": "http://example.com", "text": "first page"}
+        mock_crawler_class.return_value.pages = pages
+        url_import = UrlImport()
+        context = self._create_mock_context('1')
+
+        # Act
+        asyncio.run(url_import.import_data('collection1', 'http://example.com', '', context, cancel_event))
+
+        # Assert
+        context.messageHub.send_message.assert_any_call('collection1', MessageType.UNLOCK, "Import of http://example.com was cancelled")
+
+    @patch.object(UrlImport, 'create_embedder')
+    @patch('app.models.url_import.simple_crawler.AsyncCrawler')
+    def test_import_data_keeps_interrupted_crawl_job(self, mock_crawler_class, mock_create_embedder):
+        # Arrange
+        cancel_event = Event()
+        async def pages():
+            cancel_event.set()
+            yield {"url": "http://example.com", "text": "first page"}
+        mock_crawler_class.return_value.pages = pages
+
+        # Act
+        asyncio.run(UrlImport().import_data('collection1', 'http://example.com', '', self._create_mock_context('1'), cancel_event))
+        job = crud_crawl_job.get_jobs_for_collection(self.db, 'collection1')[0]
+        asyncio.run(UrlImport().import_data('collection1', 'http://example.com', '', self._create_mock_context('1'), Event(), job_id=job.id))
+
+        # Assert
+        self.assertEqual(job.status, CrawlJobStatus.INTERRUPTED)
+        self.assertEqual(mock_crawler_class.call_args.kwargs['checkpoint'].job_id, job.id)
+        self.assertEqual(crud_crawl_job.get_jobs_for_collection(self.db, 'collection1'), [])
+
+    @patch('app.models.url_import.get_db_connection')
+    @patch('app.models.url_import.PageCache')
+    @patch('app.models.url_import.EmbedderRegistry')
+    @patch('app.models.url_import.chroma_manager')
+    @patch('app.models.url_import.ChunkSync')
+    @patch.object(UrlImport, 'create_embedder')
+    @patch('app.models.url_import.simple_crawler.AsyncCrawler')
+    def test_import_data_caches_only_stored_pages(self, mock_crawler_class, mock_create_embedder, mock_chunk_sync, mock_chroma_manager, mock_registry, mock_page_cache_class, mock_get_db_connection):
+        # Arrange
+        def sync_for(db, collection, collection_id, source):
+            sync = MagicMock()
+            if source.endswith("/broken"):
+                sync.run.side_effect = RuntimeError("embedding failed")
+            else:
+                sync.run.return_value = MagicMock(completed=True)
+            return sync
+        mock_chunk_sync.side_effect = sync_for
+        mock_registry.return_value.get_dimension.return_value = 384
+
+        async def pages():
+            yield {"url": "http://example.com", "text": "first page", "cache_entry": "entry-ok"}
+            yield {"url": "http://example.com/broken", "text": "second page", "cache_entry": "entry-broken"}
+        mock_crawler_class.return_value.pages = pages
+        mock_crawler_class.return_value.unchanged_pages = 0
+
+        context = self._create_mock_context('1')
+        context.parameters.settings.no_chunks = True
+        context.parameters.settings.chunk_size = 800
+        context.db = MagicMock()
+
+        # Act
+        asyncio.run(UrlImport().import_data('collection1', 'http://example.com', '', context, Event()))
+
+        # Assert
+        mock_page_cache_class.return_value.save.assert_called_once_with("entry-ok")
+        mock_get_db_connection.return_value.close.assert_called_once()
+
+    @patch('app.models.url_import.PageCache')
+    @patch('app.models.url_import.EmbedderRegistry')
+    @patch('app.models.url_import.chroma_manager')
+    @patch('app.models.url_import.ChunkSync')
+    @patch.object(UrlImport, 'create_embedder')
+    @patch('app.models.url_import.simple_crawler.AsyncCrawler')
+    def test_import_data_skips_pages_whose_indexing_fails(self, mock_crawler_class, mock_create_embedder, mock_chunk_sync, mock_chroma_manager, mock_registry, mock_page_cache_class):
+        """
+        Test that a page failing after it was embedded (e.g. in the page cache) is reported and the crawl goes on.
+        """
+        # Arrange
+        mock_chunk_sync.return_value.run.return_value = MagicMock(completed=True)
+        mock_registry.return_value.get_dimension.return_value = 384
+        def save(entry):
+            if entry == "entry-broken":
+                raise sqlite3.OperationalError("database is locked")
+        mock_page_cache_class.return_value.save.side_effect = save
+
+        async def pages():
+            for i in range(40):
+                yield {"url": f"http://example.com/{i}", "text": f"page {i}", "cache_entry": "entry-broken" if i == 3 else f"entry-{i}"}
+        mock_crawler_class.return_value.pages = pages
+        mock_crawler_class.return_value.unchanged_pages = 0
+        context = self._create_mock_context('1')
+        context.parameters.settings.no_chunks = True
+        context.parameters.settings.chunk_size = 800
+        context.db = MagicMock()
+
+        # Act
+        asyncio.run(asyncio.wait_for(UrlImport().import_data('collection1', 'http://example.com', '', context, Event()), 30))
+
+        # Assert
+        messages = [call.args[2] for call in context.messageHub.send_message.call_args_list]
+        self.assertIn("FAILED import from http://example.com/3. Exception database is locked", messages)
+        self.assertTrue(any(message.startswith("SUCCESSFUL crawl of http://example.com: 39 pages imported") for message in messages))
+        context.messageHub.send_message.assert_any_call('collection1', MessageType.UNLOCK, "Import of http://example.com completed.")
+
+    @patch.object(UrlImport, 'create_embedder')
+    @patch('app.models.url_import.simple_crawler.AsyncCrawler')
+    def test_import_data_stops_when_the_indexer_fails(self, mock_crawler_class, mock_create_embedder):
+        """
+        Test that a crawl whose indexer dies partway does not block on the full page queue,
+        and that the collection is unlocked and the job kept for a resume.
+        """
+        # Arrange
+        async def failing_indexer(*args, **kwargs):
+            pages = args[1]
+            await pages.get()
+            raise RuntimeError("indexer crashed")
+
+        async def pages():
+            for i in range(100):
+                yield {"url": f"http://example.com/{i}", "text": f"page {i}"}
+        mock_crawler_class.return_value.pages = pages
+        context = self._create_mock_context('1')
+
+        # Act
+        with patch.object(UrlImport, '_UrlImport__index_pages', side_effect=failing_indexer):
+            asyncio.run(asyncio.wait_for(UrlImport().import_data('collection1', 'http://example.com', '', context, Event()), 30))
+
+        # Assert
+        context.messageHub.send_message.assert_any_call('collection1', MessageType.UNLOCK, "Import of http://example.com failed: indexer crashed")
+        job = crud_crawl_job.get_jobs_for_collection(self.db, 'collection1')[0]
+        self.assertEqual(job.status, CrawlJobStatus.INTERRUPTED)
+
+    @patch.object(UrlImport, 'create_embedder')
+    @patch('app.models.url_import.simple_crawler.AsyncCrawler')
+    def test_import_data_reports_a_failing_crawl(self, mock_crawler_class, mock_create_embedder):
+        # Arrange
+        async def pages():
+            yield {"url": "http://example.com", "text": "first page"}
+            raise ConnectionError("connection reset")
+        mock_crawler_class.return_value.pages = pages
+        context = self._create_mock_context('1')
+
+        # Act
+        asyncio.run(asyncio.wait_for(UrlImport().import_data('collection1', 'http://example.com', '', context, Event()), 30))
+
+        # Assert
+        context.messageHub.send_message.assert_any_call('collection1', MessageType.UNLOCK, "Import of http://example.com failed: connection reset")
+        messages = [call.args[2] for call in context.messageHub.send_message.call_args_list]
+        self.assertTrue(any(message.startswith("FAILED crawl of http://example.com") for message in messages))
 
     def _create_mock_context(self, crawl_depth_value, two_step_import='False'):
         mock_settings_manager = MagicMock()
@@ -97,6 +324,7 @@ class TestUrlImport(unittest.TestCase):
         context.messageHub = mock_message_hub
         context.parameters = MagicMock()
         context.parameters.settings.filter = ""
+        context.parameters.model_dump_json.return_value = "{}"
         
         return context
 